@@ -1,5 +1,7 @@
 #!/usr/bin/env python
 from pathlib import Path
+import hashlib
+import json
 import os
 import time
 import shutil
@@ -8,6 +10,147 @@ from datetime import datetime
 # Define the workspaces directory
 workspaces_directory = Path(os.environ.get("WORKSPACES_DIR", "/workspaces-nuxl-app"))
 
+# Parsed idXML CSM table sidecars (see src/nuxl_result_files_v.py): a hidden
+# folder next to the idXML files with <idXML name>.key.json files and
+# <sha16>.top<N>.feather tables named by the idXML content hash
+CSM_SIDECAR_DIR = ".csm-cache"
+CSM_SIDECAR_KEY_SUFFIX = ".key.json"
+
+
+def evict_stale_csm_sidecars(workspace: Path, current_time: float) -> int:
+    """
+    Remove sidecars of deleted or changed idXML files from a workspace.
+
+    Key files whose idXML is gone or has a different size/mtime are removed,
+    then every table no longer referenced by a key file, and temporary files
+    of interrupted writes older than a day.
+
+    Returns:
+        Number of removed files.
+    """
+    removed = 0
+    for cache_dir in workspace.rglob(CSM_SIDECAR_DIR):
+        if not cache_dir.is_dir():
+            continue
+
+        live_hashes = set()
+        for key_file in cache_dir.glob("*" + CSM_SIDECAR_KEY_SUFFIX):
+            idxml = cache_dir.parent / key_file.name[: -len(CSM_SIDECAR_KEY_SUFFIX)]
+            try:
+                key = json.loads(key_file.read_text())
+                stat = idxml.stat()
+                fresh = key["size"] == stat.st_size and key["mtime_ns"] == stat.st_mtime_ns
+            except (OSError, ValueError, KeyError):
+                fresh = False
+
+            if fresh:
+                live_hashes.add(key["sha256"][:16])
+            else:
+                key_file.unlink()
+                removed += 1
+
+        for sidecar in cache_dir.glob("*.feather"):
+            if sidecar.name.split(".")[0] not in live_hashes:
+                sidecar.unlink()
+                removed += 1
+
+        for tmp in cache_dir.glob(".*.tmp"):
+            if os.path.getmtime(tmp) < current_time - 86400:
+                tmp.unlink()
+                removed += 1
+
+        if not any(cache_dir.iterdir()):
+            cache_dir.rmdir()
+
+    return removed
+
+
+# Spectrum stores of mzML files (see src/nuxl_spectrum_store.py): a hidden
+# folder next to the mzML files with <mzML name>.<fingerprint>.peaks.f32 and
+# .index.npz files, fingerprinted by mzML path, size and mtime
+SPECTRUM_STORE_DIR = ".spectrum-store"
+SPECTRUM_STORE_SUFFIXES = (".peaks.f32", ".index.npz")
+
+
+def evict_stale_spectrum_stores(workspace: Path, current_time: float) -> int:
+    """
+    Remove spectrum stores of deleted or changed mzML files from a workspace,
+    and temporary files of interrupted builds older than a day.
+
+    Returns:
+        Number of removed files.
+    """
+    removed = 0
+    for store_dir in workspace.rglob(SPECTRUM_STORE_DIR):
+        if not store_dir.is_dir():
+            continue
+
+        for store_file in store_dir.iterdir():
+            if store_file.name.startswith("."):
+                if store_file.name.endswith(".tmp") and os.path.getmtime(store_file) < current_time - 86400:
+                    store_file.unlink()
+                    removed += 1
+                continue
+
+            suffix = next((s for s in SPECTRUM_STORE_SUFFIXES if store_file.name.endswith(s)), None)
+            if suffix is None:
+                continue
+            mzml_name, _, fingerprint = store_file.name[: -len(suffix)].rpartition(".")
+            mzml = (store_dir.parent / mzml_name).resolve()
+            try:
+                stat = mzml.stat()
+                key = f"{mzml}|{stat.st_size}|{stat.st_mtime_ns}"
+                fresh = hashlib.sha256(key.encode()).hexdigest()[:16] == fingerprint
+            except OSError:
+                fresh = False
+
+            if not fresh:
+                store_file.unlink()
+                removed += 1
+
+        if not any(store_dir.iterdir()):
+            store_dir.rmdir()
+
+    return removed
+
+
+# Pseudo-ROC score arrays (see src/nuxl_pseudo_roc.py): <fingerprint>.npy
+# files in <workspace>/cache/pseudo-roc-scores, fingerprinted by idXML path,
+# size and mtime
+PSEUDO_ROC_SCORE_DIR = Path("cache", "pseudo-roc-scores")
+
+
+def evict_stale_pseudo_roc_scores(workspace: Path) -> int:
+    """
+    Remove pseudo-ROC score arrays whose fingerprint matches no current
+    idXML file of a workspace.
+
+    Returns:
+        Number of removed files.
+    """
+    score_dir = workspace / PSEUDO_ROC_SCORE_DIR
+    if not score_dir.is_dir():
+        return 0
+
+    live_fingerprints = set()
+    for idxml in workspace.rglob("*.idXML"):
+        path = idxml.resolve()
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        key = f"{path}|{stat.st_size}|{stat.st_mtime_ns}"
+        live_fingerprints.add(hashlib.sha256(key.encode()).hexdigest()[:16])
+
+    removed = 0
+    for score_file in score_dir.glob("*.npy"):
+        if score_file.stem not in live_fingerprints:
+            score_file.unlink()
+            removed += 1
+
+    return removed
+
+
 # Get the current time in seconds
 current_time = time.time()
 
@@ -46,6 +189,19 @@ for directory in workspaces_directory.iterdir():
         else:
             remaining_directories.append(directory)
 
+# Evict idXML sidecars, spectrum stores and pseudo-ROC scores of deleted or
+# changed files in the remaining workspaces
+for directory in remaining_directories:
+    removed_sidecars = evict_stale_csm_sidecars(directory, current_time)
+    if removed_sidecars:
+        print(f"Removed {removed_sidecars} stale idXML sidecar file(s) from {directory.name}")
+    removed_stores = evict_stale_spectrum_stores(directory, current_time)
+    if removed_stores:
+        print(f"Removed {removed_stores} stale spectrum store file(s) from {directory.name}")
+    removed_scores = evict_stale_pseudo_roc_scores(directory)
+    if removed_scores:
+        print(f"Removed {removed_scores} stale pseudo-ROC score file(s) from {directory.name}")
+
 # Print info on remaining directories
 if remaining_directories:
     print(f"\nRemaining directories in {workspaces_directory.name}:")
@@ -1,13 +1,23 @@
 import streamlit as st
 #from src.common import *
 from src.nuxl_result_files import *
-from src.nuxl_result_files_v import readAndProcessIdXML_v, read_protein_table_v
+from src.nuxl_result_files_v import readAndProcessIdXML_v, read_protein_table_v, csm_display_table_v
+from src.nuxl_peak_store import get_peak_store
+from src.nuxl_spectrum_store import open_spectrum_store
+from src.nuxl_csm_index import (
+    start_csm_index_update,
+    csm_index_update_running,
+    search_csm_index,
+    search_csm_index_crosslinks,
+    csm_index_run_summary,
+)
+import numpy as np
 import plotly.graph_objects as go
-from src.nuxl_view import plot_ms2_spectrum, plot_ms2_spectrum_full, download_table, show_fig
+from src.nuxl_view import plot_ms2_spectrum, plot_ms2_spectrum_full, download_table, show_fig, plot_FDR_comparison_plot
 from st_aggrid import GridOptionsBuilder, AgGrid, GridUpdateMode, ColumnsAutoSizeMode
-import pyopenms as poms
 import re
 import io
+import time
 import zipfile
 import os
 from pathlib import Path
@@ -27,51 +37,48 @@ params = page_setup()
 
 # Optimized helper functions for this versioned page.
 # These names end with _v so the existing page and helpers remain untouched.
-@st.cache_resource(show_spinner="Loading mzML MS2 spectra...")
-def load_ms2_peak_map_v(mzml_path_str: str, file_mtime: float):
-    """
-    Load an mzML file once, keep only MS2 spectra, normalize intensities,
-    and index spectra by native ID for fast row-selection lookup.
+@st.cache_resource(show_spinner="Indexing mzML spectra...")
+def load_spectrum_store_v(mzml_path_str: str, file_mtime: float):
     """
-    mzml_path = Path(mzml_path_str).resolve()
-
-    if not mzml_path.is_file():
-        return None
+    Open the spectrum store of an mzML file (src.nuxl_spectrum_store),
+    building it on first access if the upload did not build it yet.
 
+    Only the store index is held in memory; the peaks stay in the
+    memory-mapped store file and are read per selected spectrum.
+    """
     try:
-        exp = poms.MSExperiment()
-        poms.MzMLFile().load(str(mzml_path), exp)
-
-        ms2_peak_map = {}
-
-        for spec in exp:
-            if spec.getMSLevel() != 2:
-                continue
-
-            mz, intensities = spec.get_peaks()
-
-            if len(intensities) > 0:
-                max_intensity = float(max(intensities))
-                if max_intensity > 0:
-                    intensities = intensities / max_intensity
-
-            ms2_peak_map[spec.getNativeID()] = (mz, intensities)
-
-        return ms2_peak_map
-
+        return open_spectrum_store(mzml_path_str)
     except Exception as e:
         st.exception(e)
         return None
 
 
-def get_cached_ms2_peak_map_v(mzml_path: Path):
-    """Return cached native_id -> (mz, intensity) MS2 peak data."""
+def get_cached_spectrum_store_v(mzml_path: Path):
+    """Return the cached spectrum store of an mzML file, or None if the file is missing."""
     mzml_path = Path(mzml_path).resolve()
 
     if not mzml_path.is_file():
         return None
 
-    return load_ms2_peak_map_v(str(mzml_path), mzml_path.stat().st_mtime)
+    return load_spectrum_store_v(str(mzml_path), mzml_path.stat().st_mtime)
+
+
+def ms2_spectrum_peaks_v(spectrum_store, spec_id: str):
+    """
+    Return the m/z values and max-normalized intensities of an MS2 spectrum
+    from the spectrum store, or None if the spectrum is not an MS2 spectrum
+    of the store.
+    """
+    row = spectrum_store.find(spec_id)
+    if row is None or spectrum_store.ms_level[row] != 2:
+        return None
+
+    mz, intensities = spectrum_store.peaks(row)
+    max_intensity = float(spectrum_store.base_peak_intensity[row])
+    if len(intensities) > 0 and max_intensity > 0:
+        intensities = intensities / max_intensity
+
+    return mz, intensities
 
 
 def selected_rows_to_records_v(selected_rows):
@@ -138,19 +145,100 @@ def filtered_annotation_v(annotation: str, ion_filter: str) -> str:
     return " "
 
 
-def split_peak_values_v(value: object, cast_type=str) -> list:
-    if value is None:
-        return []
-    parsed_values = []
-    for item in str(value).split(","):
-        item = item.strip()
-        if not item:
-            continue
-        try:
-            parsed_values.append(cast_type(item))
-        except ValueError:
-            continue
-    return parsed_values
+# Columns shown in the CSM grid by default (the others can be added)
+CSM_GRID_COLUMNS_V = [
+    "SpecId", "ScanNr", "Label", "Score", "Peptide", "ExpMass", "accessions", "NuXL:NA",
+    "NuXL:best_localization", "NuXL:best_localization_position", "NuXL:best_localization_score", "NuXL:score",
+]
+# Hidden grid column with the CSM table index of each row
+CSM_GRID_ROW_ID_V = "_row"
+CSM_GRID_PAGE_SIZES_V = [10, 25, 50, 100]
+CSM_FILTER_COMPARISON_PATTERN_V = re.compile(r"^\s*(<=|>=|<|>|==|=)?\s*([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)\s*$")
+
+
+def numeric_csm_values_v(values: pd.Series) -> pd.Series | None:
+    """Return a column as numbers (meta values like NuXL:score are stored as text), or None if it is not numeric."""
+    if pd.api.types.is_numeric_dtype(values):
+        return values
+    if not pd.api.types.is_object_dtype(values):
+        return None
+    # cheap check on a few values first: most text columns fail right away
+    if pd.to_numeric(values.dropna().head(100), errors="coerce").isna().any():
+        return None
+    numbers = pd.to_numeric(values, errors="coerce")
+    return numbers if numbers.notna().sum() == values.notna().sum() else None
+
+
+def filter_csm_table_v(df: pd.DataFrame, column: str, expression: str) -> pd.DataFrame:
+    """
+    Keep the CSMs whose column matches a filter expression.
+
+    Numeric columns take a comparison like "<=0.01", ">5" or "2" (equal);
+    other columns a case-insensitive substring.
+    """
+    expression = expression.strip()
+    if not expression or column not in df.columns:
+        return df
+
+    values = numeric_csm_values_v(df[column])
+    if values is not None:
+        match = CSM_FILTER_COMPARISON_PATTERN_V.match(expression)
+        if not match:
+            st.warning(f"Filter on {column} needs a number or a comparison like <=0.01.")
+            return df
+        operator, number = match.group(1) or "==", float(match.group(2))
+        mask = {
+            "<": values < number,
+            "<=": values <= number,
+            ">": values > number,
+            ">=": values >= number,
+        }.get(operator, values == number)
+        return df[mask]
+
+    return df[df[column].astype(str).str.contains(expression, case=False, regex=False)]
+
+
+def csm_table_page_v(df: pd.DataFrame, columns: list, page: int, page_size: int,
+                     sort_column: str | None = None, ascending: bool = True) -> pd.DataFrame:
+    """
+    Return one page of the (filtered) CSM table with the given columns.
+
+    Only the sort column is sorted; the projected columns are taken for the
+    rows of the requested page only. The CSM table index is kept in a
+    hidden row id column.
+    """
+    if sort_column in df.columns:
+        sort_values = numeric_csm_values_v(df[sort_column])
+        sort_values = df[sort_column] if sort_values is None else sort_values
+        row_index = sort_values.sort_values(ascending=ascending, kind="stable", na_position="last").index
+    else:
+        row_index = df.index
+
+    page_index = row_index[(page - 1) * page_size: page * page_size]
+    page_df = df.loc[page_index, columns].copy()
+    page_df.insert(0, CSM_GRID_ROW_ID_V, page_index)
+    return page_df
+
+
+def match_spectrum_annotations_v(mz_full, idxml_mz_values, idxml_annotations) -> np.ndarray:
+    """
+    Label the peaks of a full MS2 spectrum with the idXML peak annotations.
+
+    Peaks match when their m/z values are equal at the float32 precision of
+    the spectrum store; unmatched peaks get " ". If several annotated peaks
+    share an m/z value, the last one wins.
+    """
+    mz_full = np.asarray(mz_full, dtype=np.float32)
+    labels = np.full(len(mz_full), " ", dtype=object)
+    if len(idxml_mz_values) == 0 or len(mz_full) == 0:
+        return labels
+
+    order = np.argsort(idxml_mz_values, kind="stable")
+    sorted_mz = np.asarray(idxml_mz_values, dtype=np.float32)[order]
+    positions = np.searchsorted(sorted_mz, mz_full, side="right") - 1
+    matched = (positions >= 0) & (sorted_mz[np.maximum(positions, 0)] == mz_full)
+    labels[matched] = np.asarray(idxml_annotations, dtype=object)[order][positions[matched]]
+    return labels
 
 
 def create_result_zip_buffer_v(file_paths: list[Path]) -> io.BytesIO:
@@ -224,7 +312,7 @@ result_dir: Path = Path(st.session_state.workspace, "result-files")
 st.title("📊 Result Viewer")
 
 #tabs on page
-tabs = ["View Results", "Result files", "Upload result files"]
+tabs = ["View Results", "Pseudo-ROC comparison", "Cross-run search", "Result files", "Upload result files"]
 tabs = st.tabs(tabs)
 
 #with View Results tab
@@ -307,29 +395,112 @@ with tabs[0]:
                         st.warning("nonXL CSMs found")  
                     else:
                     
-                        # Use the complete dataframe in AgGrid to preserve the original
-                        # table appearance, column content, side bar behavior, and autosizing.
-                        # The speed improvement is kept by caching idXML/protein parsing and
-                        # loading mzML only after a row is selected.
-                        gb = GridOptionsBuilder.from_dataframe(CSM_[list(CSM_.columns.values)])
+                        # Server-side paging: filtering and sorting run on the cached
+                        # CSM table here, and only the current page with the selected
+                        # columns is sent to AgGrid. The peaks of the selected row are
+                        # taken from the peak store.
+                        grid_column_options_v = list(CSM_.columns)
+                        grid_cols_v = st.columns([2, 2, 2, 1])
+                        with grid_cols_v[0]:
+                            grid_filter_column_v = st.selectbox(
+                                "Filter column",
+                                grid_column_options_v,
+                                index=grid_column_options_v.index("Peptide") if "Peptide" in grid_column_options_v else 0,
+                                key=f"csm_grid_filter_column_{selected_file}",
+                            )
+                        with grid_cols_v[1]:
+                            grid_filter_text_v = st.text_input(
+                                "Filter",
+                                key=f"csm_grid_filter_text_{selected_file}",
+                                help="Text contained in the column, or a comparison like <=0.01 for numeric columns.",
+                            )
+                        with grid_cols_v[2]:
+                            grid_sort_column_v = st.selectbox(
+                                "Sort by",
+                                ["(file order)"] + grid_column_options_v,
+                                key=f"csm_grid_sort_column_{selected_file}",
+                            )
+                        with grid_cols_v[3]:
+                            grid_sort_ascending_v = st.radio(
+                                "Order",
+                                ["ascending", "descending"],
+                                key=f"csm_grid_sort_order_{selected_file}",
+                            ) == "ascending"
+
+                        grid_columns_v = st.multiselect(
+                            "Columns",
+                            grid_column_options_v,
+                            default=[c for c in CSM_GRID_COLUMNS_V if c in grid_column_options_v],
+                            key=f"csm_grid_columns_{selected_file}",
+                        )
+
+                        filtered_CSM_v = filter_csm_table_v(CSM_, grid_filter_column_v, grid_filter_text_v)
+                        page_cols_v = st.columns([1, 1, 4])
+                        with page_cols_v[0]:
+                            grid_page_size_v = st.selectbox(
+                                "Rows per page",
+                                CSM_GRID_PAGE_SIZES_V,
+                                key=f"csm_grid_page_size_{selected_file}",
+                            )
+                        n_pages_v = max(1, -(-len(filtered_CSM_v) // grid_page_size_v))
+                        grid_page_key_v = f"csm_grid_page_{selected_file}"
+                        if st.session_state.get(grid_page_key_v, 1) > n_pages_v:
+                            st.session_state[grid_page_key_v] = n_pages_v
+                        with page_cols_v[1]:
+                            grid_page_v = st.number_input(
+                                f"Page (of {n_pages_v})",
+                                min_value=1,
+                                max_value=n_pages_v,
+                                step=1,
+                                key=grid_page_key_v,
+                            )
+                        with page_cols_v[2]:
+                            v_space(1)
+                            first_row_v = (grid_page_v - 1) * grid_page_size_v
+                            st.caption(
+                                f"CSMs {min(first_row_v + 1, len(filtered_CSM_v))}-"
+                                f"{min(first_row_v + grid_page_size_v, len(filtered_CSM_v))} "
+                                f"of {len(filtered_CSM_v)} (filtered from {len(CSM_)})"
+                            )
+
+                        page_CSM_v = csm_table_page_v(
+                            filtered_CSM_v,
+                            grid_columns_v,
+                            grid_page_v,
+                            grid_page_size_v,
+                            None if grid_sort_column_v == "(file order)" else grid_sort_column_v,
+                            grid_sort_ascending_v,
+                        )
 
+                        gb = GridOptionsBuilder.from_dataframe(page_CSM_v)
+                        # sorting and filtering are done on the server for all rows
+                        gb.configure_default_column(sortable=False, filter=False)
+                        gb.configure_column(CSM_GRID_ROW_ID_V, hide=True)
                         # configure selection
                         gb.configure_selection(selection_mode="single", use_checkbox=True)
-                        gb.configure_side_bar()
-                        gb.configure_pagination(enabled=True, paginationAutoPageSize=False, paginationPageSize=10)
                         gridOptions = gb.build()
 
+                        # AgGrid 0.3.4 sets the rows and columns only when the grid is
+                        # mounted, so the page view is part of the key: another page,
+                        # sort, filter or column set mounts a new grid. Selection
+                        # reruns keep the key, so the selected row stays checked.
+                        grid_view_key_v = (
+                            grid_page_v, grid_page_size_v, grid_sort_column_v, grid_sort_ascending_v,
+                            grid_filter_column_v, grid_filter_text_v, tuple(grid_columns_v),
+                        )
                         data = AgGrid(
-                            CSM_,
+                            page_CSM_v,
                             gridOptions=gridOptions,
-                            enable_enterprise_modules=True,
-                            allow_unsafe_jscode=True,
                             update_mode=GridUpdateMode.SELECTION_CHANGED,
                             columns_auto_size_mode=ColumnsAutoSizeMode.FIT_CONTENTS,
+                            key=f"csm_grid_{selected_file}_{grid_view_key_v!r}",
                         )
 
-                        #download table
-                        download_table(CSM_, f"{os.path.splitext(selected_file)[0]}")
+                        #download table (all CSMs and columns, with the peak columns)
+                        download_table(
+                            csm_display_table_v(workspace_path / "result-files" /f"{selected_file}"),
+                            f"{os.path.splitext(selected_file)[0]}",
+                        )
                         #select row by user
                         selected_row = selected_rows_to_records_v(data.get("selected_rows"))
 
@@ -369,46 +540,34 @@ with tabs[0]:
                         )
 
                         if selected_row:
-                            selected_spec_id_v = selected_row[0]["SpecId"]
-                            full_selected_row_v = CSM_.loc[
-                                CSM_["SpecId"] == selected_spec_id_v
-                            ].iloc[0]
-
-                            # Create annotation features from idXML.
-                            idxml_mz_values = split_peak_values_v(
-                                full_selected_row_v.get("mz_values", ""),
-                                float,
-                            )
-                            idxml_intensity_values = split_peak_values_v(
-                                full_selected_row_v.get("intensities", ""),
-                                float,
-                            )
-                            idxml_annotations = split_peak_values_v(
-                                full_selected_row_v.get("ions", ""),
-                                str,
+                            full_selected_row_v = CSM_.loc[int(selected_row[0][CSM_GRID_ROW_ID_V])]
+                            selected_spec_id_v = full_selected_row_v["SpecId"]
+
+                            # Annotation features from idXML: zero-copy slices of the
+                            # peak store row of the selected CSM.
+                            peak_store_v = get_peak_store(CSM_)
+                            peak_row_v = full_selected_row_v.name
+                            idxml_mz_values, idxml_intensity_values, idxml_annotations = peak_store_v.peaks(peak_row_v)
+                            idxml_filter_mask = peak_store_v.ion_mask(
+                                lambda annotation: annotation_matches_filter_v(annotation, ion_annotation_filter),
+                                peak_row_v,
                             )
 
-                            idxml_peak_rows = []
-                            for mz, intensity, annotation in zip(
-                                idxml_mz_values,
-                                idxml_intensity_values,
-                                idxml_annotations,
-                            ):
-                                if annotation_matches_filter_v(annotation, ion_annotation_filter):
-                                    idxml_peak_rows.append(
-                                        {
-                                            "mzarray": mz,
-                                            "intarray": intensity,
-                                            "anotarray": annotation,
-                                        }
-                                    )
+                            idxml_peak_rows = [
+                                {"mzarray": mz, "intarray": intensity, "anotarray": annotation}
+                                for mz, intensity, annotation in zip(
+                                    idxml_mz_values[idxml_filter_mask].tolist(),
+                                    idxml_intensity_values[idxml_filter_mask].tolist(),
+                                    idxml_annotations[idxml_filter_mask],
+                                )
+                            ]
 
                             annotation_data = []
                             ms2_peak_data = None
 
-                            ms2_peak_map_v = get_cached_ms2_peak_map_v(mzml_path)
+                            spectrum_store_v = get_cached_spectrum_store_v(mzml_path)
 
-                            if ms2_peak_map_v is None:
+                            if spectrum_store_v is None:
                                 st.warning(
                                     f"The corresponding {file_name_wout_out}.mzML file could not be found. "
                                     "Please re-upload the mzML file to visualize all experimental peaks."
@@ -416,27 +575,21 @@ with tabs[0]:
                                 #st.info(mzml_path)
                                 
                             else:
-                                ms2_peak_data = ms2_peak_map_v.get(selected_spec_id_v)
+                                ms2_peak_data = ms2_spectrum_peaks_v(spectrum_store_v, selected_spec_id_v)
 
                             if ms2_peak_data is not None:
                                 # Use all experimental MS2 peaks from mzML, but only show
                                 # labels for the selected annotation type.
                                 mz_full, inten_full = ms2_peak_data
 
-                                annotation_dict = {
-                                    round(mz, 6): filtered_annotation_v(annotation, ion_annotation_filter)
-                                    for mz, annotation in zip(idxml_mz_values, idxml_annotations)
-                                }
-
-                                for intensity, mz in zip(inten_full, mz_full):
-                                    mz_r = round(float(mz), 6)
-                                    annotation_data.append(
-                                        {
-                                            "mzarray": mz,
-                                            "intarray": intensity,
-                                            "anotarray": annotation_dict.get(mz_r, " "),
-                                        }
-                                    )
+                                filtered_annotations_v = np.where(idxml_filter_mask, idxml_annotations, " ")
+                                annotation_data = pd.DataFrame({
+                                    "mzarray": mz_full,
+                                    "intarray": inten_full,
+                                    "anotarray": match_spectrum_annotations_v(
+                                        mz_full, idxml_mz_values, filtered_annotations_v
+                                    ),
+                                })
 
                             else:
                                 # mzML/MS2 spectrum is not available. Show only the selected
@@ -444,7 +597,7 @@ with tabs[0]:
                                 annotation_data = idxml_peak_rows
                         
                             # Check if the lists are not empty
-                            if annotation_data:
+                            if len(annotation_data) > 0:
                                 # Create the DataFrame
                                 annotation_df = pd.DataFrame(annotation_data)
                                 #annotation_df.to_csv(str(full_selected_row_v['ScanNr']) + "_idxml_annot_full.csv")
@@ -646,8 +799,96 @@ with tabs[0]:
                 else:
                     st.warning(f"{protein_path.name} file not exist in current workspace")
                 """
-#with "Result files" 
+#with "Pseudo-ROC comparison"
 with tabs[1]:
+    comparison_files_v = [
+        f.name
+        for f in sorted(result_dir.iterdir())
+        if f.name.endswith(".idXML") and "_XLs" in f.name
+    ]
+
+    if not comparison_files_v:
+        st.warning("There is no output file available in workspace.")
+    else:
+        # curves are only meaningful for unfiltered (100% FDR) outputs
+        selected_comparison_files = st.multiselect(
+            "select idXML files to compare",
+            comparison_files_v,
+            default=[f for f in comparison_files_v if "_perc_1.0000_XLs" in f],
+            help="One pseudo-ROC curve per file, e.g. NuXL and RDDF rescored *_perc_1.0000_XLs.idXML files of several runs or protocols.",
+        )
+        comparison_fdr_level = st.selectbox(
+            "CSM-level q-value range",
+            [0.1, 0.2, 1.0],
+            help="Upper limit of the q-value axis.",
+        )
+
+        if selected_comparison_files:
+            with st.spinner("Reading CSM scores..."):
+                comparison_fig, comparison_summary = plot_FDR_comparison_plot(
+                    [result_dir / f for f in selected_comparison_files],
+                    labels=[Path(f).stem for f in selected_comparison_files],
+                    FDR_level=int(round(comparison_fdr_level * 100)),
+                    cache_dir=Path(st.session_state.workspace, "cache", "pseudo-roc-scores"),
+                )
+
+            st.pyplot(comparison_fig)
+
+            comparison_pdf = io.BytesIO()
+            comparison_fig.savefig(comparison_pdf, format="pdf", bbox_inches="tight")
+            st.download_button(
+                "Download plot (PDF)",
+                comparison_pdf.getvalue(),
+                "pseudo_roc_comparison.pdf",
+                mime="application/pdf",
+            )
+
+            show_table(comparison_summary, "pseudo_roc_comparison")
+
+#with "Cross-run search"
+with tabs[2]:
+    # the workspace CSM index is brought up to date in the background;
+    # unchanged idXML files are not read again
+    start_csm_index_update(st.session_state.workspace)
+    if csm_index_update_running(st.session_state.workspace):
+        st.info("Indexing new or changed result files in the background. Results may be incomplete until indexing finishes; interact with the page to refresh.")
+
+    search_cols_v = st.columns(4)
+    with search_cols_v[0]:
+        search_sequence_v = st.text_input("Peptide sequence starts with", help="Unmodified peptide sequence (prefix), e.g. AGLK")
+    with search_cols_v[1]:
+        search_accession_v = st.text_input("Protein accession starts with", help="Protein accession (prefix), e.g. sp|P0A7")
+    with search_cols_v[2]:
+        search_na_v = st.text_input("NuXL:NA starts with", help="Nucleic acid adduct (prefix), e.g. U-H2O")
+    with search_cols_v[3]:
+        search_q_value_v = st.selectbox("Maximum q-value", [0.01, 0.05, 0.1, 1.0], index=0)
+    search_targets_only_v = st.checkbox("Target CSMs only", value=True)
+
+    if search_sequence_v.strip() or search_accession_v.strip() or search_na_v.strip():
+        search_start_v = time.perf_counter()
+        search_kwargs_v = dict(
+            sequence=search_sequence_v,
+            accession=search_accession_v,
+            na=search_na_v,
+            max_q_value=search_q_value_v,
+            targets_only=search_targets_only_v,
+        )
+        crosslinks_v = search_csm_index_crosslinks(st.session_state.workspace, **search_kwargs_v)
+        csms_v = search_csm_index(st.session_state.workspace, **search_kwargs_v)
+        st.caption(f"{len(crosslinks_v)} crosslinks, {len(csms_v)} CSMs in {(time.perf_counter() - search_start_v) * 1000:.0f} ms (at most 1000 rows each)")
+
+        st.markdown("**Crosslinks across runs**")
+        show_table(crosslinks_v, "cross_run_crosslinks")
+        st.markdown("**CSMs**")
+        show_table(csms_v, "cross_run_csms")
+    else:
+        st.info("Enter a peptide sequence, protein accession or NuXL:NA to search the CSMs of all result files.")
+
+    st.markdown("**CSMs per run and FDR level**")
+    show_table(csm_index_run_summary(st.session_state.workspace), "csm_index_run_summary")
+
+#with "Result files" 
+with tabs[3]:
     #make sure to load all results example files
     #load_example_result_files()
 
@@ -736,7 +977,7 @@ with tabs[1]:
                 )
 
 #with "Upload result files"
-with tabs[2]:
+with tabs[4]:
     #form to upload file
     with st.form("Upload .idXML and .tsv", clear_on_submit=True):
         files = st.file_uploader(
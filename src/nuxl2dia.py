@@ -23,10 +23,14 @@ Usage:
         .build_modified_sequences()
         .parse_peak_annotations()
         .filter_fragment_ions(types=['b', 'y'])
+        .select_top_fragments(n=12, min_mz=200.0)
         .convert_rt_to_irt(mode='piecewise', reference='hela_reference.tsv')
         .format_output()
         .save('output_library.tsv'))
 
+    # Lazy mode: the same chain is recorded and optimized; save() runs it
+    converter = NuXLLibraryConverter(ConverterConfig(lazy=True))
+
 Author: NuXL Team
 Date: 2026-01
 
@@ -41,12 +45,25 @@ Validation: 99.9% match rate with original R implementation. Key improvements:
 from __future__ import annotations
 
 import argparse
+import contextlib
+import csv
+import functools
+import hashlib
+import io
+import itertools
+import json
 import logging
 import math
 import re
-from dataclasses import dataclass, field
+import sys
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field, replace
 from pathlib import Path
-from typing import Callable, Dict, List, Literal, Optional, Tuple, Union
+from typing import Any, Callable, Dict, Iterator, List, Literal, Optional, Tuple, Union
 
 import numpy as np
 import pandas as pd
@@ -64,6 +81,19 @@ try:
 except ImportError:
     HAS_PWLF = False
 
+try:
+    import resource  # peak RSS (POSIX only)
+    HAS_RESOURCE = True
+except ImportError:
+    HAS_RESOURCE = False
+
+try:
+    import pyarrow as pa  # parquet engine for DataFrame.to_parquet
+    import pyarrow.parquet as pq
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
 
 # =============================================================================
 # Constants
@@ -86,6 +116,40 @@ NUXL_COLUMNS = {
     'target_decoy': 'target_decoy',
 }
 
+# Explicit dtypes used when reading NuXL TextExporter output. Integer columns
+# (charge, localization position) are left to inference so that missing values
+# fall back to float exactly as in a plain read_csv.
+NUXL_DTYPES = {
+    NUXL_COLUMNS['rt']: 'float64',
+    NUXL_COLUMNS['mz']: 'float64',
+    NUXL_COLUMNS['sequence']: str,
+    NUXL_COLUMNS['accessions']: str,
+    NUXL_COLUMNS['peak_annotations']: str,
+    NUXL_COLUMNS['ccs']: 'float64',
+    NUXL_COLUMNS['nucleotide']: str,
+    NUXL_COLUMNS['best_localization']: str,
+    NUXL_COLUMNS['localization_score']: 'float64',
+    NUXL_COLUMNS['nuxl_score']: 'float64',
+    NUXL_COLUMNS['target_decoy']: str,
+}
+
+# idXML sources of the NUXL_COLUMNS values (what TextExporter would print):
+# PeptideIdentification attributes, PeptideHit attributes and UserParams.
+# IM is looked up on the hit first, then on the PeptideIdentification.
+IDXML_PEPTIDE_ID_ATTRIBUTES = {'rt': 'RT', 'mz': 'MZ'}
+IDXML_HIT_ATTRIBUTES = {'sequence': 'sequence', 'charge': 'charge'}
+IDXML_USER_PARAMS = {
+    'peak_annotations': 'fragment_annotation',
+    'ccs': 'IM',
+    'nucleotide': 'NuXL:NA',
+    'best_localization': 'NuXL:best_localization',
+    'localization_position': 'NuXL:best_localization_position',
+    'localization_score': 'NuXL:best_localization_score',
+    'nuxl_score': 'NuXL:score',
+    'target_decoy': 'target_decoy',
+}
+IDXML_INT_COLUMNS = ('charge', 'localization_position')
+
 # Output column names for DIA-NN compatible library
 OUTPUT_COLUMNS = [
     'ModifiedPeptideSequence',
@@ -105,6 +169,48 @@ OUTPUT_COLUMNS = [
     'FragmenLossType',
 ]
 
+# Library output formats and rows per chunk for the streaming TSV writer
+OUTPUT_FORMATS = ('tsv', 'parquet')
+TSV_CHUNK_ROWS = 500_000
+
+# String columns stored dictionary-encoded (categorical) in parquet output
+CATEGORICAL_OUTPUT_COLUMNS = [
+    'ModifiedPeptideSequence',
+    'PeptideSequence',
+    'ProteinId',
+    'Annotation',
+    'FragmentType',
+    'FragmenLossType',
+]
+
+# Sidecar files kept next to an incrementally updated library: per-precursor
+# best-hit state and the list of runs already merged
+LIBRARY_STATE_SUFFIX = '.state.tsv'
+LIBRARY_RUNS_SUFFIX = '.runs.json'
+
+# Sidecar describing the iRT model a library was converted with
+IRT_MODEL_SUFFIX = '.irt_model.json'
+
+# Sidecar with the per-stage profile of a library build
+PROFILE_SUFFIX = '.profile.json'
+
+# Library merge: precursor identity across libraries, priority modes and
+# column names of other DIA-NN library writers mapped to OUTPUT_COLUMNS
+MERGE_PRECURSOR_KEY = ['ModifiedPeptideSequence', 'PrecursorCharge']
+MERGE_PRIORITIES = ('library', 'merged')
+LIBRARY_COLUMN_ALIASES = {'FragmentLossType': 'FragmenLossType'}
+
+# Rows of a TSV library read to infer its column types for a Parquet merge
+MERGE_SCHEMA_SAMPLE_ROWS = 10_000
+
+# Library columns that identify the rows written for one precursor best hit
+LIBRARY_PRECURSOR_KEY = [
+    'ModifiedPeptideSequence',
+    'PrecursorCharge',
+    'AverageExperimentalRetentionTime',
+    'PrecursorMz',
+]
+
 # Physical constants for CCS to IM conversion (Mason-Schamp equation)
 AVOGADRO = 6.02214076e23          # mol^-1
 BOLTZMANN = 1.38064852e-23        # J/K
@@ -125,6 +231,12 @@ DINUCLEOTIDE_NORMALIZATION = {
     'CA': 'AC', 'GA': 'AG', 'GC': 'CG',
 }
 
+# Precompiled patterns for modified sequences and fragment annotations
+MODIFIED_RESIDUE_PATTERN = re.compile(r'([A-Z])\(([^)]+)\)')   # M(Oxidation)
+PAREN_MOD_PATTERN = re.compile(r'\([^)]+\)')                   # (Oxidation)
+BRACKET_MOD_PATTERN = re.compile(r'\[([^\]]+)\]')              # [UU]
+ION_ANNOTATION_PATTERN = re.compile(r'^([abcy])(\d+)')          # y2, b3+C'-NH3
+
 
 # =============================================================================
 # Data Classes
@@ -147,6 +259,7 @@ class ConverterConfig:
     # iRT conversion
     irt_mode: Literal['none', 'linear', 'piecewise'] = 'none'
     irt_reference_file: Optional[Path] = None
+    irt_cache_dir: Optional[Path] = None  # fitted models cached by reference hash
 
     # CCS conversion parameters (timsTOF defaults)
     drift_gas_mass: float = 28.0134  # N2 in Da
@@ -155,10 +268,76 @@ class ConverterConfig:
     # Fragment filtering
     fragment_types: List[str] = field(default_factory=lambda: ['b', 'y'])
 
+    # Top-N fragment selection (None: keep all fragments in the m/z range)
+    top_fragments: Optional[int] = None
+    fragment_min_mz: Optional[float] = None
+    fragment_max_mz: Optional[float] = None
+
+    # Library merge: DIA-NN libraries merged into the output library.
+    # Duplicate precursors (modified sequence + charge) are taken from the
+    # converted library ('library') or from the merged libraries ('merged',
+    # earlier files first)
+    merge_libraries: List[Path] = field(default_factory=list)
+    merge_priority: Literal['library', 'merged'] = 'library'
+
+    # Streaming input (rows per chunk, or a memory budget in MB per raw chunk)
+    chunk_size: Optional[int] = None
+    max_memory_mb: Optional[float] = None
+
+    # Parallel execution (number of worker processes for run_pipeline)
+    workers: int = 1
+
+    # Lazy execution: record fluent steps and run an optimized plan on
+    # save() / .library / collect()
+    lazy: bool = False
+
+    # Record wall time, row counts and memory per stage (see get_stats());
+    # trace_memory adds tracemalloc allocation tracking (slows the build)
+    profile: bool = False
+    trace_memory: bool = True
+
     # Logging
     verbose: bool = False
 
 
+# =============================================================================
+# Lazy Execution
+# =============================================================================
+
+# Steps that only drop precursor rows and can be fused into one mask
+ROW_FILTER_STEPS = ('filter_decoys', 'filter_localization', 'filter_charge')
+
+# Fragment-row steps that filter_fragment_ions can be pushed down past
+FRAGMENT_ROW_STEPS = ('convert_rt_to_irt',)
+
+
+def _plan_step(method: Callable) -> Callable:
+    """Record a fluent step instead of running it when the converter is lazy."""
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.config.lazy and not self._executing:
+            self._plan.append((method.__name__, args, kwargs))
+            return self
+        return self._run_stage(method.__name__, method, self, *args, **kwargs)
+
+    return wrapper
+
+
+def _profiled_step(method: Callable) -> Callable:
+    """Profile a stage that always runs immediately (e.g. save).
+
+    Pending lazy steps are executed (and profiled) first.
+    """
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        self.collect()
+        return self._run_stage(method.__name__, method, self, *args, **kwargs)
+
+    return wrapper
+
+
 # =============================================================================
 # Main Converter Class
 # =============================================================================
@@ -185,6 +364,16 @@ class NuXLLibraryConverter:
         self._combined_df: Optional[pd.DataFrame] = None
         self._library_df: Optional[pd.DataFrame] = None
         self._irt_model: Optional[Callable] = None
+        self._irt_model_info: Optional[Dict] = None
+        self._merge_stats: Optional[Dict] = None
+
+        # Lazy execution state
+        self._plan: List[Tuple[str, tuple, dict]] = []
+        self._executing = False
+
+        # Profiling state (config.profile)
+        self._stage_stats: List[Dict] = []
+        self._profiling = False
 
     def _setup_logging(self) -> None:
         """Configure logging."""
@@ -199,54 +388,303 @@ class NuXLLibraryConverter:
     # File Loading
     # =========================================================================
 
-    def load_files(self, files: Optional[List[Union[str, Path]]] = None) -> 'NuXLLibraryConverter':
+    @_plan_step
+    def load_files(self, files: Optional[List[Union[str, Path]]] = None,
+                   prefilter: bool = False) -> 'NuXLLibraryConverter':
         """
         Load NuXL TextExporter output files.
 
+        Only the columns in NUXL_COLUMNS are read. With config.chunk_size or
+        config.max_memory_mb set, files are streamed in chunks.
+
         Args:
             files: List of file paths. If None, uses config.input_files.
                    Accepts both XLs.unknown and peptides.unknown files.
+            prefilter: Apply the default decoy, localization score and
+                       charge filters to each chunk while reading, so that
+                       only surviving rows are kept in memory; the
+                       filter_* steps are then not needed
 
         Returns:
             self for method chaining
         """
+        return self._load_inputs(files, self._config_row_filters() if prefilter else None)
+
+    def _load_inputs(self, files: Optional[List[Union[str, Path]]],
+                     row_filters: Optional[List[Tuple[str, Any]]]) -> 'NuXLLibraryConverter':
+        """Load input files, applying resolved row filters to each chunk."""
         files = files or self.config.input_files
         files = [Path(f) for f in files]
 
-        xl_files = [f for f in files if '_XLs.unknown' in f.name or f.name.endswith('_XLs.unknown')]
-        pep_files = [f for f in files if '_peptides.unknown' in f.name or f.name.endswith('_peptides.unknown')]
+        xl_files = [f for f in files if self._input_kind(f) == 'xl']
+        pep_files = [f for f in files if self._input_kind(f) == 'pep']
 
         self.logger.info(f"Loading {len(xl_files)} XL files and {len(pep_files)} peptide files")
 
         if xl_files:
-            self._xl_df = self._load_and_combine(xl_files, is_crosslink=True)
+            self._xl_df = self._load_and_combine(xl_files, is_crosslink=True, row_filters=row_filters)
             self.logger.info(f"Loaded {len(self._xl_df)} crosslink entries")
 
         if pep_files:
-            self._pep_df = self._load_and_combine(pep_files, is_crosslink=False)
+            self._pep_df = self._load_and_combine(pep_files, is_crosslink=False, row_filters=row_filters)
             self.logger.info(f"Loaded {len(self._pep_df)} peptide entries")
 
         if self._xl_df is None and self._pep_df is None:
-            raise ValueError(f"No valid input files found. Looking for *_XLs.unknown or *_peptides.unknown")
+            raise ValueError("No valid input files found. Looking for *_XLs.unknown or *_peptides.unknown "
+                             "(or *_XLs.idXML / *_peptides.idXML)")
 
         return self
 
-    def _load_and_combine(self, files: List[Path], is_crosslink: bool) -> pd.DataFrame:
+    @_plan_step
+    def load_idxml(self, files: Optional[List[Union[str, Path]]] = None,
+                   prefilter: bool = False) -> 'NuXLLibraryConverter':
+        """
+        Load NuXL idXML files directly, without a TextExporter export.
+
+        Reads the hit fields and meta values that the TextExporter columns
+        in NUXL_COLUMNS are made of (RT, m/z, sequence, charge, protein
+        accessions, NuXL:NA, NuXL:best_localization*, NuXL:score,
+        target_decoy, IM and the fragment annotations) with a streaming XML
+        parser. Chunking and prefiltering work as in load_files.
+
+        Args:
+            files: List of *_XLs.idXML / *_peptides.idXML paths.
+                   If None, uses config.input_files.
+            prefilter: Apply the config row filters while reading
+
+        Returns:
+            self for method chaining
+        """
+        files = [Path(f) for f in (files or self.config.input_files)]
+        not_idxml = [f.name for f in files if f.suffix.lower() != '.idxml']
+        if not_idxml:
+            raise ValueError(f"load_idxml() expects idXML files, got: {not_idxml}")
+
+        return self._load_inputs(files, self._config_row_filters() if prefilter else None)
+
+    def _input_kind(self, path: Path) -> Optional[str]:
+        """Classify an input file as 'xl', 'pep' or None (unknown)."""
+        if path.suffix.lower() not in ('.unknown', '.idxml'):
+            return None
+        if '_XLs.' in path.name:
+            return 'xl'
+        if '_peptides.' in path.name:
+            return 'pep'
+        return None
+
+    def _load_and_combine(self, files: List[Path], is_crosslink: bool,
+                          row_filters: Optional[List[Tuple[str, Any]]] = None) -> pd.DataFrame:
         """Load multiple files and combine into single DataFrame."""
+        chunk_size = self._resolve_chunk_size(files)
         dfs = []
         for f in files:
-            self.logger.debug(f"Reading {f}")
-            df = pd.read_csv(f, sep='\t', low_memory=False)
-            df['_source_file'] = f.name
-            df['_is_crosslink'] = is_crosslink
-            dfs.append(df)
+            self.logger.debug(f"Reading {f}" + (f" in chunks of {chunk_size} rows" if chunk_size else ""))
+            reader = self._read_nuxl_table(f, chunksize=chunk_size)
+            chunks = reader if chunk_size else [reader]
+
+            for df in chunks:
+                if row_filters:
+                    df = self._apply_row_filters(df, is_crosslink, row_filters)
+                df['_source_file'] = f.name
+                df['_is_crosslink'] = is_crosslink
+                dfs.append(df)
 
         return pd.concat(dfs, ignore_index=True)
 
+    def _read_nuxl_table(self, path: Path, **kwargs):
+        """Read the NUXL_COLUMNS subset of a TextExporter (or idXML) file with explicit dtypes."""
+        if path.suffix.lower() == '.idxml':
+            return self._read_idxml_table(path, **kwargs)
+
+        wanted = set(NUXL_COLUMNS.values())
+        return pd.read_csv(
+            path,
+            sep='\t',
+            usecols=lambda col: col in wanted,
+            dtype=NUXL_DTYPES,
+            **kwargs
+        )
+
+    def _read_idxml_table(self, path: Path, chunksize: Optional[int] = None,
+                          nrows: Optional[int] = None):
+        """
+        Read an idXML file into the NUXL_COLUMNS schema.
+
+        Mirrors _read_nuxl_table: returns a DataFrame, or an iterator of
+        DataFrames with chunksize rows each when chunksize is given.
+        """
+        rows = self._iter_idxml_rows(path)
+        if nrows is not None:
+            rows = itertools.islice(rows, nrows)
+
+        if chunksize is None:
+            return self._idxml_rows_to_frame(list(rows))
+
+        def chunks() -> Iterator[pd.DataFrame]:
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) == chunksize:
+                    yield self._idxml_rows_to_frame(batch)
+                    batch = []
+            if batch:
+                yield self._idxml_rows_to_frame(batch)
+
+        return chunks()
+
+    def _iter_idxml_rows(self, path: Path) -> Iterator[Dict[str, Any]]:
+        """
+        Stream one row per PeptideHit from an idXML file.
+
+        Elements are cleared after use, so memory stays bounded by one
+        PeptideIdentification plus the protein accession table.
+        """
+        accessions: Dict[str, str] = {}
+        peptide_id: Dict[str, str] = {}
+        hits: List[Dict[str, Any]] = []
+        depth_tags: List[str] = []
+
+        for event, elem in ET.iterparse(str(path), events=('start', 'end')):
+            tag = elem.tag.rsplit('}', 1)[-1]
+
+            if event == 'start':
+                depth_tags.append(tag)
+                if tag == 'PeptideIdentification':
+                    peptide_id = dict(elem.attrib)
+                    hits = []
+                continue
+
+            depth_tags.pop()
+            parent = depth_tags[-1] if depth_tags else None
+
+            if tag == 'ProteinHit':
+                accessions[elem.get('id')] = elem.get('accession')
+                elem.clear()
+
+            elif tag == 'PeptideHit':
+                params = {
+                    child.get('name'): child.get('value')
+                    for child in elem if child.tag.rsplit('}', 1)[-1] == 'UserParam'
+                }
+                refs = (elem.get('protein_refs') or '').split()
+                row = {
+                    NUXL_COLUMNS[key]: elem.get(attribute)
+                    for key, attribute in IDXML_HIT_ATTRIBUTES.items()
+                }
+                # TextExporter prints the sorted, unique accession set
+                row[NUXL_COLUMNS['accessions']] = ';'.join(
+                    sorted({accessions[r] for r in refs if r in accessions})
+                )
+                for key, name in IDXML_USER_PARAMS.items():
+                    row[NUXL_COLUMNS[key]] = params.get(name)
+                hits.append(row)
+                elem.clear()
+
+            elif tag == 'UserParam' and parent == 'PeptideIdentification':
+                peptide_id.setdefault('_param:' + elem.get('name'), elem.get('value'))
+
+            elif tag == 'PeptideIdentification':
+                shared = {
+                    NUXL_COLUMNS[key]: peptide_id.get(attribute)
+                    for key, attribute in IDXML_PEPTIDE_ID_ATTRIBUTES.items()
+                }
+                ccs = peptide_id.get('_param:' + IDXML_USER_PARAMS['ccs'])
+                for row in hits:
+                    row.update(shared)
+                    if row[NUXL_COLUMNS['ccs']] is None:
+                        row[NUXL_COLUMNS['ccs']] = ccs
+                    yield row
+                hits = []
+                elem.clear()
+
+    def _idxml_rows_to_frame(self, rows: List[Dict[str, Any]]) -> pd.DataFrame:
+        """Convert idXML hit rows to a DataFrame typed like a TextExporter read."""
+        columns = [NUXL_COLUMNS[key] for key in NUXL_COLUMNS]
+        df = pd.DataFrame.from_records(rows, columns=columns)
+
+        # Meta values missing from every hit are missing columns in TextExporter
+        # output too (e.g. IM for data without ion mobility)
+        df = df.dropna(axis=1, how='all') if len(df) > 0 else df
+
+        for column in df.columns:
+            if NUXL_DTYPES.get(column) == 'float64':
+                df[column] = df[column].astype(np.float64)
+            elif column in (NUXL_COLUMNS[key] for key in IDXML_INT_COLUMNS):
+                df[column] = pd.to_numeric(df[column])
+            else:
+                df[column] = df[column].where(df[column].notna(), np.nan)
+
+        return df
+
+    def _resolve_chunk_size(self, files: List[Path]) -> Optional[int]:
+        """
+        Determine the number of rows per chunk for streaming input.
+
+        An explicit config.chunk_size wins. Otherwise config.max_memory_mb is
+        turned into a row count from the in-memory size of a sample of the
+        first file (with a factor of two for parser buffers).
+
+        Returns:
+            Rows per chunk, or None to read each file at once
+        """
+        if self.config.chunk_size:
+            return int(self.config.chunk_size)
+
+        if not self.config.max_memory_mb or not files:
+            return None
+
+        sample = self._read_nuxl_table(files[0], nrows=1000)
+        if len(sample) == 0:
+            return None
+
+        bytes_per_row = sample.memory_usage(deep=True).sum() / len(sample)
+        chunk_size = int(self.config.max_memory_mb * 1024 ** 2 / (2 * bytes_per_row))
+        chunk_size = max(chunk_size, 1000)
+        self.logger.info(f"Streaming input in chunks of {chunk_size} rows "
+                         f"(~{bytes_per_row:.0f} bytes/row, budget {self.config.max_memory_mb} MB)")
+        return chunk_size
+
+    def _config_row_filters(self) -> List[Tuple[str, Any]]:
+        """Row filters equivalent to the default filter_* steps of the pipeline."""
+        filters = [('decoys', True), ('localization', self.config.min_localization_score)]
+        if self.config.max_charge is not None:
+            filters.append(('charge', self.config.max_charge))
+        return filters
+
+    def _apply_row_filters(self, df: pd.DataFrame, is_crosslink: bool,
+                           row_filters: List[Tuple[str, Any]]) -> pd.DataFrame:
+        """
+        Apply resolved row filters as a single mask.
+
+        Args:
+            df: Precursor rows
+            is_crosslink: Whether df holds crosslinks (localization filter applies)
+            row_filters: ('decoys', True), ('localization', min_score) and
+                         ('charge', max_charge) entries, as resolved from the
+                         corresponding filter_* steps
+
+        Returns:
+            Filtered rows (df itself if nothing is removed)
+        """
+        keep = np.ones(len(df), dtype=bool)
+
+        for kind, value in row_filters:
+            if kind == 'decoys':
+                keep &= ~self._pure_decoy_mask(df)
+            elif kind == 'localization':
+                col = NUXL_COLUMNS['localization_score']
+                if is_crosslink and col in df.columns:
+                    keep &= (df[col] > value).to_numpy()
+            elif kind == 'charge':
+                keep &= (df[NUXL_COLUMNS['charge']] <= value).to_numpy()
+
+        return df.take(np.flatnonzero(keep)) if not keep.all() else df
+
     # =========================================================================
     # Filtering
     # =========================================================================
 
+    @_plan_step
     def filter_localization(self, min_score: Optional[float] = None) -> 'NuXLLibraryConverter':
         """
         Filter crosslinks by localization score.
@@ -269,6 +707,7 @@ class NuXLLibraryConverter:
 
         return self
 
+    @_plan_step
     def filter_decoys(self, remove: bool = True) -> 'NuXLLibraryConverter':
         """
         Remove pure decoy entries.
@@ -285,29 +724,33 @@ class NuXLLibraryConverter:
         if not remove:
             return self
 
-        acc_col = NUXL_COLUMNS['accessions']
-
-        def is_pure_decoy(accessions: str) -> bool:
-            """Check if ALL accessions are decoys."""
-            if pd.isna(accessions):
-                return False
-            parts = accessions.split(';')
-            return all(p.strip().upper().startswith('DECOY') for p in parts)
-
         if self._xl_df is not None and len(self._xl_df) > 0:
             before = len(self._xl_df)
-            mask = ~self._xl_df[acc_col].apply(is_pure_decoy)
+            mask = ~self._pure_decoy_mask(self._xl_df)
             self._xl_df = self._xl_df[mask].copy()
             self.logger.info(f"Filtered XL decoys: {before} -> {len(self._xl_df)}")
 
         if self._pep_df is not None and len(self._pep_df) > 0:
             before = len(self._pep_df)
-            mask = ~self._pep_df[acc_col].apply(is_pure_decoy)
+            mask = ~self._pure_decoy_mask(self._pep_df)
             self._pep_df = self._pep_df[mask].copy()
             self.logger.info(f"Filtered peptide decoys: {before} -> {len(self._pep_df)}")
 
         return self
 
+    def _pure_decoy_mask(self, df: pd.DataFrame) -> np.ndarray:
+        """Boolean mask of rows whose accessions are ALL decoys."""
+
+        def is_pure_decoy(accessions: str) -> bool:
+            """Check if ALL accessions are decoys."""
+            if pd.isna(accessions):
+                return False
+            parts = accessions.split(';')
+            return all(p.strip().upper().startswith('DECOY') for p in parts)
+
+        return self._map_unique(df[NUXL_COLUMNS['accessions']], is_pure_decoy).astype(bool)
+
+    @_plan_step
     def filter_charge(self, max_charge: Optional[int] = None) -> 'NuXLLibraryConverter':
         """
         Filter by maximum precursor charge.
@@ -350,6 +793,7 @@ class NuXLLibraryConverter:
     # Deduplication
     # =========================================================================
 
+    @_plan_step
     def deduplicate(self) -> 'NuXLLibraryConverter':
         """
         Deduplicate entries by (sequence, nucleotide, charge), keeping best scores.
@@ -376,50 +820,60 @@ class NuXLLibraryConverter:
         Matches R script logic (tj_maxl): prioritize localization score first,
         then NuXL score as tiebreaker.
         """
-        seq_col = NUXL_COLUMNS['sequence']
-        na_col = NUXL_COLUMNS['nucleotide']
-        charge_col = NUXL_COLUMNS['charge']
-        score_col = NUXL_COLUMNS['nuxl_score']
-        loc_col = NUXL_COLUMNS['localization_score']
-
-        df = df.copy()
-
-        # Create composite ID (matches R: paste(sequence, nucleic, charge))
-        df['_id'] = (df[seq_col].astype(str) + '_' +
-                    df[na_col].astype(str) + '_' +
-                    df[charge_col].astype(str))
+        # Composite key (matches R: paste(sequence, nucleic, charge))
+        key_cols = [NUXL_COLUMNS['sequence'], NUXL_COLUMNS['nucleotide'], NUXL_COLUMNS['charge']]
 
         before = len(df)
 
         # Match R script tj_maxl logic:
         # 1. top_n(1, locscore) - prioritize localization score
         # 2. top_n(1, nuxl_score) - then NuXL score as tiebreaker
-        df = df.sort_values([loc_col, score_col], ascending=[False, False])
-        df = df.drop_duplicates(subset='_id', keep='first')
+        df = self._best_per_group(
+            df, key_cols, [NUXL_COLUMNS['localization_score'], NUXL_COLUMNS['nuxl_score']]
+        )
 
         self.logger.info(f"Deduplicated XLs: {before} -> {len(df)}")
         return df
 
     def _deduplicate_pep(self, df: pd.DataFrame) -> pd.DataFrame:
         """Deduplicate peptides by (sequence, charge)."""
-        seq_col = NUXL_COLUMNS['sequence']
-        charge_col = NUXL_COLUMNS['charge']
-        score_col = NUXL_COLUMNS['nuxl_score']
-
-        df = df.copy()
-        df['_id'] = df[seq_col].astype(str) + '_' + df[charge_col].astype(str)
+        key_cols = [NUXL_COLUMNS['sequence'], NUXL_COLUMNS['charge']]
 
         before = len(df)
-        df = df.sort_values(score_col, ascending=False)
-        df = df.drop_duplicates(subset='_id', keep='first')
+        df = self._best_per_group(df, key_cols, [NUXL_COLUMNS['nuxl_score']])
 
         self.logger.info(f"Deduplicated peptides: {before} -> {len(df)}")
         return df
 
+    def _best_per_group(self, df: pd.DataFrame, key_cols: List[str],
+                        score_cols: List[str]) -> pd.DataFrame:
+        """
+        Keep the best row per key, ordered by descending scores.
+
+        Rows are ranked with a stable lexsort on the negated scores (first
+        score column has priority, missing scores rank last, ties keep input
+        order) and the first row of each integer group code is kept. The
+        result is in ranking order, the same as a descending sort_values
+        followed by drop_duplicates on the key.
+
+        Args:
+            df: Input DataFrame
+            key_cols: Columns that identify a group
+            score_cols: Score columns, highest priority first
+
+        Returns:
+            One row per group
+        """
+        codes = self._group_codes(df, key_cols)
+        order = np.lexsort([-df[col].to_numpy(dtype=float) for col in reversed(score_cols)])
+        first = np.unique(codes[order], return_index=True)[1]
+        return df.take(order[np.sort(first)])
+
     # =========================================================================
     # CCS to Ion Mobility Conversion
     # =========================================================================
 
+    @_plan_step
     def convert_ccs_to_im(self) -> 'NuXLLibraryConverter':
         """
         Convert CCS values to reduced ion mobility (1/K0).
@@ -438,33 +892,27 @@ class NuXLLibraryConverter:
         has_ccs = False
 
         if self._xl_df is not None and len(self._xl_df) > 0:
-            self._xl_df = self._xl_df.copy()
+            self._xl_df = self._owned(self._xl_df)
             if ccs_col not in self._xl_df.columns:
                 self._xl_df.loc[:, '_ion_mobility'] = np.nan
             else:
                 has_ccs = True
-                self._xl_df.loc[:, '_ion_mobility'] = self._xl_df.apply(
-                    lambda row: self._ccs_to_im(
-                        row[ccs_col],
-                        row[charge_col],
-                        row[mz_col]
-                    ),
-                    axis=1
+                self._xl_df.loc[:, '_ion_mobility'] = self._ccs_to_im_array(
+                    self._xl_df[ccs_col].to_numpy(dtype=float),
+                    self._xl_df[charge_col].to_numpy(dtype=float),
+                    self._xl_df[mz_col].to_numpy(dtype=float),
                 )
 
         if self._pep_df is not None and len(self._pep_df) > 0:
-            self._pep_df = self._pep_df.copy()
+            self._pep_df = self._owned(self._pep_df)
             if ccs_col not in self._pep_df.columns:
                 self._pep_df.loc[:, '_ion_mobility'] = np.nan
             else:
                 has_ccs = True
-                self._pep_df.loc[:, '_ion_mobility'] = self._pep_df.apply(
-                    lambda row: self._ccs_to_im(
-                        row[ccs_col],
-                        row[charge_col],
-                        row[mz_col]
-                    ),
-                    axis=1
+                self._pep_df.loc[:, '_ion_mobility'] = self._ccs_to_im_array(
+                    self._pep_df[ccs_col].to_numpy(dtype=float),
+                    self._pep_df[charge_col].to_numpy(dtype=float),
+                    self._pep_df[mz_col].to_numpy(dtype=float),
                 )
 
         if has_ccs:
@@ -490,6 +938,29 @@ class NuXLLibraryConverter:
         if pd.isna(ccs) or pd.isna(charge) or pd.isna(mz) or charge == 0:
             return np.nan
 
+        return float(self._ccs_to_im_array(
+            np.array([ccs], dtype=float),
+            np.array([charge], dtype=float),
+            np.array([mz], dtype=float),
+        )[0])
+
+    def _ccs_to_im_array(self, ccs: np.ndarray, charge: np.ndarray,
+                         mz: np.ndarray) -> np.ndarray:
+        """
+        Array version of _ccs_to_im (Mason-Schamp on NumPy arrays).
+
+        Args:
+            ccs: Collision cross sections in Angstrom^2
+            charge: Ion charge states
+            mz: Mass-to-charge ratios
+
+        Returns:
+            Reduced ion mobility (1/K0) per entry; NaN where any input is
+            missing or the charge is zero
+        """
+        invalid = np.isnan(ccs) | np.isnan(charge) | np.isnan(mz) | (charge == 0)
+        charge = np.where(invalid, 1.0, charge)
+
         # Calculate ion mass from m/z and charge
         ion_mass = mz * charge
 
@@ -498,22 +969,24 @@ class NuXLLibraryConverter:
                        (ion_mass + self.config.drift_gas_mass)) * AMU_TO_KG
 
         # Temperature factor: sqrt(2*pi / (mu * k_B * T))
-        temp_factor = math.sqrt(
-            2 * math.pi / (reduced_mass * BOLTZMANN * self.config.temperature)
-        )
+        with np.errstate(invalid='ignore', divide='ignore'):
+            temp_factor = np.sqrt(
+                2 * math.pi / (reduced_mass * BOLTZMANN * self.config.temperature)
+            )
 
-        # R formula (matches original implementation):
-        # IM = CCS * N0 / (charge * 3/16 * 1e4 * 1e20 * temp_factor * e)
-        # This computes 1/K0 directly
-        denominator = (charge * (3/16) * 1e4 * 1e20 * temp_factor * ELEMENTARY_CHARGE)
-        im = (ccs * LOSCHMIDT) / denominator
+            # R formula (matches original implementation):
+            # IM = CCS * N0 / (charge * 3/16 * 1e4 * 1e20 * temp_factor * e)
+            # This computes 1/K0 directly
+            denominator = (charge * (3/16) * 1e4 * 1e20 * temp_factor * ELEMENTARY_CHARGE)
+            im = (ccs * LOSCHMIDT) / denominator
 
-        return im
+        return np.where(invalid, np.nan, im)
 
     # =========================================================================
     # Modified Sequence Building
     # =========================================================================
 
+    @_plan_step
     def build_modified_sequences(self) -> 'NuXLLibraryConverter':
         """
         Build DIA-NN format modified sequences.
@@ -530,18 +1003,27 @@ class NuXLLibraryConverter:
             self for method chaining
         """
         if self._xl_df is not None and len(self._xl_df) > 0:
-            self._xl_df['_modified_sequence'] = self._xl_df.apply(
-                lambda row: self._build_xl_modified_sequence(
-                    row[NUXL_COLUMNS['best_localization']],
-                    row[NUXL_COLUMNS['nucleotide']],
-                    row[NUXL_COLUMNS['sequence']],
-                    row[NUXL_COLUMNS['localization_position']]
-                ),
-                axis=1
-            )
+            # The same (localization, NA, sequence, position) tuple shows up in
+            # many CSMs, so build each distinct sequence only once
+            key_cols = [
+                NUXL_COLUMNS['best_localization'],
+                NUXL_COLUMNS['nucleotide'],
+                NUXL_COLUMNS['sequence'],
+                NUXL_COLUMNS['localization_position'],
+            ]
+            codes = self._group_codes(self._xl_df, key_cols)
+            first = np.unique(codes, return_index=True)[1]
+            uniques = self._xl_df[key_cols].iloc[first]
+            built = np.array([
+                self._build_xl_modified_sequence(best_loc, nucleotide, sequence, position)
+                for best_loc, nucleotide, sequence, position
+                in zip(*(uniques[col] for col in key_cols))
+            ], dtype=object)
+            self._xl_df['_modified_sequence'] = built[codes]
 
         if self._pep_df is not None and len(self._pep_df) > 0:
-            self._pep_df['_modified_sequence'] = self._pep_df[NUXL_COLUMNS['sequence']].apply(
+            self._pep_df['_modified_sequence'] = self._map_unique(
+                self._pep_df[NUXL_COLUMNS['sequence']],
                 self._convert_modification_format
             )
 
@@ -588,16 +1070,17 @@ class NuXLLibraryConverter:
             return self._convert_modification_format(original_seq) if not pd.isna(original_seq) else ''
 
         # Check if the XL position has an existing modification in original_seq
-        mod_pattern = r'([A-Z])\(([^)]+)\)'
         mod_positions = {}  # position -> (aa, mod_name)
 
         if not pd.isna(original_seq):
-            for match in re.finditer(mod_pattern, original_seq):
+            removed = 0
+            for match in MODIFIED_RESIDUE_PATTERN.finditer(original_seq):
                 aa = match.group(1)
                 mod_name = match.group(2)
-                # Calculate position in stripped sequence
-                prefix = original_seq[:match.start()]
-                pos = len(re.sub(mod_pattern, '', prefix))
+                # Calculate position in stripped sequence (the prefix with all
+                # earlier "X(mod)" matches removed)
+                pos = match.start() - removed
+                removed += match.end() - match.start()
                 mod_positions[pos] = (aa, mod_name)
 
         # Check if XL position conflicts with an existing modification
@@ -802,7 +1285,7 @@ class NuXLLibraryConverter:
             return match.group(0)
 
         # Apply to bracket modifications [...]
-        result = re.sub(r'\[([^\]]+)\]', normalize_match, sequence)
+        result = BRACKET_MOD_PATTERN.sub(normalize_match, sequence)
         return result
 
     def _strip_sequence(self, sequence: str) -> str:
@@ -819,21 +1302,64 @@ class NuXLLibraryConverter:
             return ''
 
         # Remove (mod) and [mod] patterns
-        stripped = re.sub(r'\([^)]+\)', '', str(sequence))
-        stripped = re.sub(r'\[[^\]]+\]', '', stripped)
+        stripped = PAREN_MOD_PATTERN.sub('', str(sequence))
+        stripped = BRACKET_MOD_PATTERN.sub('', stripped)
         return stripped.upper()
 
+    def _map_unique(self, values: pd.Series, func: Callable) -> np.ndarray:
+        """
+        Apply a scalar function once per distinct value and broadcast back.
+
+        Args:
+            values: Input column (missing values are passed to func as NaN)
+            func: Function applied to each distinct value
+
+        Returns:
+            Object array of func results aligned with values
+        """
+        codes, uniques = pd.factorize(values)
+        # Code -1 (missing) picks the trailing func(NaN) entry
+        mapped = np.empty(len(uniques) + 1, dtype=object)
+        mapped[:] = [func(value) for value in uniques] + [func(np.nan)]
+        return mapped[codes]
+
+    def _group_codes(self, df: pd.DataFrame, columns: List[str]) -> np.ndarray:
+        """
+        Dense integer code per distinct combination of column values.
+
+        Codes are numbered in order of first appearance; missing values form
+        their own group.
+
+        Args:
+            df: Input DataFrame
+            columns: Columns that make up the key
+
+        Returns:
+            int64 array of group codes aligned with df
+        """
+        codes = np.zeros(len(df), dtype=np.int64)
+        for col in columns:
+            col_codes, col_uniques = pd.factorize(df[col])
+            codes = codes * (len(col_uniques) + 1) + (col_codes + 1)
+            codes, _ = pd.factorize(codes)
+        return codes.astype(np.int64, copy=False)
+
     # =========================================================================
     # Peak Annotation Parsing
     # =========================================================================
 
-    def parse_peak_annotations(self) -> 'NuXLLibraryConverter':
+    @_plan_step
+    def parse_peak_annotations(self, fragment_types: Optional[List[str]] = None) -> 'NuXLLibraryConverter':
         """
         Parse peak annotations and expand into fragment rows.
 
         Combines XL and peptide DataFrames, then expands each precursor
         into multiple rows (one per fragment ion).
 
+        Args:
+            fragment_types: Only materialize fragments of these types (same
+                            result as a following filter_fragment_ions)
+
         Returns:
             self for method chaining
         """
@@ -851,30 +1377,183 @@ class NuXLLibraryConverter:
         self.logger.info(f"Combined {len(self._combined_df)} precursor entries")
 
         # Expand each row into multiple fragment rows
-        expanded_rows = []
+        self._library_df = self._expand_fragments(self._combined_df, fragment_types=fragment_types)
+        self.logger.info(f"Parsed annotations: {len(self._library_df)} fragment entries"
+                         + (f" (types {list(fragment_types)})" if fragment_types is not None else ""))
+
+        return self
+
+    def _expand_fragments(self, df: pd.DataFrame, carry: Tuple[str, ...] = (),
+                          fragment_types: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Expand precursor rows into one row per annotated fragment ion.
+
+        Annotation strings are split column-wise into flat arrays, each
+        distinct ion annotation is parsed once and the precursor-level
+        columns are broadcast to their fragments by position.
+
+        Args:
+            df: Combined precursor DataFrame
+            carry: Additional precursor columns to broadcast to the fragments
+            fragment_types: Keep only fragments of these types
+
+        Returns:
+            Fragment-level DataFrame with internal library columns
+        """
+        fragments = self._split_annotations(df[NUXL_COLUMNS['peak_annotations']])
+        positions = fragments['_pos'].to_numpy()
+
+        # Annotation strings repeat constantly, so parse each one only once
+        codes, uniques = pd.factorize(fragments['_annotation'])
+        parsed = [self._parse_ion_annotation(annotation) for annotation in uniques]
+        frag_types = np.array([p[0] for p in parsed], dtype=object)
+        frag_numbers = np.array(
+            [np.nan if p[1] is None else p[1] for p in parsed], dtype=float
+        )
+        loss_types = np.array([p[2] for p in parsed], dtype=object)
 
-        for idx, row in self._combined_df.iterrows():
-            fragments = self._parse_annotation_string(
-                row[NUXL_COLUMNS['peak_annotations']]
+        fragment_number = frag_numbers[codes]
+        # The series number dtype depends on all fragments (as if expanded
+        # first and filtered afterwards)
+        integer_numbers = not np.isnan(fragment_number).any()
+
+        if fragment_types is not None:
+            selected = np.flatnonzero(
+                pd.Series(frag_types, dtype=object).isin(fragment_types).to_numpy()[codes]
             )
+            fragments = fragments.take(selected)
+            positions = positions[selected]
+            codes = codes[selected]
+            fragment_number = fragment_number[selected]
+
+        if integer_numbers:
+            fragment_number = fragment_number.astype(np.int16)
+
+        def precursor_column(column: str) -> np.ndarray:
+            return df[column].to_numpy()[positions]
+
+        def optional_column(column: str, default) -> np.ndarray:
+            if column not in df.columns:
+                return np.full(len(positions), default, dtype=object if isinstance(default, str) else float)
+            return precursor_column(column)
+
+        def categorical(values: np.ndarray, value_codes: np.ndarray) -> pd.Categorical:
+            # Strings are stored once per distinct value, fragments hold codes
+            uniques_codes, uniques = pd.factorize(values)
+            return pd.Categorical.from_codes(uniques_codes[value_codes], uniques)
+
+        def precursor_categorical(values: np.ndarray) -> pd.Categorical:
+            return categorical(values, positions)
+
+        stripped = self._map_unique(df[NUXL_COLUMNS['sequence']], self._strip_sequence)
+        modified = (df['_modified_sequence'].to_numpy() if '_modified_sequence' in df.columns
+                    else np.full(len(df), '', dtype=object))
+
+        library = pd.DataFrame({
+            '_modified_sequence': precursor_categorical(modified),
+            '_precursor_charge': precursor_column(NUXL_COLUMNS['charge']).astype(np.int8),
+            '_rt': precursor_column(NUXL_COLUMNS['rt']),
+            '_ion_mobility': optional_column('_ion_mobility', np.nan),
+            '_stripped_sequence': precursor_categorical(stripped),
+            '_precursor_mz': precursor_column(NUXL_COLUMNS['mz']),
+            '_protein_id': precursor_categorical(df[NUXL_COLUMNS['accessions']].to_numpy()),
+            '_product_mz': fragments['_product_mz'].to_numpy(),
+            '_intensity': fragments['_intensity'].to_numpy(),
+            '_fragment_charge': fragments['_fragment_charge'].to_numpy().astype(np.int8),
+            '_annotation': pd.Categorical.from_codes(codes, uniques),
+            '_fragment_type': categorical(frag_types, codes),
+            '_fragment_number': fragment_number,
+            '_loss_type': categorical(loss_types, codes),
+        })
 
-            for frag in fragments:
-                expanded_row = {
-                    '_modified_sequence': row.get('_modified_sequence', ''),
-                    '_precursor_charge': row[NUXL_COLUMNS['charge']],
-                    '_rt': row[NUXL_COLUMNS['rt']],
-                    '_ion_mobility': row.get('_ion_mobility', np.nan),
-                    '_stripped_sequence': self._strip_sequence(row[NUXL_COLUMNS['sequence']]),
-                    '_precursor_mz': row[NUXL_COLUMNS['mz']],
-                    '_protein_id': row[NUXL_COLUMNS['accessions']],
-                    **frag
-                }
-                expanded_rows.append(expanded_row)
+        for column in carry:
+            library[column] = optional_column(column, np.nan)
 
-        self._library_df = pd.DataFrame(expanded_rows)
-        self.logger.info(f"Parsed annotations: {len(expanded_rows)} fragment entries")
+        return library
 
-        return self
+    def _split_annotations(self, annotations: pd.Series) -> pd.DataFrame:
+        """
+        Split peak annotation strings into one row per fragment.
+
+        Well-formed strings are handled with vectorized split/explode.
+        Precursors containing any fragment the fast path cannot parse are
+        re-parsed with _parse_annotation_string, so malformed fragments are
+        skipped exactly as before.
+
+        Args:
+            annotations: Peak annotation column (one string per precursor)
+
+        Returns:
+            DataFrame with _pos (precursor position), _product_mz, _intensity,
+            _fragment_charge and _annotation columns, in input order
+        """
+        columns = ['_pos', '_product_mz', '_intensity', '_fragment_charge', '_annotation']
+        all_positions = np.arange(len(annotations))
+        present = annotations.notna().to_numpy()
+
+        parts = (annotations[present].astype(str)
+                 .str.replace('"', '', regex=False)
+                 .str.split('|'))
+        parts.index = all_positions[present]
+        parts = parts.explode()
+        parts = parts[parts.str.strip() != '']
+
+        if len(parts) == 0:
+            return pd.DataFrame({
+                '_pos': np.array([], dtype=np.int64),
+                '_product_mz': np.array([], dtype=float),
+                '_intensity': np.array([], dtype=float),
+                '_fragment_charge': np.array([], dtype=np.int64),
+                '_annotation': np.array([], dtype=object),
+            })
+
+        # Fields: mz, intensity, charge, annotation (which may contain commas)
+        fields = parts.str.split(',', n=3, expand=True).reindex(columns=range(4))
+        fields = fields[fields[3].notna()]
+
+        float_pattern = r'[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?'
+        well_formed = (fields[0].str.fullmatch(float_pattern) &
+                       fields[1].str.fullmatch(float_pattern) &
+                       fields[2].str.fullmatch(r'[+-]?\d+')).to_numpy(dtype=bool)
+
+        row_positions = fields.index.to_numpy()
+        malformed = np.unique(row_positions[~well_formed])
+        keep = well_formed & ~np.isin(row_positions, malformed)
+        fast = fields[keep]
+
+        # Series.astype(float) uses the same conversion as float(), so values
+        # match the per-fragment parser bit for bit
+        result = pd.DataFrame({
+            '_pos': row_positions[keep],
+            '_product_mz': fast[0].astype(np.float64).to_numpy(),
+            '_intensity': fast[1].astype(np.float64).to_numpy(),
+            '_fragment_charge': fast[2].astype(np.int64).to_numpy(),
+            '_annotation': fast[3].to_numpy(),
+        })
+
+        if len(malformed) == 0:
+            return result
+
+        self.logger.debug(f"Falling back to per-fragment parsing for {len(malformed)} precursors")
+        fallback_rows = []
+        for pos in malformed:
+            for frag in self._parse_annotation_string(annotations.iloc[pos]):
+                fallback_rows.append({
+                    '_pos': pos,
+                    '_product_mz': frag['_product_mz'],
+                    '_intensity': frag['_intensity'],
+                    '_fragment_charge': frag['_fragment_charge'],
+                    '_annotation': frag['_annotation'],
+                })
+
+        if not fallback_rows:
+            return result
+
+        # Each precursor comes from exactly one path, so a stable sort on the
+        # position restores the original fragment order
+        result = pd.concat([result, pd.DataFrame(fallback_rows, columns=columns)],
+                           ignore_index=True)
+        return result.sort_values('_pos', kind='mergesort').reset_index(drop=True)
 
     def _parse_annotation_string(self, ann_str: str) -> List[Dict]:
         """
@@ -946,7 +1625,7 @@ class NuXLLibraryConverter:
             return None, None, None
 
         # Extract b/y/a ion info
-        match = re.match(r'^([abcy])(\d+)', annotation)
+        match = ION_ANNOTATION_PATTERN.match(annotation)
         if match:
             frag_type = match.group(1)
             frag_num = int(match.group(2))
@@ -964,6 +1643,7 @@ class NuXLLibraryConverter:
     # Fragment Filtering
     # =========================================================================
 
+    @_plan_step
     def filter_fragment_ions(self, types: Optional[List[str]] = None) -> 'NuXLLibraryConverter':
         """
         Filter to keep only specified fragment ion types.
@@ -987,10 +1667,77 @@ class NuXLLibraryConverter:
 
         return self
 
+    @_plan_step
+    def select_top_fragments(self, n: Optional[int] = None, min_mz: Optional[float] = None,
+                             max_mz: Optional[float] = None) -> 'NuXLLibraryConverter':
+        """
+        Keep the N most intense fragments per precursor and normalize intensities.
+
+        Fragments outside [min_mz, max_mz] are dropped first. Fragments are
+        ranked per precursor by intensity (ties keep annotation order) and
+        the kept intensities are rescaled to a per-precursor maximum of 1.
+        Without any of n, min_mz, max_mz (arguments or config), the library
+        is left unchanged.
+
+        Args:
+            n: Number of fragments to keep per precursor (default: config.top_fragments)
+            min_mz: Minimum product m/z (default: config.fragment_min_mz)
+            max_mz: Maximum product m/z (default: config.fragment_max_mz)
+
+        Returns:
+            self for method chaining
+        """
+        n = n if n is not None else self.config.top_fragments
+        min_mz = min_mz if min_mz is not None else self.config.fragment_min_mz
+        max_mz = max_mz if max_mz is not None else self.config.fragment_max_mz
+
+        if n is None and min_mz is None and max_mz is None:
+            return self
+
+        if self._library_df is None or len(self._library_df) == 0:
+            raise ValueError("No library data. Call parse_peak_annotations() first.")
+
+        library = self._library_df
+        before = len(library)
+
+        product_mz = library['_product_mz'].to_numpy()
+        keep = np.ones(len(library), dtype=bool)
+        if min_mz is not None:
+            keep &= product_mz >= min_mz
+        if max_mz is not None:
+            keep &= product_mz <= max_mz
+        library = library.take(np.flatnonzero(keep))
+
+        # Fragments of one precursor share these precursor-level values
+        precursor = self._group_codes(
+            library, ['_modified_sequence', '_precursor_charge', '_rt', '_precursor_mz']
+        )
+        intensity = library['_intensity']
+
+        if n is not None:
+            rank = intensity.groupby(precursor).rank(method='first', ascending=False)
+            top = (rank <= n).to_numpy()
+            library = library.take(np.flatnonzero(top))
+            precursor = precursor[top]
+            intensity = library['_intensity']
+
+        max_intensity = intensity.groupby(precursor).transform('max').to_numpy()
+        library['_intensity'] = np.divide(
+            intensity.to_numpy(), max_intensity,
+            out=np.zeros(len(library)), where=max_intensity > 0,
+        )
+
+        self._library_df = library
+        self.logger.info(f"Selected top fragments (n={n}, m/z {min_mz}-{max_mz}): "
+                         f"{before} -> {len(library)}")
+
+        return self
+
     # =========================================================================
     # iRT Conversion
     # =========================================================================
 
+    @_plan_step
     def convert_rt_to_irt(self, mode: Optional[str] = None,
                           reference: Optional[Union[str, Path, pd.DataFrame]] = None) -> 'NuXLLibraryConverter':
         """
@@ -1022,33 +1769,132 @@ class NuXLLibraryConverter:
             self._library_df['_irt'] = np.nan
             return self
 
-        # Fit model
-        self._irt_model = self._fit_irt_model(ref_df, mode)
+        # Fit model (or load it from the model cache)
+        self._irt_model = self._cached_irt_model(reference, ref_df, mode)
 
-        # Apply conversion
-        self._library_df['_irt'] = self._library_df['_rt'].apply(
-            lambda x: self._irt_model(x) if not pd.isna(x) else np.nan
-        )
+        # Apply conversion once per unique precursor RT and broadcast back
+        self._library_df['_irt'] = self._predict_irt(self._library_df['_rt'])
 
         self.logger.info(f"Converted RT to iRT using {mode} model")
 
         return self
 
+    def _predict_irt(self, rt: pd.Series) -> np.ndarray:
+        """
+        Evaluate the fitted iRT model on the unique RTs of a column.
+
+        Args:
+            rt: Retention times (fragment rows repeat their precursor RT)
+
+        Returns:
+            iRT values aligned with rt; NaN where rt is missing
+        """
+        codes, uniques = pd.factorize(rt)
+        if len(uniques) == 0:
+            return np.full(len(rt), np.nan)
+
+        unique_irt = np.asarray(
+            self._irt_model(np.asarray(uniques, dtype=float)), dtype=float
+        ).reshape(-1)
+
+        return np.where(codes < 0, np.nan, unique_irt[codes])
+
     def _load_irt_reference(self, reference: Optional[Union[str, Path, pd.DataFrame]]) -> Optional[pd.DataFrame]:
         """Load iRT reference data from various sources."""
         if isinstance(reference, pd.DataFrame):
             return reference
 
-        if reference:
-            ref_path = Path(reference)
-            if ref_path.exists():
-                return pd.read_csv(ref_path, sep='\t')
+        ref_path = self._resolve_irt_reference_path(reference)
+        if ref_path is not None:
+            return pd.read_csv(ref_path, sep='\t')
+
+        return None
+
+    def _resolve_irt_reference_path(self, reference: Optional[Union[str, Path, pd.DataFrame]]) -> Optional[Path]:
+        """Return the reference file used for iRT fitting, if any."""
+        if isinstance(reference, pd.DataFrame):
+            return None
+
+        if reference and Path(reference).exists():
+            return Path(reference)
 
         if self.config.irt_reference_file and self.config.irt_reference_file.exists():
-            return pd.read_csv(self.config.irt_reference_file, sep='\t')
+            return self.config.irt_reference_file
 
         return None
 
+    def _irt_columns(self, ref_df: pd.DataFrame) -> Tuple[str, str]:
+        """Identify the RT and iRT columns of a reference table."""
+        rt_col = 'RT' if 'RT' in ref_df.columns else 'AverageExperimentalRetentionTime'
+        irt_col = 'iRT' if 'iRT' in ref_df.columns else 'NormalizedRetentionTime'
+
+        if rt_col not in ref_df.columns or irt_col not in ref_df.columns:
+            available = list(ref_df.columns)
+            raise ValueError(f"Reference must have RT and iRT columns. Available: {available}")
+
+        return rt_col, irt_col
+
+    def _cached_irt_model(self, reference: Optional[Union[str, Path, pd.DataFrame]],
+                          ref_df: pd.DataFrame, mode: str) -> Callable:
+        """
+        Fit the iRT model, reusing a cached fit when config.irt_cache_dir is set.
+
+        Cache entries are JSON files holding the model parameters (linear
+        coefficients or piecewise breakpoints/coefficients), keyed by the
+        reference content hash, the RT/iRT column choice and the mode.
+
+        Args:
+            reference: Reference passed to convert_rt_to_irt
+            ref_df: Loaded reference DataFrame
+            mode: Model type ('linear' or 'piecewise')
+
+        Returns:
+            Callable that converts RT -> iRT
+        """
+        cache_dir = self.config.irt_cache_dir
+        if cache_dir is None:
+            params = self._fit_irt_params(ref_df, mode)
+            self._irt_model_info = {**params, 'source': 'fitted', 'cache_file': None}
+            return self._irt_predictor(params)
+
+        rt_col, irt_col = self._irt_columns(ref_df)
+        reference_hash = self._irt_reference_hash(reference, ref_df)
+        key = hashlib.sha256(f'{reference_hash}|{rt_col}|{irt_col}|{mode}'.encode()).hexdigest()
+        cache_file = Path(cache_dir) / f'irt_{mode}_{key[:16]}.json'
+
+        if cache_file.exists():
+            params = json.loads(cache_file.read_text())
+            self.logger.info(f"Loaded cached {params['mode']} iRT model from {cache_file}")
+            source = 'cache'
+        else:
+            params = self._fit_irt_params(ref_df, mode)
+            params['reference_hash'] = reference_hash
+            source = 'fitted'
+            # A linear fallback for a missing pwlf must not stand in for the piecewise model later
+            if not (mode == 'piecewise' and not HAS_PWLF):
+                cache_file.parent.mkdir(parents=True, exist_ok=True)
+                cache_file.write_text(json.dumps(params, indent=2))
+                self.logger.info(f"Cached {params['mode']} iRT model to {cache_file}")
+
+        self._irt_model_info = {**params, 'source': source, 'cache_file': str(cache_file)}
+        return self._irt_predictor(params)
+
+    def _irt_reference_hash(self, reference: Optional[Union[str, Path, pd.DataFrame]],
+                            ref_df: pd.DataFrame) -> str:
+        """SHA-256 of the reference file content (or of the reference DataFrame)."""
+        digest = hashlib.sha256()
+        ref_path = self._resolve_irt_reference_path(reference)
+
+        if ref_path is not None:
+            with open(ref_path, 'rb') as handle:
+                for block in iter(lambda: handle.read(1 << 20), b''):
+                    digest.update(block)
+        else:
+            digest.update(','.join(map(str, ref_df.columns)).encode())
+            digest.update(pd.util.hash_pandas_object(ref_df, index=False).to_numpy().tobytes())
+
+        return digest.hexdigest()
+
     def _fit_irt_model(self, ref_df: pd.DataFrame, mode: str) -> Callable:
         """
         Fit RT to iRT conversion model.
@@ -1060,16 +1906,25 @@ class NuXLLibraryConverter:
         Returns:
             Callable that converts RT -> iRT
         """
-        # Identify RT and iRT columns
-        rt_col = 'RT' if 'RT' in ref_df.columns else 'AverageExperimentalRetentionTime'
-        irt_col = 'iRT' if 'iRT' in ref_df.columns else 'NormalizedRetentionTime'
+        return self._irt_predictor(self._fit_irt_params(ref_df, mode))
 
-        if rt_col not in ref_df.columns or irt_col not in ref_df.columns:
-            available = list(ref_df.columns)
-            raise ValueError(f"Reference must have RT and iRT columns. Available: {available}")
+    def _fit_irt_params(self, ref_df: pd.DataFrame, mode: str) -> Dict:
+        """
+        Fit RT to iRT conversion model parameters.
+
+        Args:
+            ref_df: Reference DataFrame with RT and iRT columns
+            mode: Model type ('linear' or 'piecewise')
+
+        Returns:
+            JSON-serializable dictionary with the fitted mode, the RT/iRT
+            columns used and the model parameters
+        """
+        rt_col, irt_col = self._irt_columns(ref_df)
 
         # Clean data
         clean_df = ref_df[[rt_col, irt_col]].dropna()
+        params = {'rt_column': rt_col, 'irt_column': irt_col, 'n_points': len(clean_df)}
 
         if len(clean_df) < 10:
             self.logger.warning(f"Only {len(clean_df)} reference points. Using linear model.")
@@ -1082,17 +1937,16 @@ class NuXLLibraryConverter:
                 y = clean_df[irt_col].values
                 slope = np.cov(x, y)[0, 1] / np.var(x)
                 intercept = np.mean(y) - slope * np.mean(x)
-                return lambda rt: intercept + slope * rt
-
-            slope, intercept, _, _, _ = scipy_stats.linregress(
-                clean_df[rt_col], clean_df[irt_col]
-            )
-            return lambda rt: intercept + slope * rt
+            else:
+                slope, intercept, _, _, _ = scipy_stats.linregress(
+                    clean_df[rt_col], clean_df[irt_col]
+                )
+            return {'mode': 'linear', **params, 'intercept': float(intercept), 'slope': float(slope)}
 
         elif mode == 'piecewise':
             if not HAS_PWLF:
                 self.logger.warning("pwlf not available, using linear model")
-                return self._fit_irt_model(ref_df, 'linear')
+                return self._fit_irt_params(ref_df, 'linear')
 
             model = pwlf.PiecewiseLinFit(
                 clean_df[rt_col].values,
@@ -1100,20 +1954,43 @@ class NuXLLibraryConverter:
             )
             model.fit(4)  # 4 segments = 3 breakpoints
 
+            return {'mode': 'piecewise', **params,
+                    'breakpoints': [float(b) for b in model.fit_breaks],
+                    'beta': [float(b) for b in model.beta]}
+
+        else:
+            return {'mode': 'identity', **params}
+
+    def _irt_predictor(self, params: Dict) -> Callable:
+        """Build the RT -> iRT callable from fitted model parameters."""
+        if params['mode'] == 'linear':
+            intercept, slope = params['intercept'], params['slope']
+            return lambda rt: intercept + slope * rt
+
+        if params['mode'] == 'piecewise':
+            breaks = np.asarray(params['breakpoints'], dtype=float)
+            beta = np.asarray(params['beta'], dtype=float)
+
+            def evaluate(x: np.ndarray) -> np.ndarray:
+                # Continuous piecewise linear basis (as pwlf's regression matrix)
+                columns = [np.ones_like(x), x - breaks[0]]
+                columns.extend(np.where(x > b, x - b, 0.0) for b in breaks[1:-1])
+                return np.dot(np.vstack(columns).T, beta)
+
             def predict(rt):
                 if isinstance(rt, (int, float)):
-                    return float(model.predict(np.array([rt]))[0])
-                return model.predict(np.array(rt))
+                    return float(evaluate(np.array([rt], dtype=float))[0])
+                return evaluate(np.asarray(rt, dtype=float))
 
             return predict
 
-        else:
-            return lambda rt: rt  # Identity
+        return lambda rt: rt  # Identity
 
     # =========================================================================
     # Output Formatting
     # =========================================================================
 
+    @_plan_step
     def format_output(self) -> 'NuXLLibraryConverter':
         """
         Format library DataFrame to DIA-NN output format.
@@ -1127,7 +2004,7 @@ class NuXLLibraryConverter:
         # Map internal columns to output columns
         output_df = pd.DataFrame({
             'ModifiedPeptideSequence': self._library_df['_modified_sequence'],
-            'PrecursorCharge': self._library_df['_precursor_charge'].astype(int),
+            'PrecursorCharge': self._library_df['_precursor_charge'].astype(np.int8),
             'AverageExperimentalRetentionTime': self._library_df['_rt'],
             'PrecursorIonMobility': self._library_df['_ion_mobility'],
             'PeptideSequence': self._library_df['_stripped_sequence'],
@@ -1137,7 +2014,7 @@ class NuXLLibraryConverter:
             'FragmentSeriesNumber': self._library_df['_fragment_number'],
             'ProductMz': self._library_df['_product_mz'],
             'LibraryIntensity': self._library_df['_intensity'],
-            'FragmentCharge': self._library_df['_fragment_charge'].astype(int),
+            'FragmentCharge': self._library_df['_fragment_charge'].astype(np.int8),
             'FragmentType': self._library_df['_fragment_type'],
             'NormalizedRetentionTime': self._library_df.get('_irt', np.nan),
             'FragmenLossType': self._library_df['_loss_type'],
@@ -1154,12 +2031,16 @@ class NuXLLibraryConverter:
     # Save
     # =========================================================================
 
-    def save(self, output_file: Optional[Union[str, Path]] = None) -> Path:
+    @_profiled_step
+    def save(self, output_file: Optional[Union[str, Path]] = None,
+             output_format: Optional[str] = None) -> Path:
         """
-        Save library to TSV file.
+        Save library to a TSV or Parquet file.
 
         Args:
             output_file: Output file path (overrides config)
+            output_format: 'tsv' or 'parquet' (default: from the file suffix,
+                           '.parquet' -> parquet, anything else -> tsv)
 
         Returns:
             Path to saved file
@@ -1169,49 +2050,915 @@ class NuXLLibraryConverter:
         if output_file is None:
             raise ValueError("No output file specified")
 
+        output_format = output_format or ('parquet' if output_file.suffix.lower() == '.parquet' else 'tsv')
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format '{output_format}'. Use one of {OUTPUT_FORMATS}")
+
+        self.collect()
+
         if self._library_df is None or len(self._library_df) == 0:
             raise ValueError("No library data to save")
 
         # Ensure parent directory exists
         output_file.parent.mkdir(parents=True, exist_ok=True)
 
-        self._library_df.to_csv(output_file, sep='\t', index=False)
+        if output_format == 'parquet':
+            self._write_parquet(output_file)
+        else:
+            self._write_tsv(output_file)
 
-        self.logger.info(f"Saved library to {output_file} ({len(self._library_df)} rows)")
+        self.logger.info(f"Saved library to {output_file} ({len(self._library_df)} rows, {output_format})")
 
         return output_file
 
+    def _write_tsv(self, output_file: Path, chunk_rows: int = TSV_CHUNK_ROWS) -> None:
+        """Write the library as TSV in row chunks (same bytes as a single to_csv)."""
+        with open(output_file, 'w', newline='') as handle:
+            for start in range(0, len(self._library_df), chunk_rows):
+                self._library_df.iloc[start:start + chunk_rows].to_csv(
+                    handle, sep='\t', index=False, header=(start == 0)
+                )
+
+    def _write_parquet(self, output_file: Path) -> None:
+        """Write the library as Parquet with dictionary-encoded string columns."""
+        if not HAS_PYARROW:
+            raise ImportError("Parquet output requires pyarrow (pip install pyarrow)")
+
+        library = self._library_df
+        categorical = {
+            col: library[col].astype('category')
+            for col in CATEGORICAL_OUTPUT_COLUMNS
+            if col in library.columns and library[col].dtype == object
+        }
+        if categorical:
+            library = library.assign(**categorical)
+
+        library.to_parquet(output_file, engine='pyarrow', index=False)
+
+    def save_irt_model_info(self, output_file: Optional[Union[str, Path]] = None) -> Optional[Path]:
+        """
+        Write the iRT model used for the library next to it (<library>.irt_model.json).
+
+        Records the mode, the model parameters and whether the model was
+        fitted or loaded from the model cache.
+
+        Args:
+            output_file: Library file path (overrides config)
+
+        Returns:
+            Path to the written file, or None if no iRT model was used
+        """
+        if self._irt_model_info is None:
+            return None
+
+        output_file = Path(output_file) if output_file else self.config.output_file
+        info_file = output_file.with_name(output_file.name + IRT_MODEL_SUFFIX)
+        info_file.write_text(json.dumps(self._irt_model_info, indent=2))
+        return info_file
+
+    def save_profile(self, output_file: Optional[Union[str, Path]] = None) -> Optional[Path]:
+        """
+        Write the per-stage profile next to the library (<library>.profile.json).
+
+        Args:
+            output_file: Library file path (overrides config)
+
+        Returns:
+            Path to the written file, or None if profiling was off
+        """
+        if not self._stage_stats:
+            return None
+
+        output_file = Path(output_file) if output_file else self.config.output_file
+        profile_file = output_file.with_name(output_file.name + PROFILE_SUFFIX)
+        profile_file.write_text(json.dumps({
+            'stages': self._stage_stats,
+            'total_seconds': round(sum(s['seconds'] for s in self._stage_stats), 4),
+            'peak_rss_mb': self._stage_stats[-1]['peak_rss_mb'],
+        }, indent=2))
+        return profile_file
+
+    # =========================================================================
+    # Incremental Updates
+    # =========================================================================
+
+    def update(self, library_file: Optional[Union[str, Path]] = None,
+               output_format: Optional[str] = None) -> Path:
+        """
+        Merge new runs into an existing library instead of rebuilding it.
+
+        The best hit per deduplication key (_id) and its scores are kept in
+        a state file next to the library, together with the names of the
+        input files already merged. Input files that were merged before are
+        skipped. A precursor from a new run replaces the stored one only if
+        it scores strictly better (XLs: localization score, then NuXL score;
+        peptides: NuXL score); only the library rows of replaced precursors
+        are rewritten, new rows are appended. Without a library or state
+        file the full library is built and the state is written.
+
+        Args:
+            library_file: Library file to update (overrides config.output_file)
+            output_format: 'tsv' or 'parquet' (default: from the file suffix)
+
+        Returns:
+            Path to the library file
+        """
+        library_file = Path(library_file) if library_file else self.config.output_file
+        if library_file is None:
+            raise ValueError("No output file specified")
+
+        state_file, runs_file = self._library_state_paths(library_file)
+        files = [Path(f) for f in self.config.input_files]
+
+        self.collect()
+        with self._execution():
+            if not (library_file.exists() and state_file.exists()):
+                self.logger.info(f"No library state found for {library_file}, building full library")
+                self.run_pipeline()
+                self.save(library_file, output_format)
+                self._write_library_state(state_file, runs_file, self._precursor_state(),
+                                          [f.name for f in files])
+                return library_file
+
+            merged_runs = json.loads(runs_file.read_text())['runs'] if runs_file.exists() else []
+            new_files = [f for f in files if f.name not in merged_runs]
+            if not new_files:
+                self.logger.info(f"Library {library_file} is up to date, no new runs")
+                return library_file
+
+            self.logger.info(f"Merging {len(new_files)} new run file(s) into {library_file}")
+            state = pd.read_csv(state_file, sep='\t', float_precision='round_trip',
+                                dtype={'_id': str, 'ModifiedPeptideSequence': str})
+
+            (self
+                .load_files(new_files, prefilter=True)
+                .deduplicate())
+
+            self._xl_df = self._improved_precursors(self._xl_df, state, 'xl')
+            self._pep_df = self._improved_precursors(self._pep_df, state, 'pep')
+            improved = sum(len(df) for df in (self._xl_df, self._pep_df) if df is not None)
+            self.logger.info(f"{improved} precursor(s) new or with a better hit")
+
+            if improved > 0:
+                (self
+                    .convert_ccs_to_im()
+                    .build_modified_sequences()
+                    .parse_peak_annotations()
+                    .filter_fragment_ions()
+                    .select_top_fragments())
+                new_state = self._precursor_state()
+                new_rows = (self.convert_rt_to_irt().format_output()._library_df
+                            if len(self._library_df) > 0 else None)
+
+                replaced = state[state['_id'].isin(new_state['_id'])]
+                existing = self._read_library(library_file)
+                stale = existing[LIBRARY_PRECURSOR_KEY].merge(
+                    replaced[LIBRARY_PRECURSOR_KEY].drop_duplicates(),
+                    how='left', indicator=True,
+                )['_merge'].to_numpy() == 'both'
+                kept = existing.take(np.flatnonzero(~stale))
+                self.logger.info(f"Replacing {int(stale.sum())} library rows of "
+                                 f"{len(replaced)} precursor(s)")
+
+                self._library_df = (pd.concat([kept, new_rows], ignore_index=True)
+                                    if new_rows is not None else kept.reset_index(drop=True))
+                self.save(library_file, output_format)
+
+                state = pd.concat(
+                    [state[~state['_id'].isin(new_state['_id'])], new_state],
+                    ignore_index=True,
+                )
+
+            self._write_library_state(state_file, runs_file, state,
+                                      merged_runs + [f.name for f in new_files])
+
+        return library_file
+
+    def _library_state_paths(self, library_file: Path) -> Tuple[Path, Path]:
+        """Return the state and run-list sidecar paths of a library file."""
+        return (library_file.with_name(library_file.name + LIBRARY_STATE_SUFFIX),
+                library_file.with_name(library_file.name + LIBRARY_RUNS_SUFFIX))
+
+    def _read_library(self, library_file: Path) -> pd.DataFrame:
+        """Read a library written by save() (TSV or Parquet)."""
+        if library_file.suffix.lower() == '.parquet':
+            library = pd.read_parquet(library_file)
+            categorical = [c for c in library.columns if isinstance(library[c].dtype, pd.CategoricalDtype)]
+            return library.astype({c: object for c in categorical})
+        return pd.read_csv(library_file, sep='\t', float_precision='round_trip')
+
+    def _precursor_state(self) -> pd.DataFrame:
+        """
+        Collect the best-hit state of the current precursors.
+
+        Returns:
+            DataFrame with _id, kind ('xl'/'pep'), scores and the library
+            columns that identify the precursor's rows
+        """
+        frames = []
+        for kind, df in (('xl', self._xl_df), ('pep', self._pep_df)):
+            if df is None or len(df) == 0:
+                continue
+            frames.append(pd.DataFrame({
+                '_id': self._precursor_ids(df, kind),
+                'kind': kind,
+                'localization_score': df[NUXL_COLUMNS['localization_score']].to_numpy(),
+                'nuxl_score': df[NUXL_COLUMNS['nuxl_score']].to_numpy(),
+                'ModifiedPeptideSequence': df['_modified_sequence'].to_numpy(),
+                'PrecursorCharge': df[NUXL_COLUMNS['charge']].to_numpy().astype(int),
+                'AverageExperimentalRetentionTime': df[NUXL_COLUMNS['rt']].to_numpy(),
+                'PrecursorMz': df[NUXL_COLUMNS['mz']].to_numpy(),
+            }))
+
+        if not frames:
+            return pd.DataFrame(columns=['_id', 'kind', 'localization_score', 'nuxl_score']
+                                + LIBRARY_PRECURSOR_KEY)
+        return pd.concat(frames, ignore_index=True)
+
+    def _improved_precursors(self, df: Optional[pd.DataFrame], state: pd.DataFrame,
+                             kind: str) -> Optional[pd.DataFrame]:
+        """
+        Keep deduplicated precursors that are new or beat the stored best hit.
+
+        Ties keep the stored hit, as the full pipeline keeps the first of
+        equally scored hits in input order.
+        """
+        if df is None or len(df) == 0:
+            return None
+
+        stored = state[state['kind'] == kind].set_index('_id')
+        ids = pd.Series(self._precursor_ids(df, kind), index=df.index)
+        score = df[NUXL_COLUMNS['nuxl_score']]
+        stored_score = ids.map(stored['nuxl_score'])
+
+        better = score > stored_score
+        if kind == 'xl':
+            loc = df[NUXL_COLUMNS['localization_score']]
+            stored_loc = ids.map(stored['localization_score'])
+            better = (loc > stored_loc) | ((loc == stored_loc) & better)
+
+        keep = (~ids.isin(stored.index) | better).to_numpy()
+        return df.take(np.flatnonzero(keep)) if keep.any() else None
+
+    def _precursor_ids(self, df: pd.DataFrame, kind: str) -> np.ndarray:
+        """
+        Deduplication key of precursors as strings, for the persisted state.
+
+        XLs: sequence_nucleotide_charge; peptides: sequence_charge.
+        """
+        key_cols = [NUXL_COLUMNS['sequence'], NUXL_COLUMNS['charge']]
+        if kind == 'xl':
+            key_cols.insert(1, NUXL_COLUMNS['nucleotide'])
+
+        ids = df[key_cols[0]].astype(str)
+        for col in key_cols[1:]:
+            ids = ids + '_' + df[col].astype(str)
+        return ids.to_numpy()
+
+    def _write_library_state(self, state_file: Path, runs_file: Path,
+                             state: pd.DataFrame, runs: List[str]) -> None:
+        """Write the best-hit state and merged run list next to the library."""
+        state.to_csv(state_file, sep='\t', index=False)
+        runs_file.write_text(json.dumps({'runs': runs}, indent=2))
+        self.logger.info(f"Saved library state ({len(state)} precursors, {len(runs)} runs) to {state_file}")
+
+    # =========================================================================
+    # Library Merge
+    # =========================================================================
+
+    def merge(self, libraries: Optional[List[Union[str, Path]]] = None,
+              library_file: Optional[Union[str, Path]] = None,
+              output_format: Optional[str] = None,
+              priority: Optional[str] = None) -> Path:
+        """
+        Merge other DIA-NN libraries (e.g. MSFragger) into a saved library.
+
+        Args:
+            libraries: Libraries to merge in (default: config.merge_libraries)
+            library_file: Library written by save()/update() (overrides
+                          config.output_file); replaced by the merged library
+            output_format: 'tsv' or 'parquet' (default: from the file suffix)
+            priority: 'library' (the converted library wins duplicate
+                      precursors) or 'merged' (the merged libraries win)
+
+        Returns:
+            Path to the merged library
+        """
+        libraries = [Path(f) for f in (libraries if libraries is not None
+                                       else self.config.merge_libraries)]
+        library_file = Path(library_file) if library_file else self.config.output_file
+        priority = priority or self.config.merge_priority
+
+        if library_file is None:
+            raise ValueError("No output file specified")
+        if priority not in MERGE_PRIORITIES:
+            raise ValueError(f"Unknown merge priority '{priority}'. Use one of {MERGE_PRIORITIES}")
+        if not libraries:
+            return library_file
+
+        if self.config.irt_mode == 'none':
+            self.logger.warning("Merging without iRT conversion: NormalizedRetentionTime of "
+                                "the libraries may not be on the same scale")
+
+        ordered = [library_file] + libraries if priority == 'library' else libraries + [library_file]
+        merging_file = library_file.with_name(library_file.name + '.merging')
+        self.merge_libraries(ordered, merging_file, output_format or
+                             ('parquet' if library_file.suffix.lower() == '.parquet' else 'tsv'))
+        merging_file.replace(library_file)
+
+        return library_file
+
+    @_profiled_step
+    def merge_libraries(self, library_files: List[Union[str, Path]],
+                        output_file: Union[str, Path],
+                        output_format: Optional[str] = None,
+                        chunk_rows: int = TSV_CHUNK_ROWS) -> Path:
+        """
+        Union DIA-NN libraries into one library, streamed in row chunks.
+
+        Libraries are given in priority order. A precursor (modified
+        sequence + charge, compared as 64-bit hashes) is taken from the first
+        library that contains it; all its rows there are kept and rows of
+        the same precursor in later libraries are dropped. Columns are the
+        union of all libraries; missing values are left empty. Rows of TSV
+        libraries are copied verbatim: line by line when the columns match
+        the output, field by field otherwise.
+
+        Args:
+            library_files: Input libraries (.tsv or .parquet), highest priority first
+            output_file: Merged library file
+            output_format: 'tsv' or 'parquet' (default: from the file suffix)
+            chunk_rows: Rows read per chunk
+
+        Returns:
+            Path to the merged library
+        """
+        library_files = [Path(f) for f in library_files]
+        output_file = Path(output_file)
+        output_format = output_format or ('parquet' if output_file.suffix.lower() == '.parquet' else 'tsv')
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format '{output_format}'. Use one of {OUTPUT_FORMATS}")
+        if output_format == 'parquet' and not HAS_PYARROW:
+            raise ImportError("Parquet output requires pyarrow (pip install pyarrow)")
+
+        columns: List[str] = []
+        for path in library_files:
+            columns.extend(c for c in self._library_columns(path) if c not in columns)
+        missing = [c for c in MERGE_PRECURSOR_KEY if c not in columns]
+        if missing:
+            raise ValueError(f"Libraries lack the precursor columns {missing}")
+
+        output_file.parent.mkdir(parents=True, exist_ok=True)
+        claimed = np.empty(0, dtype=np.uint64)
+        library_stats = []
+        writer = None
+
+        with open(output_file, 'w', newline='') if output_format == 'tsv' else \
+                contextlib.nullcontext() as handle:
+            if handle is not None:
+                handle.write('\t'.join(columns) + '\n')
+
+            for path in library_files:
+                rows = rows_kept = 0
+                library_keys = []
+                verbatim = (handle is not None and path.suffix.lower() != '.parquet'
+                            and self._library_columns(path) == columns)
+                chunks = (self._iter_library_lines(path, chunk_rows) if verbatim else
+                          ((chunk, chunk) for chunk in
+                           self._iter_library_chunks(path, chunk_rows, as_text=handle is not None)))
+
+                for chunk, key_frame in chunks:
+                    keys = self._precursor_key_hashes(key_frame)
+                    keep = ~self._isin_sorted(keys, claimed)
+                    library_keys.append(np.unique(keys))
+                    rows += len(keys)
+                    rows_kept += int(keep.sum())
+
+                    if verbatim:
+                        handle.writelines(itertools.compress(chunk, keep))
+                        continue
+
+                    chunk = chunk.take(np.flatnonzero(keep))
+                    if handle is not None and path.suffix.lower() != '.parquet':
+                        handle.write(self._tsv_lines(chunk.reindex(columns=columns, fill_value='')))
+                    elif handle is not None:
+                        chunk.reindex(columns=columns).to_csv(handle, sep='\t', index=False, header=False)
+                    else:
+                        if writer is None:
+                            writer = pq.ParquetWriter(output_file,
+                                                      self._merge_parquet_schema(library_files, columns))
+                        writer.write_table(self._merge_parquet_table(chunk, writer.schema))
+
+                keys = np.unique(np.concatenate(library_keys)) if library_keys \
+                    else np.empty(0, dtype=np.uint64)
+                precursors_kept = int((~self._isin_sorted(keys, claimed)).sum())
+                claimed = np.union1d(claimed, keys)
+
+                library_stats.append({
+                    'file': str(path),
+                    'rows': rows,
+                    'rows_kept': rows_kept,
+                    'precursors': len(keys),
+                    'precursors_kept': precursors_kept,
+                })
+                self.logger.info(f"Merged {path.name}: {precursors_kept}/{len(keys)} precursors, "
+                                 f"{rows_kept}/{rows} rows")
+
+        if output_format == 'parquet':
+            if writer is None:
+                raise ValueError("No library data to save")
+            writer.close()
+
+        self._merge_stats = {
+            'libraries': library_stats,
+            'precursors': len(claimed),
+            'rows': sum(s['rows_kept'] for s in library_stats),
+        }
+        self.logger.info(f"Saved merged library to {output_file} ({self._merge_stats['precursors']} "
+                         f"precursors, {self._merge_stats['rows']} rows, {output_format})")
+
+        return output_file
+
+    def _merge_parquet_schema(self, library_files: List[Path], columns: List[str]) -> 'pa.Schema':
+        """
+        Build the Parquet schema of a merged library from all input libraries.
+
+        Column types are taken from the Parquet schemas and from the first
+        MERGE_SCHEMA_SAMPLE_ROWS rows of TSV libraries, and unified: integer
+        columns that are floating point in another library become float64,
+        columns of mixed or unknown (all empty) types become strings, and
+        CATEGORICAL_OUTPUT_COLUMNS strings are dictionary-encoded.
+        """
+        types: Dict[str, list] = {c: [] for c in columns}
+        for path in library_files:
+            if path.suffix.lower() == '.parquet':
+                schema = pq.read_schema(path)
+            else:
+                sample = next(self._iter_library_chunks(path, MERGE_SCHEMA_SAMPLE_ROWS, as_text=False), None)
+                if sample is None:
+                    continue
+                schema = pa.Schema.from_pandas(sample, preserve_index=False)
+            for library_field in schema:
+                name = LIBRARY_COLUMN_ALIASES.get(library_field.name, library_field.name)
+                if name in types:
+                    value_type = (library_field.type.value_type if pa.types.is_dictionary(library_field.type)
+                                  else library_field.type)
+                    if not pa.types.is_null(value_type):
+                        types[name].append(value_type)
+
+        fields = []
+        for column in columns:
+            column_types = types[column]
+            if column_types and all(pa.types.is_integer(t) for t in column_types):
+                arrow_type = pa.int64()
+            elif column_types and all(pa.types.is_integer(t) or pa.types.is_floating(t) for t in column_types):
+                arrow_type = pa.float64()
+            elif column_types and all(t == column_types[0] for t in column_types):
+                arrow_type = column_types[0]
+            else:
+                arrow_type = pa.string()
+            if column in CATEGORICAL_OUTPUT_COLUMNS and pa.types.is_string(arrow_type):
+                arrow_type = pa.dictionary(pa.int32(), arrow_type)
+            fields.append(pa.field(column, arrow_type))
+        return pa.schema(fields)
+
+    def _merge_parquet_table(self, chunk: pd.DataFrame, schema: 'pa.Schema') -> 'pa.Table':
+        """Convert a library chunk to a table of the merged schema (missing columns are null)."""
+        chunk = chunk.reindex(columns=schema.names)
+        for column_field in schema:
+            value_type = (column_field.type.value_type if pa.types.is_dictionary(column_field.type)
+                          else column_field.type)
+            column = chunk[column_field.name]
+            if pa.types.is_string(value_type) and column.dtype != object:
+                # numbers, categories or all-missing columns of this chunk
+                chunk[column_field.name] = column.astype(object).where(column.notna(), None).map(str, na_action='ignore')
+        return pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+
+    def _library_columns(self, library_file: Path) -> List[str]:
+        """Read the column names of a library without loading its rows."""
+        if library_file.suffix.lower() == '.parquet':
+            if not HAS_PYARROW:
+                raise ImportError("Parquet input requires pyarrow (pip install pyarrow)")
+            names = pq.read_schema(library_file).names
+        else:
+            names = pd.read_csv(library_file, sep='\t', nrows=0).columns
+        return [LIBRARY_COLUMN_ALIASES.get(c, c) for c in names if not c.startswith('__index_level_')]
+
+    def _iter_library_chunks(self, library_file: Path, chunk_rows: int,
+                             as_text: bool) -> Iterator[pd.DataFrame]:
+        """
+        Yield a library in row chunks with aliased column names.
+
+        Args:
+            library_file: Library file (.tsv or .parquet)
+            chunk_rows: Rows per chunk
+            as_text: Read TSV fields as unparsed strings, quotes included
+                     (copied verbatim into a TSV output)
+        """
+        if library_file.suffix.lower() == '.parquet':
+            if not HAS_PYARROW:
+                raise ImportError("Parquet input requires pyarrow (pip install pyarrow)")
+            chunks = (batch.to_pandas() for batch in
+                      pq.ParquetFile(library_file).iter_batches(batch_size=chunk_rows))
+        elif as_text:
+            chunks = pd.read_csv(library_file, sep='\t', chunksize=chunk_rows, dtype=str,
+                                 keep_default_na=False, quoting=csv.QUOTE_NONE)
+        else:
+            chunks = pd.read_csv(library_file, sep='\t', chunksize=chunk_rows,
+                                 float_precision='round_trip',
+                                 dtype={c: str for c in CATEGORICAL_OUTPUT_COLUMNS})
+
+        for chunk in chunks:
+            yield chunk.rename(columns=LIBRARY_COLUMN_ALIASES)
+
+    def _iter_library_lines(self, library_file: Path,
+                            chunk_rows: int) -> Iterator[Tuple[List[str], pd.DataFrame]]:
+        """
+        Yield the raw row lines of a TSV library in chunks.
+
+        Only the precursor key columns are parsed; each line is one row.
+
+        Returns:
+            Iterator of (lines, DataFrame of the MERGE_PRECURSOR_KEY columns)
+        """
+        with open(library_file, newline='') as handle:
+            header = handle.readline().rstrip('\r\n').split('\t')
+            names = [LIBRARY_COLUMN_ALIASES.get(c, c) for c in header]
+            while True:
+                lines = list(itertools.islice(handle, chunk_rows))
+                if not lines:
+                    break
+                if not lines[-1].endswith('\n'):
+                    lines[-1] += '\n'
+                keys = pd.read_csv(io.StringIO(''.join(lines)), sep='\t', header=None,
+                                   names=names, usecols=MERGE_PRECURSOR_KEY, dtype=str,
+                                   keep_default_na=False, quoting=csv.QUOTE_NONE)
+                yield lines, keys
+
+    def _tsv_lines(self, chunk: pd.DataFrame) -> str:
+        """Join a chunk of text fields into TSV lines."""
+        if len(chunk) == 0:
+            return ''
+        lines = chunk.iloc[:, 0].to_numpy(dtype=object)
+        for col in range(1, chunk.shape[1]):
+            lines = lines + '\t' + chunk.iloc[:, col].to_numpy(dtype=object)
+        return '\n'.join(lines) + '\n'
+
+    def _precursor_key_hashes(self, chunk: pd.DataFrame) -> np.ndarray:
+        """64-bit hashes of the merge key (modified sequence, integer charge)."""
+        charge = pd.to_numeric(chunk['PrecursorCharge'], errors='coerce')
+        return pd.util.hash_pandas_object(pd.DataFrame({
+            'sequence': chunk['ModifiedPeptideSequence'].astype(str).to_numpy(),
+            'charge': charge.fillna(0).to_numpy().astype(np.int64),
+        }), index=False).to_numpy()
+
+    def _isin_sorted(self, values: np.ndarray, sorted_values: np.ndarray) -> np.ndarray:
+        """Membership of values in a sorted array (binary search)."""
+        if len(sorted_values) == 0:
+            return np.zeros(len(values), dtype=bool)
+        pos = np.searchsorted(sorted_values, values)
+        return sorted_values[np.minimum(pos, len(sorted_values) - 1)] == values
+
+    # =========================================================================
+    # Profiling
+    # =========================================================================
+
+    def _run_stage(self, name: str, func: Callable, *args, **kwargs):
+        """
+        Run one pipeline stage, recording its profile when config.profile is set.
+
+        Records wall time, rows before/after (precursors until fragments
+        exist, fragment rows afterwards) and the process RSS (current and
+        peak). With config.trace_memory, the memory allocated by the stage
+        as seen by tracemalloc (net and peak) is recorded as well. Stages
+        called from within a profiled stage are part of it.
+        """
+        if not self.config.profile or self._profiling:
+            return func(*args, **kwargs)
+
+        self._profiling = True
+        rows_in = self._stage_rows()
+        trace = self.config.trace_memory
+        started_tracing = trace and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        if trace:
+            tracemalloc.reset_peak()
+            traced_before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+
+        try:
+            return func(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - start
+            stage = {
+                'stage': name,
+                'seconds': round(seconds, 4),
+                'rows_in': rows_in,
+                'rows_out': self._stage_rows(),
+            }
+            if trace:
+                traced_current, traced_peak = tracemalloc.get_traced_memory()
+                stage['allocated_mb'] = round((traced_current - traced_before) / 2**20, 1)
+                stage['traced_peak_mb'] = round((traced_peak - traced_before) / 2**20, 1)
+            if started_tracing:
+                tracemalloc.stop()
+            stage['rss_mb'] = self._current_rss_mb()
+            stage['peak_rss_mb'] = self._peak_rss_mb()
+            self._profiling = False
+
+            self._stage_stats.append(stage)
+            self.logger.debug(f"Stage {name}: {stage['seconds']:.3f} s, "
+                              f"rows {rows_in} -> {stage['rows_out']}, "
+                              f"peak RSS {stage['peak_rss_mb']} MB")
+
+    def _stage_rows(self) -> int:
+        """Current row count: fragment rows once expanded, precursor rows before."""
+        if self._library_df is not None:
+            return len(self._library_df)
+        return sum(len(df) for df in (self._xl_df, self._pep_df) if df is not None)
+
+    def _current_rss_mb(self) -> Optional[float]:
+        """Current resident set size in MB (Linux /proc; None elsewhere)."""
+        try:
+            with open('/proc/self/statm') as handle:
+                pages = int(handle.read().split()[1])
+        except (OSError, ValueError, IndexError):
+            return None
+        return round(pages * resource.getpagesize() / 2**20, 1) if HAS_RESOURCE else None
+
+    def _peak_rss_mb(self) -> Optional[float]:
+        """Peak resident set size of the process in MB (None without resource)."""
+        if not HAS_RESOURCE:
+            return None
+        # ru_maxrss is KB on Linux and bytes on macOS
+        scale = 1 if sys.platform == 'darwin' else 1024
+        return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2**20, 1)
+
+    # =========================================================================
+    # Lazy Execution
+    # =========================================================================
+
+    def collect(self) -> 'NuXLLibraryConverter':
+        """
+        Execute the recorded plan (lazy mode).
+
+        Consecutive row filters are fused into one mask (and pushed into
+        loading when they directly follow load_files), intermediate copies
+        are skipped and filter_fragment_ions is pushed down into annotation
+        parsing. save(), .library and get_stats() call this automatically.
+
+        Returns:
+            self for method chaining
+        """
+        if not self._plan:
+            return self
+
+        plan, self._plan = self._plan, []
+        steps = self._optimize_plan(plan)
+        self.logger.debug("Executing plan: " + " -> ".join(name for name, _, _ in steps))
+
+        with self._execution():
+            for name, args, kwargs in steps:
+                self._run_stage(name, getattr(self, name), *args, **kwargs)
+
+        return self
+
+    @contextmanager
+    def _execution(self) -> Iterator[None]:
+        """Run fluent steps directly (not recorded) inside the block."""
+        previous = self._executing
+        self._executing = True
+        try:
+            yield
+        finally:
+            self._executing = previous
+
+    def _owned(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Defensive copy in eager mode; plan execution owns its frames."""
+        return df if self._executing else df.copy()
+
+    def _optimize_plan(self, plan: List[Tuple[str, tuple, dict]]) -> List[Tuple[str, tuple, dict]]:
+        """
+        Rewrite a recorded plan into an equivalent, cheaper one.
+
+        Row filters are only fused with their direct neighbours: moving them
+        across deduplicate would change which CSM is kept per precursor.
+        """
+        steps: List[Tuple[str, tuple, dict]] = []
+        i = 0
+
+        while i < len(plan):
+            name, args, kwargs = plan[i]
+
+            if name in ROW_FILTER_STEPS:
+                row_filters = []
+                while i < len(plan) and plan[i][0] in ROW_FILTER_STEPS:
+                    resolved = self._resolve_row_filter(*plan[i])
+                    if resolved is not None:
+                        row_filters.append(resolved)
+                    i += 1
+
+                if steps and steps[-1][0] == '_load_inputs':
+                    files, loaded_filters = steps[-1][1]
+                    steps[-1] = ('_load_inputs', (files, (loaded_filters or []) + row_filters), {})
+                elif row_filters:
+                    steps.append(('_filter_rows', (row_filters,), {}))
+                continue
+
+            if name in ('load_files', 'load_idxml'):
+                files = args[0] if args else kwargs.get('files')
+                prefilter = args[1] if len(args) > 1 else kwargs.get('prefilter', False)
+                steps.append(('_load_inputs', (files, self._config_row_filters() if prefilter else None), {}))
+                i += 1
+                continue
+
+            if name == 'parse_peak_annotations' and not args and 'fragment_types' not in kwargs:
+                # Look past fragment-row steps for a filter_fragment_ions to push down
+                j = i + 1
+                while j < len(plan) and plan[j][0] in FRAGMENT_ROW_STEPS:
+                    j += 1
+                if j < len(plan) and plan[j][0] == 'filter_fragment_ions':
+                    f_args, f_kwargs = plan[j][1], plan[j][2]
+                    types = (f_args[0] if f_args else f_kwargs.get('types')) or self.config.fragment_types
+                    steps.append(('parse_peak_annotations', (), {'fragment_types': types}))
+                    steps.extend(plan[i + 1:j])
+                    i = j + 1
+                    continue
+
+            steps.append((name, args, kwargs))
+            i += 1
+
+        return steps
+
+    def _resolve_row_filter(self, name: str, args: tuple, kwargs: dict) -> Optional[Tuple[str, Any]]:
+        """Resolve a recorded filter_* step to a row filter with the same defaults."""
+        value = args[0] if args else next(iter(kwargs.values()), None)
+
+        if name == 'filter_decoys':
+            return ('decoys', True) if (value is None or value) else None
+        if name == 'filter_localization':
+            return ('localization', value if value is not None else self.config.min_localization_score)
+        if name == 'filter_charge':
+            max_charge = value or self.config.max_charge
+            return ('charge', max_charge) if max_charge is not None else None
+        return None
+
+    def _filter_rows(self, row_filters: List[Tuple[str, Any]]) -> 'NuXLLibraryConverter':
+        """Apply fused row filters to the XL and peptide frames."""
+        if self._xl_df is not None and len(self._xl_df) > 0:
+            before = len(self._xl_df)
+            self._xl_df = self._apply_row_filters(self._xl_df, True, row_filters)
+            self.logger.info(f"Filtered XLs ({len(row_filters)} fused filters): {before} -> {len(self._xl_df)}")
+
+        if self._pep_df is not None and len(self._pep_df) > 0:
+            before = len(self._pep_df)
+            self._pep_df = self._apply_row_filters(self._pep_df, False, row_filters)
+            self.logger.info(f"Filtered peptides ({len(row_filters)} fused filters): {before} -> {len(self._pep_df)}")
+
+        return self
+
     # =========================================================================
     # Convenience Methods
     # =========================================================================
 
-    def run_pipeline(self) -> 'NuXLLibraryConverter':
+    def run_pipeline(self, workers: Optional[int] = None) -> 'NuXLLibraryConverter':
         """
         Run complete conversion pipeline with current configuration.
 
+        Args:
+            workers: Number of worker processes (default: config.workers).
+                     With more than one worker, precursors are sharded by
+                     their deduplication key and processed in parallel; the
+                     result is identical to the sequential pipeline.
+
         Returns:
             self for method chaining
         """
+        workers = workers or self.config.workers
+        if workers and workers > 1:
+            self.collect()
+            with self._execution():
+                return self._run_sharded_pipeline(workers)
+
         return (self
-            .load_files()
-            .filter_decoys()
-            .filter_localization()
-            .filter_charge()
+            .load_files(prefilter=True)
             .deduplicate()
             .convert_ccs_to_im()
             .build_modified_sequences()
             .parse_peak_annotations()
             .filter_fragment_ions()
+            .select_top_fragments()
+            .convert_rt_to_irt()
+            .format_output())
+
+    def _run_sharded_pipeline(self, workers: int) -> 'NuXLLibraryConverter':
+        """
+        Run the pipeline with precursor shards processed in a process pool.
+
+        Loading, with the row filters applied while reading, runs in this
+        process. Precursors are then partitioned by a stable hash of their
+        deduplication key, so every duplicate group lands in one shard, and
+        each shard is deduplicated, converted and expanded into fragments
+        independently. The merge stage
+        restores the sequential precursor order before iRT conversion and
+        formatting.
+
+        Args:
+            workers: Number of worker processes
+
+        Returns:
+            self for method chaining
+        """
+        self.load_files(prefilter=True)
+
+        xl_key = [NUXL_COLUMNS['sequence'], NUXL_COLUMNS['nucleotide'], NUXL_COLUMNS['charge']]
+        pep_key = [NUXL_COLUMNS['sequence'], NUXL_COLUMNS['charge']]
+        xl_shards = self._shard_frame(self._xl_df, xl_key, workers)
+        pep_shards = self._shard_frame(self._pep_df, pep_key, workers)
+
+        self.logger.info(f"Processing {workers} shards in parallel")
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(
+                _process_shard,
+                [self.config] * workers,
+                xl_shards,
+                pep_shards,
+            ))
+
+        loc_col = NUXL_COLUMNS['localization_score']
+        score_col = NUXL_COLUMNS['nuxl_score']
+
+        # Sequential order: XLs by (localization score, NuXL score), then
+        # peptides by NuXL score; ties keep input order (_row)
+        xl_order = ([loc_col, score_col, '_row'], [False, False, True])
+        pep_order = ([score_col, '_row'], [False, True])
+
+        def merge(frames: List[pd.DataFrame], order) -> Optional[pd.DataFrame]:
+            frames = [f for f in frames if f is not None]
+            if not frames:
+                return None
+            non_empty = [f for f in frames if len(f) > 0] or frames[:1]
+            merged = pd.concat(non_empty, ignore_index=True)
+            by = [c for c in order[0] if c in merged.columns]
+            ascending = [a for c, a in zip(order[0], order[1]) if c in merged.columns]
+            return merged.sort_values(by, ascending=ascending, kind='mergesort')
+
+        self._xl_df = merge([r[0] for r in results], xl_order)
+        self._pep_df = merge([r[1] for r in results], pep_order)
+
+        xl_fragments = merge([r[2] for r in results], xl_order)
+        pep_fragments = merge([r[3] for r in results], pep_order)
+
+        precursors = [df for df in (self._xl_df, self._pep_df) if df is not None and len(df) > 0]
+        if not precursors:
+            raise ValueError("No data loaded. Call load_files() first.")
+        self._combined_df = pd.concat(precursors, ignore_index=True).drop(columns='_row')
+
+        fragments = [df for df in (xl_fragments, pep_fragments) if df is not None and len(df) > 0]
+        carry = ['_row', loc_col, score_col]
+        self._library_df = (pd.concat(fragments, ignore_index=True) if fragments
+                            else pd.DataFrame())
+        self._library_df = self._library_df.drop(
+            columns=[c for c in carry if c in self._library_df.columns]
+        )
+        for df in (self._xl_df, self._pep_df):
+            if df is not None:
+                df.drop(columns='_row', inplace=True)
+
+        self.logger.info(f"Merged {len(results)} shards: {len(self._library_df)} fragment entries")
+
+        return (self
+            .select_top_fragments()
             .convert_rt_to_irt()
             .format_output())
 
+    def _shard_frame(self, df: Optional[pd.DataFrame], key: List[str],
+                     n_shards: int) -> List[Optional[pd.DataFrame]]:
+        """
+        Partition rows by a stable hash of the key columns.
+
+        Rows keep their input order within each shard and carry their global
+        position in a _row column.
+        """
+        if df is None:
+            return [None] * n_shards
+
+        df = df.reset_index(drop=True)
+        df['_row'] = np.arange(len(df))
+        hashes = pd.util.hash_pandas_object(df[key], index=False).to_numpy()
+        shard_ids = hashes % np.uint64(n_shards)
+        return [df[shard_ids == np.uint64(i)] for i in range(n_shards)]
+
     @property
     def library(self) -> Optional[pd.DataFrame]:
         """Get the current library DataFrame."""
+        self.collect()
         return self._library_df
 
     def get_stats(self) -> Dict:
         """Get statistics about the current library."""
+        self.collect()
         stats = {
             'xl_entries': len(self._xl_df) if self._xl_df is not None else 0,
             'peptide_entries': len(self._pep_df) if self._pep_df is not None else 0,
@@ -1225,9 +2972,55 @@ class NuXLLibraryConverter:
             stats['unique_proteins'] = self._library_df['ProteinId'].nunique() \
                 if 'ProteinId' in self._library_df.columns else 0
 
+        if self._irt_model_info is not None:
+            stats['irt_model'] = self._irt_model_info
+
+        if self._merge_stats is not None:
+            stats['merge'] = self._merge_stats
+
+        if self._stage_stats:
+            stats['stages'] = self._stage_stats
+
         return stats
 
 
+def _process_shard(config: ConverterConfig, xl_df: Optional[pd.DataFrame],
+                   pep_df: Optional[pd.DataFrame]) -> Tuple:
+    """
+    Deduplicate, convert and expand one precursor shard (process pool worker).
+
+    Returns:
+        Tuple of (XL precursors, peptide precursors, XL fragments, peptide
+        fragments); fragments carry the columns needed to restore the
+        sequential order. Peak annotation strings are not sent back.
+    """
+    converter = NuXLLibraryConverter(replace(config, lazy=False, workers=1, profile=False))
+    converter._xl_df = xl_df if xl_df is not None and len(xl_df) > 0 else None
+    converter._pep_df = pep_df if pep_df is not None and len(pep_df) > 0 else None
+
+    (converter
+        .deduplicate()
+        .convert_ccs_to_im()
+        .build_modified_sequences())
+
+    carry = ('_row', NUXL_COLUMNS['localization_score'], NUXL_COLUMNS['nuxl_score'])
+    types = config.fragment_types
+
+    def expand(df: Optional[pd.DataFrame]) -> Optional[pd.DataFrame]:
+        if df is None:
+            return None
+        fragments = converter._expand_fragments(df.reset_index(drop=True), carry=carry)
+        return fragments[fragments['_fragment_type'].isin(types)]
+
+    def precursors(df: Optional[pd.DataFrame]) -> Optional[pd.DataFrame]:
+        if df is None:
+            return None
+        return df.drop(columns=NUXL_COLUMNS['peak_annotations'])
+
+    return (precursors(converter._xl_df), precursors(converter._pep_df),
+            expand(converter._xl_df), expand(converter._pep_df))
+
+
 # =============================================================================
 # CLI Interface
 # =============================================================================
@@ -1246,18 +3039,50 @@ Examples:
   python nuxl2dia.py -i data/*.unknown -o library.tsv \\
       --irt piecewise --irt-ref hela_reference.tsv
 
+  # Reuse the piecewise fit across builds with the same reference
+  python nuxl2dia.py -i data/*.unknown -o library.tsv \\
+      --irt piecewise --irt-ref hela_reference.tsv --irt-cache irt_cache/
+
   # Filter by localization score
   python nuxl2dia.py -i data/*.unknown -o library.tsv --min-loc-score 0.1
 
+  # Keep the 12 most intense fragments above m/z 200 per precursor
+  python nuxl2dia.py -i data/*.unknown -o library.tsv --top-fragments 12 --fragment-min-mz 200
+
+  # Read NuXL idXML files directly (no TextExporter export needed)
+  python nuxl2dia.py -i data/*_XLs.idXML data/*_peptides.idXML -o library.tsv
+
+  # Merge with an MSFragger library; its precursors win duplicates
+  python nuxl2dia.py -i data/*.unknown -o library.tsv --irt linear --irt-ref msfragger.tsv \\
+      --merge msfragger.tsv --merge-priority merged
+
   # Only crosslinks, no peptides
   python nuxl2dia.py -i data/*_XLs.unknown -o xl_library.tsv
+
+  # Add new runs to an existing library (earlier runs are skipped)
+  python nuxl2dia.py -i data/*.unknown -o library.tsv --update
+
+  # Stream large exports with a bounded memory budget
+  python nuxl2dia.py -i data/*.unknown -o library.tsv --max-memory 512
 """
     )
 
     parser.add_argument('-i', '--input', nargs='+', required=True,
-                       help='Input NuXL files (*.XLs.unknown and/or *.peptides.unknown)')
+                       help='Input NuXL files (*_XLs.unknown and/or *_peptides.unknown, '
+                            'or the *_XLs.idXML / *_peptides.idXML files directly)')
     parser.add_argument('-o', '--output', required=True,
-                       help='Output TSV file')
+                       help='Output library file (.tsv, or .parquet for Parquet output)')
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default=None,
+                       help='Output format (default: from the output file suffix)')
+    parser.add_argument('--update', action='store_true',
+                       help='Merge only new input runs into an existing output library '
+                            '(state is kept next to the library)')
+    parser.add_argument('--merge', nargs='+', default=[], metavar='LIBRARY',
+                       help='DIA-NN libraries (.tsv/.parquet, e.g. from MSFragger) to merge '
+                            'into the output library')
+    parser.add_argument('--merge-priority', choices=MERGE_PRIORITIES, default='library',
+                       help='Which side keeps duplicate precursors (modified sequence + charge): '
+                            'the converted library or the --merge libraries (default: library)')
     parser.add_argument('--min-loc-score', type=float, default=0.0,
                        help='Minimum localization score for XLs (default: 0.0)')
     parser.add_argument('--max-charge', type=int, default=None,
@@ -1266,8 +3091,32 @@ Examples:
                        default='none', help='iRT conversion mode (default: none)')
     parser.add_argument('--irt-ref', type=str, default=None,
                        help='iRT reference file (TSV with RT and iRT columns)')
+    parser.add_argument('--irt-cache', type=str, default=None,
+                       help='Directory for cached iRT model fits, keyed by reference content '
+                            '(default: no caching)')
     parser.add_argument('--fragment-types', nargs='+', default=['b', 'y'],
                        help='Fragment ion types to include (default: b y)')
+    parser.add_argument('--top-fragments', type=int, default=None,
+                       help='Keep the N most intense fragments per precursor and normalize '
+                            'intensities to a per-precursor maximum of 1 (default: keep all)')
+    parser.add_argument('--fragment-min-mz', type=float, default=None,
+                       help='Minimum fragment m/z for fragment selection (default: no limit)')
+    parser.add_argument('--fragment-max-mz', type=float, default=None,
+                       help='Maximum fragment m/z for fragment selection (default: no limit)')
+    parser.add_argument('--chunk-size', type=int, default=None,
+                       help='Stream input files in chunks of this many rows (default: read whole files)')
+    parser.add_argument('--lazy', action='store_true',
+                       help='Build an optimized execution plan before running the pipeline')
+    parser.add_argument('--workers', type=int, default=1,
+                       help='Number of worker processes; >1 enables sharded parallel execution (default: 1)')
+    parser.add_argument('--max-memory', type=float, default=None,
+                       help='Memory budget in MB per input chunk; derives the chunk size '
+                            'when --chunk-size is not given')
+    parser.add_argument('--profile', nargs='?', const='memory', default=None,
+                       choices=['time', 'memory'],
+                       help='Record time, row counts and RSS per stage; prints a table and '
+                            'writes <output>.profile.json. "memory" (default) also traces '
+                            'allocations with tracemalloc, which slows the build')
     parser.add_argument('-v', '--verbose', action='store_true',
                        help='Verbose output')
 
@@ -1286,13 +3135,32 @@ def main():
         max_charge=args.max_charge,
         irt_mode=args.irt,
         irt_reference_file=Path(args.irt_ref) if args.irt_ref else None,
+        irt_cache_dir=Path(args.irt_cache) if args.irt_cache else None,
         fragment_types=args.fragment_types,
+        top_fragments=args.top_fragments,
+        fragment_min_mz=args.fragment_min_mz,
+        fragment_max_mz=args.fragment_max_mz,
+        merge_libraries=[Path(f) for f in args.merge],
+        merge_priority=args.merge_priority,
+        chunk_size=args.chunk_size,
+        max_memory_mb=args.max_memory,
+        workers=args.workers,
+        lazy=args.lazy,
+        profile=args.profile is not None,
+        trace_memory=args.profile == 'memory',
         verbose=args.verbose,
     )
 
     # Run conversion
     converter = NuXLLibraryConverter(config)
-    converter.run_pipeline().save()
+    if args.update:
+        converter.update(output_format=args.format)
+    else:
+        converter.run_pipeline().save(output_format=args.format)
+    converter.merge(output_format=args.format)
+
+    converter.save_irt_model_info()
+    converter.save_profile()
 
     # Print summary
     stats = converter.get_stats()
@@ -1301,6 +3169,15 @@ def main():
     print(f"  Output: {stats['library_rows']} fragment rows")
     print(f"  Unique precursors: {stats.get('unique_precursors', 'N/A')}")
     print(f"  Unique proteins: {stats.get('unique_proteins', 'N/A')}")
+    if 'irt_model' in stats:
+        print(f"  iRT model: {stats['irt_model']['mode']} ({stats['irt_model']['source']})")
+    if 'merge' in stats:
+        print(f"  Merged library: {stats['merge']['precursors']} precursors, "
+              f"{stats['merge']['rows']} rows")
+
+    if 'stages' in stats:
+        print("\nStage profile:")
+        print(pd.DataFrame(stats['stages']).to_string(index=False))
     print(f"  Saved to: {args.output}")
 
 
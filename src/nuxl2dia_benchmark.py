@@ -0,0 +1,460 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the NuXL to DIA-NN spectral library converter.
+
+Generates synthetic NuXL TextExporter precursor tables (NUXL_COLUMNS schema)
+and times converter kernels on them. Runs offline without OpenMS.
+
+Usage:
+    python nuxl2dia_benchmark.py strings --rows 1000000
+    python nuxl2dia_benchmark.py pipeline --sizes 10000 100000 1000000 -o report.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import platform
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    from src.nuxl2dia import NUXL_COLUMNS, ConverterConfig, NuXLLibraryConverter
+except ImportError:
+    from nuxl2dia import NUXL_COLUMNS, ConverterConfig, NuXLLibraryConverter
+
+
+AMINO_ACIDS = list('ACDEFGHIKLMNPQRSTVWY')
+NUCLEOTIDES = ['U', 'UU', 'UC', 'CU', 'U-H2O1', 'C-H3N1', 'GA', 'AU', 'none']
+ION_ANNOTATIONS = [
+    'y1', 'y2', 'y3', 'y4', 'y5', 'y6', 'y7', 'b2', 'b3', 'b4', 'b5', 'b6',
+    'a2', 'c3', "b4+C'-NH3", 'y5-H2O1+', 'y6+U', 'b3+U-H2O1', 'iK', 'iY',
+    '[M+H]+', "[M+H]+U'",
+]
+
+
+# =============================================================================
+# Synthetic Data
+# =============================================================================
+
+def generate_precursors(n_rows: int, crosslink: bool = True, seed: int = 0,
+                        n_unique: int = None, decoy_fraction: float = 0.1,
+                        fragments_per_precursor: int = 20,
+                        with_ccs: bool = True) -> pd.DataFrame:
+    """
+    Generate a synthetic NuXL TextExporter table.
+
+    CSMs are drawn from a pool of distinct precursors (peptide, adduct,
+    localization) so that sequences, accessions and annotations repeat the
+    way they do in real search results.
+
+    Args:
+        n_rows: Number of CSM rows
+        crosslink: Generate crosslinks (with NuXL:NA adducts) or linear peptides
+        seed: Random seed
+        n_unique: Number of distinct precursors (default: n_rows // 5)
+        decoy_fraction: Fraction of pure decoy accessions
+        fragments_per_precursor: Mean number of annotated peaks per CSM
+        with_ccs: Include the IM (CCS) column
+
+    Returns:
+        DataFrame with the NUXL_COLUMNS schema
+    """
+    rng = np.random.default_rng(seed)
+    n_unique = max(1, n_unique or n_rows // 5)
+
+    # Precursor pool with occasional Oxidation / Carbamidomethyl modifications
+    lengths = rng.integers(7, 25, size=n_unique)
+    residues = rng.choice(AMINO_ACIDS, size=lengths.sum())
+    oxidized = rng.random(lengths.sum()) < 0.3
+    residue_offsets = np.concatenate([[0], np.cumsum(lengths)])
+    plain_pool = []
+    modified_pool = []
+    for start, end in zip(residue_offsets[:-1], residue_offsets[1:]):
+        plain = ''.join(residues[start:end])
+        plain_pool.append(plain)
+        modified_pool.append(''.join(
+            aa + '(Carbamidomethyl)' if aa == 'C'
+            else aa + '(Oxidation)' if aa == 'M' and ox
+            else aa
+            for aa, ox in zip(plain, oxidized[start:end])
+        ))
+
+    accession_pool = np.array([f'sp|P{i:05d}|PROT{i}_HUMAN' for i in range(max(1, n_unique // 3))])
+    accessions = rng.choice(accession_pool, size=n_unique).astype(object)
+    is_decoy = rng.random(n_unique) < decoy_fraction
+    accessions[is_decoy] = 'DECOY_' + accessions[is_decoy]
+    # A few mixed target/decoy accessions that must stay as targets
+    mixed = rng.random(n_unique) < 0.02
+    accessions[mixed] = accessions[mixed] + ';DECOY_sp|P99999'
+
+    if crosslink:
+        nucleotides = rng.choice(NUCLEOTIDES[:-1], size=n_unique).astype(object)
+        positions = (rng.random(n_unique) * (lengths + 1)).astype(np.int64) - 1
+        best_locs = np.array([
+            p if pos < 0 else p[:pos] + p[pos].lower() + p[pos + 1:]
+            for p, pos in zip(plain_pool, positions.tolist())
+        ], dtype=object)
+    else:
+        nucleotides = np.full(n_unique, 'none', dtype=object)
+        positions = np.full(n_unique, -1, dtype=np.int64)
+        best_locs = np.array(plain_pool, dtype=object)
+
+    # Peak annotation strings come from a pool of distinct spectra
+    n_spectra = min(n_rows, 50_000)
+    n_peaks = rng.poisson(fragments_per_precursor, size=n_spectra)
+    total_peaks = int(n_peaks.sum())
+    peaks = [
+        f'{m:.4f},{i:.5f},{c},"{ION_ANNOTATIONS[a]}"'
+        for m, i, c, a in zip(rng.uniform(100.0, 2000.0, size=total_peaks).tolist(),
+                              rng.random(total_peaks).tolist(),
+                              rng.integers(1, 3, size=total_peaks).tolist(),
+                              rng.integers(0, len(ION_ANNOTATIONS), size=total_peaks).tolist())
+    ]
+    peak_offsets = np.concatenate([[0], np.cumsum(n_peaks)]).tolist()
+    spectra = np.array(
+        ['|'.join(peaks[peak_offsets[k]:peak_offsets[k + 1]]) for k in range(n_spectra)],
+        dtype=object,
+    )
+
+    pick = rng.integers(0, n_unique, size=n_rows)
+    charge = rng.integers(2, 6, size=n_rows)
+    peptide_mass = lengths[pick] * 110.0 + rng.normal(0, 50, size=n_rows)
+
+    df = pd.DataFrame({
+        NUXL_COLUMNS['rt']: np.round(rng.uniform(300.0, 7200.0, size=n_rows), 3),
+        NUXL_COLUMNS['mz']: (peptide_mass + charge * 1.007276) / charge,
+        NUXL_COLUMNS['sequence']: np.array(modified_pool, dtype=object)[pick],
+        NUXL_COLUMNS['charge']: charge,
+        NUXL_COLUMNS['accessions']: accessions[pick],
+        NUXL_COLUMNS['peak_annotations']: spectra[rng.integers(0, n_spectra, size=n_rows)],
+        NUXL_COLUMNS['nucleotide']: nucleotides[pick],
+        NUXL_COLUMNS['best_localization']: best_locs[pick],
+        NUXL_COLUMNS['localization_position']: positions[pick],
+        NUXL_COLUMNS['localization_score']: (np.round(rng.random(n_rows), 3) if crosslink
+                                             else np.zeros(n_rows)),
+        NUXL_COLUMNS['nuxl_score']: np.round(rng.random(n_rows), 4),
+        NUXL_COLUMNS['target_decoy']: np.where(is_decoy[pick], 'decoy', 'target'),
+    })
+
+    if with_ccs:
+        df[NUXL_COLUMNS['ccs']] = np.round(rng.uniform(300.0, 900.0, size=n_rows), 2)
+
+    return df
+
+
+def write_synthetic_inputs(directory: Path, n_rows: int, seed: int = 0) -> Dict[str, Path]:
+    """
+    Write synthetic TextExporter files and an iRT reference to a directory.
+
+    Crosslinks and linear peptides get n_rows CSMs each.
+
+    Args:
+        directory: Output directory
+        n_rows: Number of CSM rows per file
+        seed: Random seed
+
+    Returns:
+        Dictionary with 'xl', 'peptides' and 'irt_reference' file paths
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = {
+        'xl': directory / f'synthetic_{n_rows}_XLs.unknown',
+        'peptides': directory / f'synthetic_{n_rows}_peptides.unknown',
+        'irt_reference': directory / 'synthetic_irt_reference.tsv',
+    }
+
+    generate_precursors(n_rows, crosslink=True, seed=seed).to_csv(
+        paths['xl'], sep='\t', index=False)
+    generate_precursors(n_rows, crosslink=False, seed=seed + 1).to_csv(
+        paths['peptides'], sep='\t', index=False)
+
+    # Slightly non-linear RT -> iRT relation, as in real reference libraries
+    rng = np.random.default_rng(seed)
+    rt = np.sort(rng.uniform(300.0, 7200.0, size=5000))
+    irt = -30.0 + 0.025 * rt + 4e-7 * (rt - 3500.0) ** 2 + rng.normal(0.0, 0.5, size=len(rt))
+    pd.DataFrame({'RT': rt, 'iRT': irt}).to_csv(paths['irt_reference'], sep='\t', index=False)
+
+    return paths
+
+
+# =============================================================================
+# Benchmarks
+# =============================================================================
+
+def _best_time(func: Callable[[], object], repeat: int) -> float:
+    """Return the best wall time of repeat calls to func."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def benchmark_string_kernels(n_rows: int, seed: int = 0, repeat: int = 3) -> List[Dict]:
+    """
+    Compare row-wise and unique-key string kernels on a synthetic table.
+
+    Covers modified-sequence building, peptide modification conversion,
+    sequence stripping and decoy detection.
+
+    Args:
+        n_rows: Number of CSM rows
+        seed: Random seed
+        repeat: Number of repetitions per kernel (best time is reported)
+
+    Returns:
+        List of result dictionaries (kernel, rows, row-wise / memoized seconds, speedup)
+    """
+    converter = NuXLLibraryConverter()
+    xl_df = generate_precursors(n_rows, crosslink=True, seed=seed)
+    pep_df = generate_precursors(n_rows, crosslink=False, seed=seed + 1)
+
+    seq_col = NUXL_COLUMNS['sequence']
+    acc_col = NUXL_COLUMNS['accessions']
+    xl_cols = [
+        NUXL_COLUMNS['best_localization'],
+        NUXL_COLUMNS['nucleotide'],
+        NUXL_COLUMNS['sequence'],
+        NUXL_COLUMNS['localization_position'],
+    ]
+
+    def is_pure_decoy(accessions: str) -> bool:
+        if pd.isna(accessions):
+            return False
+        return all(p.strip().upper().startswith('DECOY') for p in accessions.split(';'))
+
+    def build_rowwise():
+        xl_df.apply(lambda row: converter._build_xl_modified_sequence(*(row[c] for c in xl_cols)), axis=1)
+
+    def build_memoized():
+        converter._xl_df = xl_df.copy()
+        converter._pep_df = None
+        converter.build_modified_sequences()
+
+    kernels = [
+        ('build_xl_modified_sequence', build_rowwise, build_memoized),
+        ('convert_modification_format',
+         lambda: pep_df[seq_col].apply(converter._convert_modification_format),
+         lambda: converter._map_unique(pep_df[seq_col], converter._convert_modification_format)),
+        ('strip_sequence',
+         lambda: xl_df[seq_col].apply(converter._strip_sequence),
+         lambda: converter._map_unique(xl_df[seq_col], converter._strip_sequence)),
+        ('is_pure_decoy',
+         lambda: xl_df[acc_col].apply(is_pure_decoy),
+         lambda: converter._pure_decoy_mask(xl_df)),
+    ]
+
+    results = []
+    for name, rowwise, memoized in kernels:
+        rowwise_time = _best_time(rowwise, repeat)
+        memoized_time = _best_time(memoized, repeat)
+        results.append({
+            'kernel': name,
+            'rows': n_rows,
+            'rowwise_s': round(rowwise_time, 4),
+            'memoized_s': round(memoized_time, 4),
+            'speedup': round(rowwise_time / memoized_time, 1) if memoized_time > 0 else float('inf'),
+        })
+
+    return results
+
+
+PIPELINE_STAGES = [
+    'load_files',
+    'filter_decoys',
+    'filter_localization',
+    'filter_charge',
+    'deduplicate',
+    'convert_ccs_to_im',
+    'build_modified_sequences',
+    'parse_peak_annotations',
+    'filter_fragment_ions',
+    'select_top_fragments',
+    'convert_rt_to_irt',
+    'format_output',
+    'save',
+]
+
+
+def _peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB (ru_maxrss is KB on Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def benchmark_pipeline_size(n_rows: int, workdir: str, seed: int = 0,
+                            irt_mode: str = 'none') -> Dict:
+    """
+    Time each converter stage on synthetic inputs of one size.
+
+    Meant to run in a fresh process so that the peak RSS belongs to this
+    size only.
+
+    Args:
+        n_rows: Number of CSM rows per input file (XLs and peptides)
+        workdir: Directory for the synthetic inputs and the library
+        seed: Random seed
+        irt_mode: iRT conversion mode ('none', 'linear', 'piecewise')
+
+    Returns:
+        Result dictionary with per-stage seconds and peak RSS
+    """
+    logging.disable(logging.INFO)
+    workdir = Path(workdir)
+
+    start = time.perf_counter()
+    paths = write_synthetic_inputs(workdir, n_rows, seed=seed)
+    generate_s = time.perf_counter() - start
+
+    library_file = workdir / f'synthetic_{n_rows}_library.tsv'
+    converter = NuXLLibraryConverter(ConverterConfig(
+        input_files=[paths['xl'], paths['peptides']],
+        output_file=library_file,
+        irt_mode=irt_mode,
+        irt_reference_file=paths['irt_reference'],
+    ))
+
+    steps = {
+        'load_files': converter.load_files,
+        'save': lambda: converter.save(library_file),
+    }
+
+    stages = []
+    rss_before = _peak_rss_mb()
+    for stage in PIPELINE_STAGES:
+        step = steps.get(stage, getattr(converter, stage))
+        start = time.perf_counter()
+        step()
+        stages.append({
+            'stage': stage,
+            'seconds': round(time.perf_counter() - start, 4),
+            'peak_rss_mb': round(_peak_rss_mb(), 1),
+        })
+
+    stats = converter.get_stats()
+    return {
+        'rows': n_rows,
+        'input_mb': round(sum(paths[k].stat().st_size for k in ('xl', 'peptides')) / 2**20, 1),
+        'library_mb': round(library_file.stat().st_size / 2**20, 1),
+        'irt_mode': irt_mode,
+        'xl_entries': stats['xl_entries'],
+        'peptide_entries': stats['peptide_entries'],
+        'library_rows': stats['library_rows'],
+        'generate_s': round(generate_s, 4),
+        'total_s': round(sum(s['seconds'] for s in stages), 4),
+        'rss_before_mb': round(rss_before, 1),
+        'peak_rss_mb': round(_peak_rss_mb(), 1),
+        'stages': stages,
+    }
+
+
+def benchmark_pipeline(sizes: List[int], seed: int = 0, irt_mode: str = 'none',
+                       workdir: Optional[Path] = None) -> Dict:
+    """
+    Run the stage benchmark for several input sizes.
+
+    Each size runs in its own worker process (fresh peak RSS).
+
+    Args:
+        sizes: Numbers of CSM rows per input file
+        seed: Random seed
+        irt_mode: iRT conversion mode
+        workdir: Directory for synthetic files (default: temporary directory)
+
+    Returns:
+        Report dictionary (environment and one result per size)
+    """
+    results = []
+    with tempfile.TemporaryDirectory(prefix='nuxl2dia_bench_') as tmp:
+        base = Path(workdir) if workdir else Path(tmp)
+        for n_rows in sizes:
+            with ProcessPoolExecutor(max_workers=1) as pool:
+                result = pool.submit(
+                    benchmark_pipeline_size, n_rows, str(base / f'rows_{n_rows}'), seed, irt_mode
+                ).result()
+            results.append(result)
+            print(f"{n_rows:>10} rows: {result['total_s']:.2f} s, "
+                  f"peak RSS {result['peak_rss_mb']:.0f} MB", file=sys.stderr)
+
+    return {
+        'benchmark': 'nuxl2dia pipeline',
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'seed': seed,
+        'results': results,
+    }
+
+
+# =============================================================================
+# CLI Interface
+# =============================================================================
+
+def parse_args() -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(
+        description='Benchmark the NuXL to DIA-NN library converter on synthetic data'
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    strings = subparsers.add_parser('strings', help='Row-wise vs memoized string kernels')
+    strings.add_argument('--rows', type=int, default=1_000_000,
+                         help='Number of synthetic CSM rows (default: 1000000)')
+    strings.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+    strings.add_argument('--repeat', type=int, default=3,
+                         help='Repetitions per kernel, best time is reported (default: 3)')
+
+    pipeline = subparsers.add_parser('pipeline', help='Per-stage timing and peak RSS of the converter')
+    pipeline.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000],
+                          help='CSM rows per input file, one run per size '
+                               '(default: 10000 100000 1000000; up to 10000000)')
+    pipeline.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+    pipeline.add_argument('--irt', choices=['none', 'linear', 'piecewise'], default='none',
+                          help='iRT conversion mode against a synthetic reference (default: none)')
+    pipeline.add_argument('--workdir', type=str, default=None,
+                          help='Keep synthetic inputs and libraries in this directory '
+                               '(default: temporary directory)')
+    pipeline.add_argument('-o', '--output', type=str, default='nuxl2dia_benchmark.json',
+                          help='JSON report file (default: nuxl2dia_benchmark.json)')
+
+    return parser.parse_args()
+
+
+def main():
+    """Main CLI entry point."""
+    args = parse_args()
+    logging.disable(logging.INFO)
+
+    if args.command == 'strings':
+        results = benchmark_string_kernels(args.rows, seed=args.seed, repeat=args.repeat)
+        print(pd.DataFrame(results).to_string(index=False))
+
+    elif args.command == 'pipeline':
+        report = benchmark_pipeline(args.sizes, seed=args.seed, irt_mode=args.irt,
+                                    workdir=Path(args.workdir) if args.workdir else None)
+        Path(args.output).write_text(json.dumps(report, indent=2))
+
+        table = pd.DataFrame([
+            {'rows': r['rows'], **{s['stage']: s['seconds'] for s in r['stages']},
+             'total_s': r['total_s'], 'peak_rss_mb': r['peak_rss_mb']}
+            for r in report['results']
+        ])
+        print(table.to_string(index=False))
+        print(f"\nReport written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,399 @@
+"""
+Workspace-wide CSM index for cross-run search.
+
+The top hits of all result-files/*.idXML of a workspace are kept in one
+SQLite database (<workspace>/cache/csm-index.sqlite): sequence, NuXL:NA,
+localization, NuXL:score, q-value, accessions and run. Sequences and
+accessions have B-tree indexes that answer prefix searches with range
+scans. The index is updated incrementally: a file is (re)indexed only if
+its fingerprint (path, size, mtime) changed, and runs of deleted files are
+dropped. Updates run in a background thread, so the viewer never waits for
+idXML parsing; the database is in WAL mode, so searches run during updates.
+"""
+
+import contextlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+import pandas as pd
+
+from src.nuxl_idxml_reader import iter_idxml_top_hits
+from src.nuxl_pseudo_roc import idxml_fingerprint
+
+CSM_INDEX_FILE = Path("cache", "csm-index.sqlite")
+CSM_INDEX_FDR_LEVELS = (0.01, 0.05, 0.1)
+CSM_INDEX_SEARCH_LIMIT = 1000
+
+# PeptideIdentification score types whose hit scores are q-values (NuXL and
+# Percolator write "q-value"), compared case-insensitively
+CSM_INDEX_Q_VALUE_SCORE_TYPES = ("q-value", "q_value", "qvalue", "q")
+
+# Version of the indexed row format; it is part of the stored run
+# fingerprints, so runs indexed with an older format are indexed again
+CSM_INDEX_FORMAT_VERSION = 3
+
+CSM_INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    run TEXT NOT NULL UNIQUE,
+    fingerprint TEXT NOT NULL,
+    n_csms INTEGER NOT NULL,
+    indexed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS csms (
+    csm_id INTEGER PRIMARY KEY,
+    run_id INTEGER NOT NULL,
+    spec_id TEXT,
+    sequence TEXT,
+    unmodified_sequence TEXT,
+    charge INTEGER,
+    na TEXT,
+    localization TEXT,
+    localization_position INTEGER,
+    localization_score REAL,
+    score REAL,
+    q_value REAL,
+    label INTEGER,
+    accessions TEXT
+);
+CREATE INDEX IF NOT EXISTS csms_crosslink ON csms (unmodified_sequence, na);
+CREATE INDEX IF NOT EXISTS csms_na ON csms (na);
+CREATE INDEX IF NOT EXISTS csms_run ON csms (run_id);
+CREATE TABLE IF NOT EXISTS csm_accessions (
+    csm_id INTEGER NOT NULL,
+    run_id INTEGER NOT NULL,
+    accession TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS csm_accessions_accession ON csm_accessions (accession, csm_id);
+CREATE INDEX IF NOT EXISTS csm_accessions_run ON csm_accessions (run_id);
+CREATE TABLE IF NOT EXISTS run_fdr_counts (
+    run_id INTEGER NOT NULL,
+    fdr_level REAL NOT NULL,
+    csms INTEGER NOT NULL,
+    xl_csms INTEGER NOT NULL,
+    PRIMARY KEY (run_id, fdr_level)
+);
+"""
+
+# Columns of search results: SQL expression -> column name
+CSM_INDEX_RESULT_COLUMNS = {
+    "r.run": "run",
+    "c.spec_id": "SpecId",
+    "c.sequence": "Peptide",
+    "c.charge": "charge",
+    "c.na": "NuXL:NA",
+    "c.localization": "NuXL:best_localization",
+    "c.localization_position": "NuXL:best_localization_position",
+    "c.localization_score": "NuXL:best_localization_score",
+    "c.score": "NuXL:score",
+    "c.q_value": "q-value",
+    "c.accessions": "accessions",
+}
+
+# Index updates running in this process, by database path
+_UPDATE_THREADS: Dict[str, threading.Thread] = {}
+_UPDATE_LOCK = threading.Lock()
+
+
+def csm_index_path(workspace: Union[str, Path]) -> Path:
+    """Return the CSM index database of a workspace."""
+    return Path(workspace, CSM_INDEX_FILE)
+
+
+def _connect(workspace: Union[str, Path]) -> sqlite3.Connection:
+    """Open (and create if needed) the CSM index of a workspace."""
+    db_path = csm_index_path(workspace)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(CSM_INDEX_SCHEMA)
+    return conn
+
+
+def unmodified_sequence(sequence: str) -> str:
+    """Strip modifications like (Oxidation) or [+15.99] and terminal dots from a peptide sequence."""
+    residues = []
+    depth = 0
+    for char in sequence:
+        if char in "([":
+            depth += 1
+        elif char in ")]":
+            depth = max(depth - 1, 0)
+        elif depth == 0 and char != ".":
+            residues.append(char)
+    return "".join(residues)
+
+
+def _prefix_range(prefix: str) -> Tuple[str, str]:
+    """Return the [low, high) string range of all values starting with prefix."""
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def _to_float(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_int(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _csm_rows(idxml_file: Path) -> List[tuple]:
+    """Read the index rows (top hit per spectrum) of an idXML file."""
+    rows = []
+    for hit in iter_idxml_top_hits(idxml_file, top=1, peaks=False):
+        meta = hit["meta"]
+        rows.append((
+            hit["SpecId"],
+            hit["Peptide"],
+            unmodified_sequence(hit["Peptide"]),
+            2 * hit["charge2"] + 3 * hit["charge3"] + 4 * hit["charge4"] + 5 * hit["charge5"] or None,
+            meta.get("NuXL:NA"),
+            meta.get("NuXL:best_localization"),
+            _to_int(meta.get("NuXL:best_localization_position")),
+            _to_float(meta.get("NuXL:best_localization_score")),
+            _to_float(meta.get("NuXL:score")),
+            hit["Score"] if hit["score_type"].strip().lower() in CSM_INDEX_Q_VALUE_SCORE_TYPES else None,
+            hit["Label"],
+            hit["accessions"],
+        ))
+    return rows
+
+
+def _index_run(conn: sqlite3.Connection, run: str, fingerprint: str, rows: List[tuple]) -> bool:
+    """
+    Replace the CSMs of a run in one transaction.
+
+    Returns:
+        False if another process indexed the same file version meanwhile.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        existing = conn.execute("SELECT run_id, fingerprint FROM runs WHERE run = ?", (run,)).fetchone()
+        if existing and existing[1] == fingerprint:
+            conn.execute("ROLLBACK")
+            return False
+        if existing:
+            _delete_run(conn, existing[0])
+
+        run_id = conn.execute(
+            "INSERT INTO runs (run, fingerprint, n_csms, indexed_at) VALUES (?, ?, ?, ?)",
+            (run, fingerprint, len(rows), time.time()),
+        ).lastrowid
+        first_csm_id = (conn.execute("SELECT COALESCE(MAX(csm_id), 0) FROM csms").fetchone()[0]) + 1
+
+        conn.executemany(
+            "INSERT INTO csms (csm_id, run_id, spec_id, sequence, unmodified_sequence, charge, na, localization, "
+            "localization_position, localization_score, score, q_value, label, accessions) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            ((first_csm_id + i, run_id, *row) for i, row in enumerate(rows)),
+        )
+        conn.executemany(
+            "INSERT INTO csm_accessions (csm_id, run_id, accession) VALUES (?, ?, ?)",
+            ((first_csm_id + i, run_id, accession)
+             for i, row in enumerate(rows)
+             for accession in (row[-1] or "").split(";") if accession),
+        )
+        # target CSMs and crosslinked target CSMs at each FDR level
+        conn.executemany(
+            "INSERT INTO run_fdr_counts (run_id, fdr_level, csms, xl_csms) "
+            "SELECT ?, ?, COALESCE(SUM(label = 1 AND q_value <= ?), 0), "
+            "COALESCE(SUM(label = 1 AND q_value <= ? AND na != 'none'), 0) FROM csms WHERE run_id = ?",
+            ((run_id, level, level, level, run_id) for level in CSM_INDEX_FDR_LEVELS),
+        )
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return True
+
+
+def _delete_run(conn: sqlite3.Connection, run_id: int) -> None:
+    """Delete a run and its CSMs (inside a transaction)."""
+    conn.execute("DELETE FROM run_fdr_counts WHERE run_id = ?", (run_id,))
+    conn.execute("DELETE FROM csm_accessions WHERE run_id = ?", (run_id,))
+    conn.execute("DELETE FROM csms WHERE run_id = ?", (run_id,))
+    conn.execute("DELETE FROM runs WHERE run_id = ?", (run_id,))
+
+
+def update_csm_index(workspace: Union[str, Path],
+                     progress: Optional[Callable[[str], None]] = None) -> Dict[str, int]:
+    """
+    Bring the CSM index of a workspace up to date with its result files.
+
+    New and changed idXML files are indexed, runs of removed files are
+    dropped; unchanged files are not read.
+
+    Args:
+        workspace: workspace directory (with result-files/)
+        progress: called with each file name before it is indexed
+
+    Returns:
+        Number of "indexed", "removed" and "unchanged" runs.
+    """
+    result_dir = Path(workspace, "result-files")
+    files = {f.name: f for f in sorted(result_dir.glob("*.idXML"))} if result_dir.is_dir() else {}
+    stats = {"indexed": 0, "removed": 0, "unchanged": 0}
+
+    with contextlib.closing(_connect(workspace)) as conn:
+        indexed = dict(conn.execute("SELECT run, fingerprint FROM runs").fetchall())
+
+        for run in set(indexed) - set(files):
+            conn.execute("BEGIN IMMEDIATE")
+            run_id = conn.execute("SELECT run_id FROM runs WHERE run = ?", (run,)).fetchone()
+            if run_id:
+                _delete_run(conn, run_id[0])
+            conn.execute("COMMIT")
+            stats["removed"] += 1
+
+        for run, idxml_file in files.items():
+            try:
+                fingerprint = f"{idxml_fingerprint(idxml_file)}.v{CSM_INDEX_FORMAT_VERSION}"
+            except OSError:
+                continue  # removed while updating
+            if indexed.get(run) == fingerprint:
+                stats["unchanged"] += 1
+                continue
+
+            if progress:
+                progress(run)
+            try:
+                rows = _csm_rows(idxml_file)
+            except Exception:
+                continue  # incomplete or invalid file; retried on the next update
+            if _index_run(conn, run, fingerprint, rows):
+                stats["indexed"] += 1
+
+    return stats
+
+
+def start_csm_index_update(workspace: Union[str, Path]) -> bool:
+    """
+    Update the CSM index of a workspace in a background thread.
+
+    Returns:
+        True if an update was started, False if one is already running.
+    """
+    key = str(csm_index_path(workspace).resolve())
+    with _UPDATE_LOCK:
+        thread = _UPDATE_THREADS.get(key)
+        if thread is not None and thread.is_alive():
+            return False
+        thread = threading.Thread(target=update_csm_index, args=(Path(workspace),),
+                                  name="csm-index-update", daemon=True)
+        _UPDATE_THREADS[key] = thread
+        thread.start()
+    return True
+
+
+def csm_index_update_running(workspace: Union[str, Path]) -> bool:
+    """Return True while a background update of the workspace index runs in this process."""
+    thread = _UPDATE_THREADS.get(str(csm_index_path(workspace).resolve()))
+    return thread is not None and thread.is_alive()
+
+
+def _search_conditions(sequence: str, accession: str, na: str,
+                       max_q_value: Optional[float], targets_only: bool) -> Tuple[str, list]:
+    """Build the WHERE clause of a CSM search."""
+    conditions, parameters = [], []
+    # blank filters (e.g. whitespace only) are not applied
+    sequence = unmodified_sequence((sequence or "").strip().upper())
+    accession = (accession or "").strip()
+    na = (na or "").strip()
+    if sequence:
+        conditions.append("c.unmodified_sequence >= ? AND c.unmodified_sequence < ?")
+        parameters.extend(_prefix_range(sequence))
+    if accession:
+        conditions.append("c.csm_id IN (SELECT csm_id FROM csm_accessions WHERE accession >= ? AND accession < ?)")
+        parameters.extend(_prefix_range(accession))
+    if na:
+        conditions.append("c.na >= ? AND c.na < ?")
+        parameters.extend(_prefix_range(na))
+    if max_q_value is not None:
+        conditions.append("c.q_value <= ?")
+        parameters.append(max_q_value)
+    if targets_only:
+        conditions.append("c.label = 1")
+    return (" WHERE " + " AND ".join(conditions)) if conditions else "", parameters
+
+
+def search_csm_index(workspace: Union[str, Path], sequence: str = "", accession: str = "", na: str = "",
+                     max_q_value: Optional[float] = None, targets_only: bool = True,
+                     limit: int = CSM_INDEX_SEARCH_LIMIT) -> pd.DataFrame:
+    """
+    Search the CSMs of all runs of a workspace.
+
+    Args:
+        workspace: workspace directory
+        sequence: unmodified peptide sequence prefix
+        accession: protein accession prefix
+        na: NuXL:NA (nucleic acid adduct) prefix
+        max_q_value: keep CSMs with a q-value up to this level
+        targets_only: drop decoy CSMs
+        limit: maximum number of CSMs (best q-value first)
+
+    Returns:
+        One row per CSM with its run.
+    """
+    where, parameters = _search_conditions(sequence, accession, na, max_q_value, targets_only)
+    columns = ", ".join(f'{expression} AS "{name}"' for expression, name in CSM_INDEX_RESULT_COLUMNS.items())
+    query = (f"SELECT {columns} FROM csms c JOIN runs r ON r.run_id = c.run_id{where} "
+             "ORDER BY c.q_value, c.score DESC LIMIT ?")
+    with contextlib.closing(_connect(workspace)) as conn:
+        return pd.read_sql_query(query, conn, params=parameters + [limit])
+
+
+def search_csm_index_crosslinks(workspace: Union[str, Path], sequence: str = "", accession: str = "",
+                                na: str = "", max_q_value: Optional[float] = None,
+                                targets_only: bool = True,
+                                limit: int = CSM_INDEX_SEARCH_LIMIT) -> pd.DataFrame:
+    """
+    Search crosslinks (unmodified sequence and NuXL:NA) across runs.
+
+    Takes the filters of search_csm_index.
+
+    Returns:
+        One row per crosslink: the runs it was seen in, the number of CSMs,
+        the best q-value and the best NuXL:score.
+    """
+    where, parameters = _search_conditions(sequence, accession, na, max_q_value, targets_only)
+    query = (
+        'SELECT c.unmodified_sequence AS "Peptide", c.na AS "NuXL:NA", COUNT(DISTINCT c.run_id) AS "runs", '
+        'COUNT(*) AS "CSMs", MIN(c.q_value) AS "best q-value", MAX(c.score) AS "best NuXL:score", '
+        'GROUP_CONCAT(DISTINCT r.run) AS "seen in" '
+        f"FROM csms c JOIN runs r ON r.run_id = c.run_id{where} "
+        'GROUP BY c.unmodified_sequence, c.na ORDER BY "runs" DESC, "best q-value" LIMIT ?'
+    )
+    with contextlib.closing(_connect(workspace)) as conn:
+        return pd.read_sql_query(query, conn, params=parameters + [limit])
+
+
+def csm_index_run_summary(workspace: Union[str, Path]) -> pd.DataFrame:
+    """
+    Count the target CSMs of each indexed run at the CSM_INDEX_FDR_LEVELS.
+
+    The counts are computed when a run is indexed.
+
+    Returns:
+        One row per run: all CSMs, then target CSMs and crosslinked target
+        CSMs (NuXL:NA other than "none") with a q-value up to each level.
+    """
+    query = ("SELECT r.run, r.n_csms, f.fdr_level, f.csms, f.xl_csms "
+             "FROM runs r LEFT JOIN run_fdr_counts f ON f.run_id = r.run_id ORDER BY r.run, f.fdr_level")
+    with contextlib.closing(_connect(workspace)) as conn:
+        counts = pd.read_sql_query(query, conn)
+
+    summary = counts.groupby("run", sort=True)["n_csms"].first().rename("CSMs").to_frame()
+    for level in CSM_INDEX_FDR_LEVELS:
+        at_level = counts[counts["fdr_level"] == level].set_index("run")
+        summary[f"CSMs at {level:.0%} FDR"] = at_level["csms"]
+        summary[f"XL CSMs at {level:.0%} FDR"] = at_level["xl_csms"]
+    return summary.reset_index()
@@ -3,6 +3,7 @@ from pathlib import Path
 import streamlit as st
 
 from src.nuxl_helper import reset_directory
+from src.nuxl_spectrum_store import start_spectrum_store_build
 
 def add_to_selected_mzML(filename: str):
     """
@@ -68,6 +69,10 @@ def save_uploaded_mzML(uploaded_files) -> None:
             with open(Path(mzML_dir, f.name), "wb") as fh:
                 fh.write(f.getbuffer())
 
+            if f.name.endswith("mzML"):
+                # index the spectra for the results viewer and MGF export
+                start_spectrum_store_build(Path(mzML_dir, f.name))
+
             add_to_selected_mzML(Path(f.name).stem)
             success_files.append(f.name)
             existing_files.add(f.name)
@@ -136,6 +141,7 @@ def copy_local_mzML_files_from_directory(local_mzML_directory: str) -> None:
     for f in files:
         if f.name not in mzML_dir.iterdir():
             shutil.copy(f, mzML_dir)
+            start_spectrum_store_build(Path(mzML_dir, f.name))
         add_to_selected_mzML(f.stem)
     st.success("Successfully added local files!")
 
@@ -0,0 +1,256 @@
+"""
+Streaming idXML reader for NuXL CSM tables.
+
+Reads the table built by readAndProcessIdXML (one row per top hit, static
+columns plus all hit meta values) with an incremental XML parser instead of
+IdXMLFile().load: each PeptideIdentification is converted into column values
+and dropped from the tree as soon as it ends, so memory stays bounded by the
+output table instead of the full pyOpenMS object graph.
+"""
+
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+from src.nuxl_peak_store import PEAK_STRING_COLUMNS, PeakStore, attach_peak_store
+
+# Static columns of the CSM table, followed by the hit meta values
+CSM_STATIC_COLUMNS = [
+    "SpecId", "PSMId", "Label", "Score", "ScanNr", "Peptide", "peplen", "ExpMass",
+    "charge2", "charge3", "charge4", "charge5", "accessions", "intensities", "mz_values", "ions",
+]
+
+CSM_CONVERT_DICT = {
+    "SpecId": str,
+    "PSMId": int,
+    "Label": int,
+    "Score": float,
+    "ScanNr": int,
+    "peplen": int,
+}
+
+# UserParam that IdXMLFile().load turns into the hit's peak annotations
+# (it is not kept as a meta value)
+FRAGMENT_ANNOTATION_PARAM = "fragment_annotation"
+
+# UserParam value types as returned by getMetaValue
+USER_PARAM_TYPES = {"int": int, "float": float, "string": str}
+
+
+def _tag(elem: ET.Element) -> str:
+    """Return the element tag without namespace."""
+    return elem.tag.rsplit("}", 1)[-1]
+
+
+def _user_param_value(param_type: Optional[str], value: Optional[str]) -> Any:
+    """Convert a UserParam value like getMetaValue does (lists become Python lists)."""
+    if value is None:
+        return None
+
+    if param_type and param_type.endswith("List"):
+        convert = USER_PARAM_TYPES.get(param_type[:-4], str)
+        items = value.strip()
+        if items.startswith("[") and items.endswith("]"):
+            items = items[1:-1]
+        return [convert(item.strip()) for item in items.split(",") if item.strip()]
+
+    try:
+        return USER_PARAM_TYPES.get(param_type, str)(value)
+    except ValueError:
+        return value
+
+
+def _peak_annotations(annotation_string: Optional[str]) -> Tuple[List[float], List[float], List[str]]:
+    """
+    Split a fragment_annotation UserParam into the m/z values, intensities
+    and annotations of the hit's annotated peaks.
+
+    Entries are separated by '|' and look like mz,intensity,charge,"annotation".
+    """
+    mz_values: List[float] = []
+    intensities: List[float] = []
+    ions: List[str] = []
+    if not annotation_string:
+        return mz_values, intensities, ions
+
+    for entry in annotation_string.split("|"):
+        fields = entry.split(",", 3)
+        if len(fields) < 4:
+            continue
+        mz, intensity, _, annotation = fields
+        mz_values.append(float(mz))
+        intensities.append(float(intensity))
+        ions.append(annotation.strip().strip('"'))
+
+    return mz_values, intensities, ions
+
+
+def _peak_annotation_strings(peaks: Tuple[List[float], List[float], List[str]]) -> Tuple[str, str, str]:
+    """
+    Format parsed peak annotations as the comma-joined intensity, m/z and
+    ion strings of the CSM table (numbers as str(float), like the
+    PeakAnnotation attributes).
+    """
+    mz_values, intensities, ions = peaks
+    return ",".join(map(str, intensities)), ",".join(map(str, mz_values)), ",".join(ions)
+
+
+def iter_idxml_top_hits(input_file, top: int = 1, peaks: bool = True) -> Iterator[Dict[str, Any]]:
+    """
+    Stream the top hits of an idXML file.
+
+    Args:
+        input_file: idXML file path
+        top: number of hits per PeptideIdentification (default 1)
+        peaks: parse the annotated peaks (default True; "peaks" is None otherwise)
+
+    Yields:
+        One dict per hit with the static CSM columns except the peak strings,
+        the "score_type" of its PeptideIdentification, a "peaks" tuple of (m/z values, intensities, annotations) and a
+        "meta" dict of typed meta values in UserParam order.
+    """
+    accessions: Dict[str, str] = {}
+    peptide_id: Dict[str, str] = {}
+    psm_index = 0
+    stack: List[ET.Element] = []
+
+    for event, elem in ET.iterparse(str(input_file), events=("start", "end")):
+        if event == "start":
+            stack.append(elem)
+            if _tag(elem) == "PeptideIdentification":
+                peptide_id = dict(elem.attrib)
+                psm_index = 0
+            continue
+
+        stack.pop()
+        tag = _tag(elem)
+
+        if tag == "ProteinHit":
+            accessions[elem.get("id")] = elem.get("accession")
+            elem.clear()
+
+        elif tag == "PeptideHit":
+            psm_index += 1
+            if psm_index > top:
+                elem.clear()
+                continue
+
+            meta: Dict[str, Any] = {}
+            annotation_string = None
+            for child in elem:
+                if _tag(child) != "UserParam":
+                    continue
+                name = child.get("name")
+                if name == FRAGMENT_ANNOTATION_PARAM:
+                    annotation_string = child.get("value")
+                else:
+                    meta[name] = _user_param_value(child.get("type"), child.get("value"))
+
+            spectrum_id = peptide_id.get("spectrum_reference", "")
+            charge = int(elem.get("charge", 0))
+            sequence = elem.get("sequence", "")
+            refs = (elem.get("protein_refs") or "").split()
+
+            yield {
+                "SpecId": spectrum_id,
+                "PSMId": psm_index,
+                "Label": int("target" in str(meta.get("target_decoy", ""))),
+                "Score": float(elem.get("score", "nan")),
+                "score_type": peptide_id.get("score_type", ""),
+                "ScanNr": spectrum_id[spectrum_id.rfind("=") + 1:],
+                "Peptide": sequence,
+                "peplen": str(len(sequence)),
+                "ExpMass": float(peptide_id.get("MZ", "nan")),
+                "charge2": int(charge == 2),
+                "charge3": int(charge == 3),
+                "charge4": int(charge == 4),
+                "charge5": int(charge == 5),
+                # extractProteinAccessionsSet: sorted, unique accessions
+                "accessions": ";".join(sorted({accessions[r] for r in refs if r in accessions})),
+                "peaks": _peak_annotations(annotation_string) if peaks else None,
+                "meta": meta,
+            }
+            elem.clear()
+
+        elif tag == "PeptideIdentification":
+            elem.clear()
+            if stack:
+                # drop the finished identification from the tree
+                stack[-1].remove(elem)
+
+
+def read_idxml_columns(input_file, top: int = 1,
+                       peak_store: bool = False) -> Tuple[Optional[Dict[str, list]], Optional[PeakStore]]:
+    """
+    Read the top hits of an idXML file into column lists.
+
+    The meta value columns are those of the first hit (like getKeys on the
+    first hit); other hits contribute None for missing meta values.
+
+    Args:
+        input_file: idXML file path
+        top: number of hits per PeptideIdentification (default 1)
+        peak_store: keep the annotated peaks in a PeakStore instead of the
+            comma-joined intensities, mz_values and ions columns
+
+    Returns:
+        Column name -> values (None if the file has no hits), and the
+        PeakStore of the rows if peak_store is set.
+    """
+    columns: Optional[Dict[str, list]] = None
+    static_columns = [c for c in CSM_STATIC_COLUMNS if not (peak_store and c in PEAK_STRING_COLUMNS)]
+    meta_value_keys: List[str] = []
+    peaks: List[Tuple[List[float], List[float], List[str]]] = []
+
+    for hit in iter_idxml_top_hits(input_file, top):
+        meta = hit.pop("meta")
+        if columns is None:
+            meta_value_keys = [k for k in meta if k not in CSM_STATIC_COLUMNS]
+            columns = {name: [] for name in static_columns + meta_value_keys}
+
+        if peak_store:
+            peaks.append(hit["peaks"])
+        else:
+            hit["intensities"], hit["mz_values"], hit["ions"] = _peak_annotation_strings(hit["peaks"])
+
+        for name in static_columns:
+            columns[name].append(hit[name])
+        for key in meta_value_keys:
+            columns[key].append(meta.get(key))
+
+    return columns, (PeakStore.from_peaks(peaks) if peak_store and columns is not None else None)
+
+
+def _has_peptide_identifications(input_file) -> bool:
+    """Return True if an idXML file contains at least one PeptideIdentification."""
+    for _, elem in ET.iterparse(str(input_file), events=("start",)):
+        if _tag(elem) == "PeptideIdentification":
+            return True
+    return False
+
+
+def read_idxml_dataframe(input_file, top: int = 1, peak_store: bool = False) -> Optional[pd.DataFrame]:
+    """
+    Convert an idXML identification file to the CSM dataframe with the
+    streaming reader (drop-in for the IdXMLFile().load based parsers).
+
+    Args:
+        input_file: idXML file path
+        top: number of hits per PeptideIdentification (default 1)
+        peak_store: keep the annotated peaks in a PeakStore (see
+            src.nuxl_peak_store.attach_peak_store) instead of the
+            comma-joined peak columns
+
+    Returns:
+        df: dataframe (.idXML -> dataframe); an empty dataframe if the file
+        has identifications but no hits, None if it has no identifications
+    """
+    columns, store = read_idxml_columns(Path(input_file), top, peak_store)
+
+    if columns is None:
+        return pd.DataFrame() if _has_peptide_identifications(input_file) else None
+
+    df = pd.DataFrame(columns).astype(CSM_CONVERT_DICT)
+    return attach_peak_store(df, store) if peak_store else df
@@ -0,0 +1,225 @@
+"""
+Ragged peak annotation storage for NuXL CSM tables.
+
+The annotated peaks of all hits are kept in flat arrays (float64 m/z and
+intensity as parsed from the idXML, int32 annotation codes into one category
+array) plus an offsets array, so the peaks of hit i are
+peaks[offsets[i]:offsets[i + 1]]. Row
+access slices the flat arrays without copying, and whole-table operations
+(ion-type filters, annotation statistics) work on the codes instead of
+re-splitting comma-joined strings. The comma-joined "intensities",
+"mz_values" and "ions" columns are only built for table display and export.
+"""
+
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Comma-joined peak columns of the CSM table (string view of a PeakStore),
+# shown after the "accessions" column
+PEAK_STRING_COLUMNS = ["intensities", "mz_values", "ions"]
+PEAK_STRING_COLUMNS_AFTER = "accessions"
+
+# DataFrame.attrs key of the PeakStore of a CSM table; store row i holds the
+# peaks of the table row with index label i
+PEAK_STORE_ATTR = "peak_store"
+
+
+class PeakStore:
+    """Annotated peaks of a CSM table in a ragged flat-array layout."""
+
+    def __init__(self, offsets: np.ndarray, mz: np.ndarray, intensity: np.ndarray,
+                 ion_codes: np.ndarray, ion_categories: Sequence[str]):
+        """
+        Args:
+            offsets: int64 array of n_rows + 1 peak offsets
+            mz: float64 peak m/z values
+            intensity: float64 peak intensities
+            ion_codes: int32 codes into ion_categories, one per peak
+            ion_categories: distinct peak annotations
+        """
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.mz = np.asarray(mz, dtype=np.float64)
+        self.intensity = np.asarray(intensity, dtype=np.float64)
+        self.ion_codes = np.asarray(ion_codes, dtype=np.int32)
+        self.ion_categories = np.asarray(ion_categories, dtype=object)
+
+        if len(self.offsets) == 0 or self.offsets[-1] != len(self.mz):
+            raise ValueError("Peak offsets do not match the number of peaks")
+        if not len(self.mz) == len(self.intensity) == len(self.ion_codes):
+            raise ValueError("Peak m/z, intensity and annotation arrays differ in length")
+
+    @classmethod
+    def from_peaks(cls, peaks: Iterable[Tuple[Sequence[float], Sequence[float], Sequence[str]]]) -> "PeakStore":
+        """
+        Build a store from per-row peak lists.
+
+        Args:
+            peaks: one (m/z values, intensities, annotations) tuple per row
+
+        Returns:
+            PeakStore with one row per tuple.
+        """
+        lengths: List[int] = []
+        mz: List[float] = []
+        intensity: List[float] = []
+        ions: List[str] = []
+
+        for row_mz, row_intensity, row_ions in peaks:
+            lengths.append(len(row_mz))
+            mz.extend(row_mz)
+            intensity.extend(row_intensity)
+            ions.extend(row_ions)
+
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        ion_codes, ion_categories = pd.factorize(pd.Series(ions, dtype=object))
+
+        return cls(offsets, np.array(mz, dtype=np.float64), np.array(intensity, dtype=np.float64),
+                   ion_codes, ion_categories)
+
+    @classmethod
+    def from_strings(cls, intensities: Iterable[str], mz_values: Iterable[str], ions: Iterable[str]) -> "PeakStore":
+        """
+        Build a store from the comma-joined peak columns of a CSM table.
+
+        Rows whose columns hold different numbers of values are truncated to
+        the shortest one, like zipping the split values.
+        """
+        def split(value) -> List[str]:
+            if value is None or (isinstance(value, float) and np.isnan(value)):
+                return []
+            return [item.strip() for item in str(value).split(",") if item.strip()]
+
+        peaks = []
+        for row_intensities, row_mz, row_ions in zip(intensities, mz_values, ions):
+            row_intensities, row_mz, row_ions = split(row_intensities), split(row_mz), split(row_ions)
+            n = min(len(row_intensities), len(row_mz), len(row_ions))
+            peaks.append(([float(v) for v in row_mz[:n]], [float(v) for v in row_intensities[:n]], row_ions[:n]))
+
+        return cls.from_peaks(peaks)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def n_peaks(self) -> int:
+        """Total number of peaks of all rows."""
+        return len(self.mz)
+
+    def row_slice(self, row: int) -> slice:
+        """Return the slice of the flat peak arrays that holds a row's peaks."""
+        return slice(int(self.offsets[row]), int(self.offsets[row + 1]))
+
+    def peaks(self, row: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Return the peaks of a row.
+
+        Returns:
+            m/z and intensity views into the flat arrays (no copy) and the
+            annotation strings.
+        """
+        rows = self.row_slice(row)
+        return self.mz[rows], self.intensity[rows], self.ion_categories[self.ion_codes[rows]]
+
+    def ion_mask(self, predicate: Callable[[str], bool], row: Optional[int] = None) -> np.ndarray:
+        """
+        Select peaks by annotation.
+
+        The predicate is evaluated once per distinct annotation, not per peak.
+
+        Args:
+            predicate: annotation -> keep the peak
+            row: restrict the mask to the peaks of one row (default: all peaks)
+
+        Returns:
+            Boolean mask over the peaks of the row, or over all flat peaks.
+        """
+        category_mask = np.fromiter((bool(predicate(c)) for c in self.ion_categories),
+                                    dtype=bool, count=len(self.ion_categories))
+        codes = self.ion_codes if row is None else self.ion_codes[self.row_slice(row)]
+        return category_mask[codes]
+
+    def ion_counts(self) -> pd.Series:
+        """Return the number of peaks per annotation, most frequent first."""
+        counts = np.bincount(self.ion_codes, minlength=len(self.ion_categories))
+        return pd.Series(counts, index=self.ion_categories, name="peaks").sort_values(ascending=False)
+
+    def string_columns(self, rows: Optional[Sequence[int]] = None) -> Dict[str, List[str]]:
+        """
+        Build the comma-joined peak columns (display and export view).
+
+        Numbers are formatted as str(float), like the PeakAnnotation
+        attributes; only the peaks of the requested rows are formatted.
+
+        Args:
+            rows: store rows to format (default: all rows)
+
+        Returns:
+            Column name -> one comma-joined string per row.
+        """
+        rows = range(len(self)) if rows is None else rows
+
+        columns = {name: [] for name in PEAK_STRING_COLUMNS}
+        for row in rows:
+            peaks = self.row_slice(row)
+            columns["intensities"].append(",".join(map(str, self.intensity[peaks].tolist())))
+            columns["mz_values"].append(",".join(map(str, self.mz[peaks].tolist())))
+            columns["ions"].append(",".join(self.ion_categories[self.ion_codes[peaks]]))
+        return columns
+
+
+def get_peak_store(df: Optional[pd.DataFrame]) -> Optional[PeakStore]:
+    """Return the PeakStore of a CSM table, or None if it has none."""
+    if df is None:
+        return None
+    return df.attrs.get(PEAK_STORE_ATTR)
+
+
+def attach_peak_store(df: Optional[pd.DataFrame], store: Optional[PeakStore] = None) -> Optional[pd.DataFrame]:
+    """
+    Move the peaks of a CSM table into a PeakStore kept in df.attrs.
+
+    Args:
+        df: CSM table with a default RangeIndex
+        store: peaks of the table rows (default: parsed from the
+            comma-joined peak columns, which are then dropped)
+
+    Returns:
+        The table without the comma-joined peak columns.
+    """
+    if df is None or df.empty:
+        return df
+
+    if store is None:
+        if not set(PEAK_STRING_COLUMNS).issubset(df.columns):
+            return df
+        store = PeakStore.from_strings(df["intensities"], df["mz_values"], df["ions"])
+
+    if len(store) != len(df):
+        raise ValueError("PeakStore rows do not match the CSM table rows")
+
+    df = df.drop(columns=[c for c in PEAK_STRING_COLUMNS if c in df.columns])
+    df.attrs[PEAK_STORE_ATTR] = store
+    return df
+
+
+def with_peak_strings(df: Optional[pd.DataFrame]) -> Optional[pd.DataFrame]:
+    """
+    Return a copy of a CSM table with the comma-joined peak columns restored
+    after the accessions column (for AgGrid display and table downloads).
+
+    The table may be a row subset: its index labels select the store rows.
+    """
+    store = get_peak_store(df)
+    if store is None:
+        return df
+
+    columns = store.string_columns(df.index)
+    df = df.copy()
+    df.attrs = {}
+    position = df.columns.get_loc(PEAK_STRING_COLUMNS_AFTER) + 1 if PEAK_STRING_COLUMNS_AFTER in df.columns else len(df.columns)
+    for offset, name in enumerate(PEAK_STRING_COLUMNS):
+        df.insert(position + offset, name, columns[name])
+    return df
@@ -0,0 +1,289 @@
+"""
+Lazy, section-indexed reader for NuXL protein report TSVs.
+
+A *_proteins*_XLs.tsv report holds several tables separated by "==...=="
+lines (protein list, protein summary, crosslink efficiency, precursor
+adduct summary, ...). The report is indexed in one pass over a memory map:
+only separator and section title lines are looked at, and each section is
+recorded as the byte range of its lines. A section dataframe is parsed only
+when it is requested, by pd.read_csv on a stream over that byte range.
+
+The sections are the same as those of read_protein_table (same splitting,
+header handling and stripped lines).
+"""
+
+import hashlib
+import io
+import mmap
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional, Union
+
+import pandas as pd
+
+# Lines that drive the section splitting: "==...==" separators and the
+# titles of sections whose first line is the column header
+PROTEIN_REPORT_SEPARATOR = "=="
+PROTEIN_REPORT_HEADER_TITLES = ("Protein summary", "Crosslink efficiency", "Precursor adduct summary")
+CROSSLINK_EFFICIENCY_TITLE = "Crosslink efficiency"
+CROSSLINK_EFFICIENCY_HEADER = "AA\tCrosslink efficiency"
+
+# Blanks that line.strip() removes around the fields of a line; sections
+# with padded lines are streamed line by line with the blanks stripped
+LINE_PADDING = (b" ", b"\t", b"\f", b"\v")
+
+STREAM_BLOCK_SIZE = 1 << 20
+
+# Section indexes of the reports read in this process, by file fingerprint
+_INDEX_CACHE: Dict[str, List["ProteinReportSection"]] = {}
+
+
+class ProteinReportSection(NamedTuple):
+    """Byte range and header handling of one report section."""
+
+    start: int
+    end: int
+    # parse the first line as the column names of a header-less table
+    header_line: bool
+    # replace the first line by the crosslink efficiency header
+    crosslink_header: bool
+
+
+class _ChunkStream(io.RawIOBase):
+    """Readable binary stream over an iterator of byte chunks."""
+
+    def __init__(self, chunks: Iterator[bytes]):
+        self._chunks = chunks
+        self._buffer = memoryview(b"")
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._buffer:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._buffer = memoryview(chunk)
+        n = min(len(buffer), len(self._buffer))
+        buffer[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+
+def protein_report_fingerprint(report_file: Union[str, Path]) -> str:
+    """
+    Fingerprint a protein report by resolved path, size and modification time.
+
+    Returns:
+        16 hex digit fingerprint; it changes when the file is rewritten.
+    """
+    path = Path(report_file).resolve()
+    stat = path.stat()
+    key = f"{path}|{stat.st_size}|{stat.st_mtime_ns}"
+    return hashlib.sha256(key.encode()).hexdigest()[:16]
+
+
+def _find_all(data: mmap.mmap, needles: List[str]) -> List[int]:
+    """Return the sorted offsets of all occurrences of the needles."""
+    offsets = []
+    for needle in needles:
+        needle = needle.encode()
+        offset = data.find(needle)
+        while offset >= 0:
+            offsets.append(offset)
+            offset = data.find(needle, offset + len(needle))
+    return sorted(offsets)
+
+
+def _has_padded_lines(data: mmap.mmap, start: int, end: int) -> bool:
+    """Return True if a line in [start, end) has leading or trailing blanks."""
+    if start >= end:
+        return False
+    if data[start:start + 1] in LINE_PADDING or data[end - 1:end] in LINE_PADDING:
+        return True
+    for blank in LINE_PADDING:
+        for needle in (b"\n" + blank, blank + b"\n", blank + b"\r\n"):
+            if data.find(needle, start, end) >= 0:
+                return True
+    return False
+
+
+def index_protein_report(report_file: Union[str, Path]) -> List[ProteinReportSection]:
+    """
+    Find the byte ranges of the sections of a protein report.
+
+    Follows the splitting of read_protein_table: a separator line ends the
+    current section (if it has lines) and the line after it is skipped; a
+    title line makes the section header-line based, and the crosslink
+    efficiency title takes the next line into the section and replaces the
+    section's first line by a fixed header.
+
+    Args:
+        report_file: protein report (.tsv) path
+
+    Returns:
+        The sections in file order.
+    """
+    if Path(report_file).stat().st_size == 0:
+        return []
+
+    sections: List[ProteinReportSection] = []
+    start: Optional[int] = None  # offset of the first line of the current section
+    pos = 0  # offset of the next line not handled yet
+    skip_next_line = False
+    header_line = False
+    crosslink_header = False
+
+    with open(report_file, "rb") as handle:
+        with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            size = len(data)
+
+            def line_end(offset: int) -> int:
+                end = data.find(b"\n", offset)
+                return size if end < 0 else end + 1
+
+            def take_lines(until: int) -> None:
+                # plain lines in [pos, until) join the current section
+                nonlocal pos, start, skip_next_line
+                if pos >= until:
+                    return
+                if skip_next_line:
+                    pos = line_end(pos)
+                    skip_next_line = False
+                if pos < until and start is None:
+                    start = pos
+                pos = max(pos, until)
+
+            for offset in _find_all(data, [PROTEIN_REPORT_SEPARATOR, *PROTEIN_REPORT_HEADER_TITLES]):
+                line_start = data.rfind(b"\n", 0, offset) + 1
+                if line_start < pos or data[line_start:offset].strip():
+                    continue
+                line = data[line_start:line_end(line_start)].decode(errors="replace").strip()
+                is_separator = line.startswith("==") and line.endswith("==")
+                if not is_separator and not line.startswith(PROTEIN_REPORT_HEADER_TITLES):
+                    continue
+
+                take_lines(line_start)
+                pos = line_end(line_start)
+
+                if is_separator:
+                    if start is not None:
+                        sections.append(ProteinReportSection(start, line_start, header_line, crosslink_header))
+                        start = None
+                        header_line = crosslink_header = False
+                        skip_next_line = True
+                    continue
+
+                if skip_next_line:
+                    skip_next_line = False
+                elif start is None:
+                    start = line_start
+                header_line = True
+
+                if line.startswith(CROSSLINK_EFFICIENCY_TITLE):
+                    # the next line is always part of the section
+                    header_line = False
+                    crosslink_header = True
+                    if start is None:
+                        start = pos
+                    pos = line_end(pos)
+
+            take_lines(size)
+
+    if start is not None:
+        # the last section is always read with its first line as header
+        sections.append(ProteinReportSection(start, size, False, crosslink_header))
+
+    return sections
+
+
+def _section_chunks(report_file: Union[str, Path], start: int, end: int, strip: bool) -> Iterator[bytes]:
+    """Yield the bytes of [start, end) of a file, with stripped lines if strip is set."""
+    with open(report_file, "rb") as handle:
+        handle.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            if strip:
+                chunk = handle.readline(remaining)
+            else:
+                chunk = handle.read(min(STREAM_BLOCK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk.strip() + b"\n" if strip else chunk
+
+
+def read_protein_report_section(report_file: Union[str, Path], section: ProteinReportSection) -> pd.DataFrame:
+    """
+    Parse one section of a protein report.
+
+    The section is streamed into pd.read_csv straight from its byte range
+    of the file; only the first line is read separately.
+
+    Args:
+        report_file: protein report (.tsv) path
+        section: section from index_protein_report
+
+    Returns:
+        The section dataframe.
+    """
+    with open(report_file, "rb") as handle:
+        handle.seek(section.start)
+        first_line = handle.readline(section.end - section.start)
+        body_start = handle.tell()
+        with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            strip = _has_padded_lines(data, body_start, section.end)
+
+    header = CROSSLINK_EFFICIENCY_HEADER if section.crosslink_header else first_line.decode().strip()
+    chunks = _section_chunks(report_file, body_start, section.end, strip)
+
+    if section.header_line:
+        columns = header.split("\t")
+        try:
+            section_df = pd.read_csv(io.BufferedReader(_ChunkStream(chunks), STREAM_BLOCK_SIZE), delimiter="\t", header=None)
+            section_df.columns = columns
+        except pd.errors.EmptyDataError:
+            section_df = pd.DataFrame(columns=columns)
+        return section_df
+
+    def with_header() -> Iterator[bytes]:
+        yield header.encode() + b"\n"
+        yield from chunks
+
+    try:
+        return pd.read_csv(io.BufferedReader(_ChunkStream(with_header()), STREAM_BLOCK_SIZE), delimiter="\t")
+    except pd.errors.EmptyDataError:
+        return pd.DataFrame()
+
+
+class ProteinReport:
+    """
+    Sections of a protein report as a lazy list of dataframes.
+
+    The report is indexed when the object is created (the index is cached
+    per file fingerprint); report[i] parses section i on first access and
+    keeps it.
+    """
+
+    def __init__(self, report_file: Union[str, Path]):
+        self.report_file = Path(report_file)
+        fingerprint = protein_report_fingerprint(self.report_file)
+        if fingerprint not in _INDEX_CACHE:
+            _INDEX_CACHE[fingerprint] = index_protein_report(self.report_file)
+        self.sections = _INDEX_CACHE[fingerprint]
+        self._frames: Dict[int, pd.DataFrame] = {}
+
+    def __len__(self) -> int:
+        return len(self.sections)
+
+    def __getitem__(self, index: int) -> pd.DataFrame:
+        if index < 0:
+            index += len(self.sections)
+        if not 0 <= index < len(self.sections):
+            raise IndexError("protein report section index out of range")
+        if index not in self._frames:
+            self._frames[index] = read_protein_report_section(self.report_file, self.sections[index])
+        return self._frames[index]
+
+    def __iter__(self) -> Iterator[pd.DataFrame]:
+        return (self[i] for i in range(len(self)))
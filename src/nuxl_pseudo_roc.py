@@ -0,0 +1,222 @@
+import hashlib
+import mmap
+import multiprocessing
+import re
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+# Threshold grid of the pseudo-ROC curves: q-value cutoffs from START in
+# steps of STEP (baseline curves use 10,001 points, rescored ones 100,001)
+PSEUDO_ROC_START = -0.0002
+PSEUDO_ROC_STEP = 0.0001
+PSEUDO_ROC_STEPS = 10001
+PSEUDO_ROC_STEPS_EXTRA = 100001
+
+# Hit scores are read straight from the PeptideHit start tags of an idXML
+IDXML_HIT_SCORE_PATTERN = re.compile(rb'<PeptideHit\b[^>]*?\sscore="([^"]*)"')
+
+# Score arrays recently used in this process, by file fingerprint (least
+# recently used arrays are dropped; cache_dir keeps them on disk)
+SCORE_CACHE_SIZE = 8
+_SCORE_CACHE: "OrderedDict[str, np.ndarray]" = OrderedDict()
+
+
+def pseudo_roc_thresholds(n_steps: int = PSEUDO_ROC_STEPS,
+                          start: float = PSEUDO_ROC_START,
+                          step: float = PSEUDO_ROC_STEP) -> np.ndarray:
+    """
+    Build the q-value thresholds of a pseudo-ROC curve.
+
+    The thresholds are accumulated step by step (not start + i * step), so
+    they are identical to incrementing a float threshold in a loop.
+
+    Args:
+        n_steps (int): Number of thresholds.
+        start (float): First threshold.
+        step (float): Increment between thresholds.
+
+    Returns:
+        np.ndarray: float64 array of n_steps thresholds.
+    """
+    increments = np.full(n_steps, step, dtype=np.float64)
+    if n_steps > 0:
+        increments[0] = start
+    return np.add.accumulate(increments)
+
+
+def count_below(scores: Iterable[float], thresholds: np.ndarray) -> np.ndarray:
+    """
+    Count the scores strictly below each threshold.
+
+    The scores are sorted once; each count is a binary search, so the cost
+    is O((scores + thresholds) * log(scores)).
+
+    Args:
+        scores (Iterable[float]): CSM scores (q-values).
+        thresholds (np.ndarray): Thresholds to count at.
+
+    Returns:
+        np.ndarray: int64 counts, one per threshold.
+    """
+    sorted_scores = np.sort(np.asarray(scores, dtype=np.float64))
+    return np.searchsorted(sorted_scores, thresholds, side="left").astype(np.int64)
+
+
+def pseudo_roc_curve(scores: Iterable[float],
+                     n_steps: int = PSEUDO_ROC_STEPS,
+                     start: float = PSEUDO_ROC_START,
+                     step: float = PSEUDO_ROC_STEP) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Compute a pseudo-ROC curve: number of CSMs below each q-value threshold.
+
+    Args:
+        scores (Iterable[float]): CSM scores (q-values).
+        n_steps (int): Number of thresholds.
+        start (float): First threshold.
+        step (float): Increment between thresholds.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The thresholds (x values) and the
+        CSM counts (y values).
+    """
+    thresholds = pseudo_roc_thresholds(n_steps, start, step)
+    return thresholds, count_below(scores, thresholds)
+
+
+def csms_at_fdr(scores: Iterable[float], fdr: float = 0.01) -> int:
+    """
+    Count the CSMs with a q-value below an FDR level.
+
+    Args:
+        scores (Iterable[float]): CSM scores (q-values).
+        fdr (float): FDR level.
+
+    Returns:
+        int: Number of CSMs below the FDR level.
+    """
+    return int(count_below(scores, np.array([fdr]))[0])
+
+
+def idxml_fingerprint(idxml_file: Union[str, Path]) -> str:
+    """
+    Fingerprint an idXML file by resolved path, size and modification time.
+
+    Args:
+        idxml_file (Union[str, Path]): The idXML file.
+
+    Returns:
+        str: 16 hex digit fingerprint; it changes when the file is rewritten.
+    """
+    path = Path(idxml_file).resolve()
+    stat = path.stat()
+    key = f"{path}|{stat.st_size}|{stat.st_mtime_ns}"
+    return hashlib.sha256(key.encode()).hexdigest()[:16]
+
+
+def read_idxml_hit_scores(idxml_file: Union[str, Path]) -> np.ndarray:
+    """
+    Extract the scores of all PeptideHits of an idXML file.
+
+    Only the score attributes are parsed (no full idXML load), in file
+    order, which is the order of IdXMLFile().load hits.
+
+    Args:
+        idxml_file (Union[str, Path]): The idXML file.
+
+    Returns:
+        np.ndarray: float64 hit scores.
+    """
+    if Path(idxml_file).stat().st_size == 0:
+        return np.empty(0, dtype=np.float64)
+
+    with open(idxml_file, "rb") as handle:
+        with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            scores = IDXML_HIT_SCORE_PATTERN.findall(data)
+    return np.array(scores, dtype=bytes).astype(np.float64) if scores else np.empty(0, dtype=np.float64)
+
+
+def load_hit_scores(idxml_files: Sequence[Union[str, Path]],
+                    workers: Optional[int] = None,
+                    cache_dir: Optional[Union[str, Path]] = None) -> List[np.ndarray]:
+    """
+    Load the hit scores of several idXML files, cached per file fingerprint.
+
+    Scores are taken from the in-process cache, then from cache_dir
+    (<fingerprint>.npy); the remaining files are extracted and added to both
+    caches. Extraction runs in this process unless workers > 1 is given: the
+    Streamlit server runs background threads, so worker processes are
+    spawned, not forked, and only pay off for many large files.
+
+    Args:
+        idxml_files (Sequence[Union[str, Path]]): The idXML files.
+        workers (Optional[int]): Worker processes for the extraction
+            (None or 1: extract in this process).
+        cache_dir (Optional[Union[str, Path]]): Directory for cached score
+            arrays (None: in-process cache only).
+
+    Returns:
+        List[np.ndarray]: Hit scores per file, in input order.
+    """
+    fingerprints = [idxml_fingerprint(f) for f in idxml_files]
+    cache_dir = Path(cache_dir) if cache_dir else None
+    scores: Dict[str, np.ndarray] = {}
+
+    for fingerprint in fingerprints:
+        if fingerprint in _SCORE_CACHE:
+            scores[fingerprint] = _SCORE_CACHE[fingerprint]
+            _SCORE_CACHE.move_to_end(fingerprint)
+        elif cache_dir and (cache_dir / f"{fingerprint}.npy").exists():
+            scores[fingerprint] = np.load(cache_dir / f"{fingerprint}.npy")
+
+    missing = {fp: str(f) for fp, f in zip(fingerprints, idxml_files) if fp not in scores}
+    if len(missing) > 1 and workers and workers > 1:
+        max_workers = min(workers, len(missing))
+        mp_context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=mp_context) as executor:
+            extracted = list(executor.map(read_idxml_hit_scores, missing.values()))
+    else:
+        extracted = [read_idxml_hit_scores(f) for f in missing.values()]
+
+    for fingerprint, array in zip(missing, extracted):
+        scores[fingerprint] = array
+        if cache_dir:
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            np.save(cache_dir / f"{fingerprint}.npy", array)
+
+    for fingerprint in fingerprints:
+        _SCORE_CACHE[fingerprint] = scores[fingerprint]
+        _SCORE_CACHE.move_to_end(fingerprint)
+    while len(_SCORE_CACHE) > SCORE_CACHE_SIZE:
+        _SCORE_CACHE.popitem(last=False)
+    return [scores[fp] for fp in fingerprints]
+
+
+def pseudo_roc_curves(idxml_files: Sequence[Union[str, Path]],
+                      labels: Optional[Sequence[str]] = None,
+                      n_steps: int = PSEUDO_ROC_STEPS_EXTRA,
+                      workers: Optional[int] = None,
+                      cache_dir: Optional[Union[str, Path]] = None) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+    """
+    Compute the pseudo-ROC curves of several idXML files on one threshold grid.
+
+    Args:
+        idxml_files (Sequence[Union[str, Path]]): The idXML files.
+        labels (Optional[Sequence[str]]): Curve labels (default: file stems).
+        n_steps (int): Number of thresholds.
+        workers (Optional[int]): Worker processes for the score extraction.
+        cache_dir (Optional[Union[str, Path]]): Directory for cached score arrays.
+
+    Returns:
+        Dict[str, Tuple[np.ndarray, np.ndarray]]: Label -> (thresholds, CSM counts).
+    """
+    labels = list(labels) if labels is not None else [Path(f).stem for f in idxml_files]
+    if len(labels) != len(idxml_files):
+        raise ValueError("Number of labels does not match the number of idXML files")
+
+    thresholds = pseudo_roc_thresholds(n_steps)
+    all_scores = load_hit_scores(idxml_files, workers=workers, cache_dir=cache_dir)
+    return {label: (thresholds, count_below(scores, thresholds))
+            for label, scores in zip(labels, all_scores)}
@@ -14,6 +14,7 @@ import streamlit as st
 
 from src.workflow.WorkflowManager import WorkflowManager
 from src.nuxl_view import show_fig
+from src.nuxl_spectrum_store import open_spectrum_store
 
 RESOURCE_URL = (
     "https://github.com/Arslan-Siraj/NuXL_rescore_resources/releases/download/"
@@ -56,8 +57,9 @@ class Workflow(WorkflowManager):
       RT_feat, RT_Int_feat, updated_feat, and _sse_perc_ files.
     - Manually uploaded MGF files remain supported.
     - When max-correlation features are enabled and no manual MGF is selected,
-      the workflow uses <idXML stem>.mgf from <workspace>/mzML-files or converts
-      <idXML stem>.mzML to MGF with OpenMS FileConverter.
+      the workflow uses <idXML stem>.mgf from <workspace>/mzML-files or writes
+      it from the spectrum store of <idXML stem>.mzML (OpenMS FileConverter
+      if the store cannot be built).
     - Rescoring outputs are copied directly to <workspace>/result-files.
     - After successful execution, a ZIP download button appears at the bottom
       of the execution page.
@@ -98,7 +100,8 @@ class Workflow(WorkflowManager):
             "Manual `.mgf` upload remains available. When automatic mode is used, "
             "the workflow looks for an MGF with the same stem as the selected idXML. "
             "If it is absent, the matching `.mzML` in the workspace `mzML-files` "
-            "folder is converted with OpenMS FileConverter."
+            "folder is converted to MGF from its spectrum store (OpenMS FileConverter "
+            "if the store cannot be built)."
         )
         self._upload_mgf_files()
         self._show_available_files(
@@ -427,7 +430,7 @@ class Workflow(WorkflowManager):
             help=(
                 "Automatic mode first searches for an MGF whose stem matches the "
                 "selected idXML. If absent, it converts the matching mzML from the "
-                "workspace mzML-files folder using OpenMS FileConverter. A manually "
+                "workspace mzML-files folder from its spectrum store. A manually "
                 "uploaded MGF can still be selected explicitly."
             ),
         )
@@ -1115,7 +1118,8 @@ class Workflow(WorkflowManager):
         Priority:
         1. An explicitly selected manual MGF.
         2. <idXML stem>.mgf in workflow input or global mzML-files.
-        3. Convert <idXML stem>.mzML from global mzML-files with FileConverter.
+        3. Write <idXML stem>.mgf from the spectrum store of <idXML stem>.mzML
+           in global mzML-files (FileConverter if the store cannot be built).
         """
         selected_mgf = self.params.get("mgf-file")
         automatic_values = {None, "", "None", AUTO_MGF_OPTION}
@@ -1264,6 +1268,58 @@ class Workflow(WorkflowManager):
         self,
         mzml_path: Path,
         id_stem: str,
+    ) -> Path | None:
+        """
+        Write <idXML stem>.mgf from the spectrum store of the mzML
+        (src.nuxl_spectrum_store), which is built once per mzML and shared
+        with the results viewer; FileConverter is used if the store cannot
+        be built.
+        """
+        global_ms_dir = Path(self.workflow_dir).parent / "mzML-files"
+        workflow_ms_dir = Path(self.workflow_dir, "input-files", "ms-files")
+        global_ms_dir.mkdir(parents=True, exist_ok=True)
+        workflow_ms_dir.mkdir(parents=True, exist_ok=True)
+
+        output_mgf = global_ms_dir / f"{id_stem}.mgf"
+        temporary_mgf = global_ms_dir / f"{id_stem}.tmp.mgf"
+        temporary_mgf.unlink(missing_ok=True)
+
+        self.logger.log(
+            f"No matching MGF found. Writing MGF from the mzML spectrum store: "
+            f"{mzml_path} -> {output_mgf}"
+        )
+
+        try:
+            store = open_spectrum_store(mzml_path)
+            with open(temporary_mgf, "w", encoding="utf-8") as handle:
+                written_spectra = store.write_mgf(handle)
+        except Exception as e:
+            temporary_mgf.unlink(missing_ok=True)
+            self.logger.log(
+                f"WARNING: Writing the MGF from the spectrum store failed ({e}). "
+                "Falling back to FileConverter."
+            )
+            return self._convert_mzml_to_mgf_with_file_converter(mzml_path, id_stem)
+
+        if written_spectra == 0:
+            temporary_mgf.unlink(missing_ok=True)
+            self.logger.log(
+                f"ERROR: {mzml_path} contains no spectra with precursor m/z to write to MGF."
+            )
+            return None
+
+        temporary_mgf.replace(output_mgf)
+
+        workflow_mgf = workflow_ms_dir / output_mgf.name
+        shutil.copy2(output_mgf, workflow_mgf)
+
+        self.logger.log(f"Created matching MGF file ({written_spectra} spectra): {output_mgf}")
+        return output_mgf
+
+    def _convert_mzml_to_mgf_with_file_converter(
+        self,
+        mzml_path: Path,
+        id_stem: str,
     ) -> Path | None:
         file_converter = self._file_converter_path()
         if file_converter is None:
@@ -1283,8 +1339,7 @@ class Workflow(WorkflowManager):
         temporary_mgf.unlink(missing_ok=True)
 
         self.logger.log(
-            f"No matching MGF found. Converting mzML with FileConverter: "
-            f"{mzml_path} -> {output_mgf}"
+            f"Converting mzML with FileConverter: {mzml_path} -> {output_mgf}"
         )
 
         conversion_args = [
@@ -4,11 +4,12 @@ import shutil
 import base64
 import pandas as pd
 import streamlit as st
-from io import StringIO
 from pathlib import Path
 from zipfile import ZipFile
 from pyopenms import IdXMLFile
 from src.nuxl_helper import reset_directory
+from src.nuxl_idxml_reader import read_idxml_dataframe
+from src.nuxl_protein_report import ProteinReport
 import zipfile
 
 def add_to_result(filename: str):
@@ -336,17 +337,22 @@ def strToFloat(df):
             continue
     return df
 
-def readAndProcessIdXML(input_file, top=1):
+def readAndProcessIdXML(input_file, top=1, backend="stream"):
     """
     convert the (.idXML) format identification file to dataframe
 
     Args:
         input_file: idXML file path 
         top: top hits (dafault 1)
+        backend: "stream" (incremental XML reader, bounded memory) or
+                 "pyopenms" (IdXMLFile().load)
 
     Returns:
         df: dataframe (.idXML -> dataframe)
     """
+    if backend == "stream":
+        return read_idxml_dataframe(input_file, top)
+
     prot_ids = []; pep_ids = []
     IdXMLFile().load(str(input_file), prot_ids, pep_ids)
     meta_value_keys = []
@@ -446,68 +452,8 @@ def read_protein_table(input_file):
     Returns:
         section_dfs: list of dataframes contain 4 dataframe
     """
-    section_dfs = []
-    current_section = []
-    skip_next_line = False
-    use_next_line_as_header = False
-
-    # Read the TSV file line by line
-    with open(input_file, 'r') as f:
-        for line in f:
-            line = line.strip()
-
-            # Check if the line is a section header
-            if line.startswith('==') and line.endswith('=='):
-                # Save the current section DataFrame to the list
-                if current_section:
-                    # If the section is 2, 3, or 5, use the next line as the header and remove the current header
-                    if use_next_line_as_header:
-                        try:
-                            section_df = pd.read_csv(StringIO('\n'.join(current_section[1:])), delimiter='\t', header=None)
-                            section_df.columns = current_section[0].split('\t')
-                        except pd.errors.EmptyDataError:
-                            # Handle the EmptyDataError by creating an empty DataFrame with appropriate headers
-                            section_df = pd.DataFrame(columns=current_section[0].split('\t'))
-                        section_dfs.append(section_df)
-                        use_next_line_as_header = False
-                    else:
-                        try:
-                            section_df = pd.read_csv(StringIO('\n'.join(current_section)), delimiter='\t')
-                        except pd.errors.EmptyDataError:
-                            # Handle the EmptyDataError by creating an empty DataFrame
-                            section_df = pd.DataFrame()
-                        section_dfs.append(section_df)
-
-                    current_section = []
-                    skip_next_line = True
-            else:
-                # Append the line to the current section content
-                if not skip_next_line:
-                    current_section.append(line)
-                skip_next_line = False
-
-                # Check if the next section should use the next line as the header
-                if line.startswith("Protein summary") or line.startswith("Crosslink efficiency") or line.startswith("Precursor adduct summary"):
-                    use_next_line_as_header = True
-
-                # Check if section 4, then update header
-                if line.startswith("Crosslink efficiency"):
-                    use_next_line_as_header = False
-                    header_line = next(f).strip()
-                    header = ["AA", "Crosslink efficiency"]
-                    current_section.append(header_line)
-                    current_section[0] = "\t".join(header)
-
-    # Append the last section to the list
-    if current_section:
-        try:
-            section_df = pd.read_csv(StringIO('\n'.join(current_section)), delimiter='\t')
-        except pd.errors.EmptyDataError:
-            # Handle the EmptyDataError by creating an empty DataFrame
-            section_df = pd.DataFrame()
-        section_dfs.append(section_df)
-
-    return section_dfs
+    # sections are located by byte offset and parsed straight from the file
+    return list(ProteinReport(input_file))
 
 #########dia page ##########
 def download_folder_library(
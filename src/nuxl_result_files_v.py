@@ -5,30 +5,231 @@ This module intentionally adds only _v functions so the existing
 src.nuxl_result_files module can remain unchanged.
 """
 
-from io import StringIO
+import hashlib
+import json
+import os
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 import streamlit as st
 from pyopenms import IdXMLFile
 
+from src.nuxl_idxml_reader import read_idxml_dataframe
+from src.nuxl_protein_report import ProteinReport
+from src.nuxl_peak_store import PeakStore, attach_peak_store, get_peak_store, with_peak_strings
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+# Parsed CSM tables are kept as uncompressed Feather (Arrow IPC) files in a
+# hidden folder next to the idXML: <sha16>.top<N>.feather, named by content
+# hash, plus <idXML name>.key.json mapping the file size and mtime to that
+# hash. Stale and orphaned sidecars are evicted by clean-up-workspaces.py.
+CSM_SIDECAR_DIR = ".csm-cache"
+CSM_SIDECAR_KEY_SUFFIX = ".key.json"
+CSM_SIDECAR_DTYPES_KEY = b"nuxl_dtypes"
+
+# Bump when the stored table changes; sidecars of other versions are re-parsed
+# and overwritten (2: float64 peak m/z and intensity)
+CSM_SIDECAR_FORMAT_KEY = b"nuxl_format"
+CSM_SIDECAR_FORMAT_VERSION = 2
+
+# The PeakStore of a table is stored as list columns (Arrow list offsets are
+# the store offsets) plus the annotation categories in the schema metadata
+CSM_SIDECAR_PEAK_COLUMNS = ["peak_mz", "peak_intensity", "peak_ion_codes"]
+CSM_SIDECAR_ION_CATEGORIES_KEY = b"nuxl_ion_categories"
+
+
+def _idxml_content_hash_v(input_file: Path) -> str:
+    """
+    Return the sha256 of an idXML file, reusing the hash stored in the
+    key file while the file size and mtime are unchanged.
+    """
+    stat = input_file.stat()
+    key_file = input_file.parent / CSM_SIDECAR_DIR / (input_file.name + CSM_SIDECAR_KEY_SUFFIX)
+
+    try:
+        key = json.loads(key_file.read_text())
+        if key["size"] == stat.st_size and key["mtime_ns"] == stat.st_mtime_ns:
+            return key["sha256"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    digest = hashlib.sha256()
+    with open(input_file, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+
+    key = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest.hexdigest()}
+    try:
+        _atomic_write_v(key_file, lambda tmp: tmp.write_text(json.dumps(key)))
+    except OSError:
+        pass  # read-only result folder: hash again next time
+
+    return key["sha256"]
+
+
+def _csm_sidecar_path_v(input_file: Path, top: int) -> Path:
+    """Return the Feather sidecar path of an idXML file's parsed CSM table."""
+    content_hash = _idxml_content_hash_v(input_file)
+    return input_file.parent / CSM_SIDECAR_DIR / f"{content_hash[:16]}.top{top}.feather"
+
+
+def _atomic_write_v(target: Path, write) -> None:
+    """Write target through a temporary file, so readers in other processes never see partial files."""
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+    try:
+        write(tmp)
+        os.replace(tmp, target)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+
+def read_csm_sidecar_v(input_file, top: int = 1):
+    """
+    Read the parsed CSM table of an idXML file from its Feather sidecar.
+
+    The sidecar is memory-mapped, so any process (e.g. each of the
+    load-balanced Streamlit servers) can read it without re-parsing the idXML.
+
+    Returns:
+        The CSM dataframe, or None if there is no valid sidecar.
+    """
+    if not HAS_PYARROW:
+        return None
+
+    input_file = Path(input_file)
+    try:
+        sidecar = _csm_sidecar_path_v(input_file, top)
+        if not sidecar.exists():
+            return None
+
+        table = feather.read_table(str(sidecar), memory_map=True)
+        metadata = table.schema.metadata
+        if metadata.get(CSM_SIDECAR_FORMAT_KEY) != str(CSM_SIDECAR_FORMAT_VERSION).encode():
+            return None
+        dtypes = json.loads(metadata[CSM_SIDECAR_DTYPES_KEY])
+
+        store = None
+        if CSM_SIDECAR_ION_CATEGORIES_KEY in metadata:
+            # list values are zero-copy views of the memory-mapped file
+            mz, intensity, ion_codes = (table.column(c).combine_chunks() for c in CSM_SIDECAR_PEAK_COLUMNS)
+            store = PeakStore(
+                mz.offsets.to_numpy(),
+                mz.values.to_numpy(zero_copy_only=True),
+                intensity.values.to_numpy(zero_copy_only=True),
+                ion_codes.values.to_numpy(zero_copy_only=True),
+                json.loads(metadata[CSM_SIDECAR_ION_CATEGORIES_KEY]),
+            )
+            table = table.drop(CSM_SIDECAR_PEAK_COLUMNS)
+
+        df = table.to_pandas()
+    except Exception:
+        return None
+
+    # restore object columns that Arrow stored as typed columns
+    object_columns = [c for c, dtype in dtypes.items() if dtype == "object" and df[c].dtype != object]
+    if object_columns:
+        df = df.astype({c: object for c in object_columns})
+
+    # sidecars without list columns hold the comma-joined peak columns
+    return attach_peak_store(df, store)
+
+
+def write_csm_sidecar_v(input_file, df: pd.DataFrame, top: int = 1) -> bool:
+    """
+    Write the parsed CSM table of an idXML file to its Feather sidecar.
+
+    Returns:
+        True if the sidecar was written; tables Arrow cannot store (e.g.
+        meta value columns of mixed types) and read-only folders are skipped.
+    """
+    if not HAS_PYARROW or df is None:
+        return False
+
+    input_file = Path(input_file)
+    store = get_peak_store(df)
+    try:
+        plain_df = df.copy(deep=False)
+        plain_df.attrs = {}
+        table = pa.Table.from_pandas(plain_df, preserve_index=False)
+        metadata = dict(table.schema.metadata or {})
+        metadata[CSM_SIDECAR_DTYPES_KEY] = json.dumps({c: str(t) for c, t in df.dtypes.items()}).encode()
+        metadata[CSM_SIDECAR_FORMAT_KEY] = str(CSM_SIDECAR_FORMAT_VERSION).encode()
+
+        if store is not None:
+            offsets = pa.array(store.offsets.astype(np.int32))
+            for name, values in zip(CSM_SIDECAR_PEAK_COLUMNS, (store.mz, store.intensity, store.ion_codes)):
+                table = table.append_column(name, pa.ListArray.from_arrays(offsets, pa.array(values)))
+            metadata[CSM_SIDECAR_ION_CATEGORIES_KEY] = json.dumps(list(store.ion_categories)).encode()
+
+        table = table.replace_schema_metadata(metadata)
+
+        _atomic_write_v(
+            _csm_sidecar_path_v(input_file, top),
+            lambda tmp: feather.write_feather(table, str(tmp), compression="uncompressed"),
+        )
+    except Exception:
+        return False
+
+    return True
+
 
 @st.cache_data(show_spinner="Reading idXML...")
-def readAndProcessIdXML_cached_v(input_file_str: str, file_mtime: float, top: int = 1):
+def readAndProcessIdXML_cached_v(input_file_str: str, file_mtime: float, top: int = 1,
+                                 backend: str = "stream"):
     """
     Convert an idXML identification file to a dataframe and cache the result.
 
     The file modification time is part of the cache key, so the cache is
-    invalidated automatically when the idXML file changes.
+    invalidated automatically when the idXML file changes. Below this
+    per-process cache, the table is shared through a Feather sidecar next
+    to the idXML, so the idXML is parsed only once across processes and
+    restarts.
+
+    The annotated peaks are kept in a PeakStore (df.attrs["peak_store"],
+    see src.nuxl_peak_store) instead of the comma-joined intensities,
+    mz_values and ions columns; use csm_display_table_v for the string view.
     """
     input_file = Path(input_file_str)
 
+    df = read_csm_sidecar_v(input_file, top)
+    if df is not None:
+        return df
+
+    df = parse_idXML_v(input_file, top, backend)
+    write_csm_sidecar_v(input_file, df, top)
+    return df
+
+
+def parse_idXML_v(input_file, top: int = 1, backend: str = "stream"):
+    """
+    Convert an idXML identification file to a dataframe (uncached), with
+    the annotated peaks in a PeakStore.
+
+    backend "stream" uses the incremental reader of src.nuxl_idxml_reader
+    (bounded memory, honours top); "pyopenms" loads the whole file with
+    IdXMLFile().load and keeps only the first hit.
+    """
+    input_file = Path(input_file)
+
+    if backend == "stream":
+        return read_idxml_dataframe(input_file, top, peak_store=True)
+
     prot_ids = []
     pep_ids = []
     IdXMLFile().load(str(input_file), prot_ids, pep_ids)
 
     meta_value_keys = []
     rows = []
+    peaks = []
     all_columns = None
 
     if len(pep_ids) == 0:
@@ -69,9 +270,6 @@ def readAndProcessIdXML_cached_v(input_file_str: str, file_mtime: float, top: in
                     "charge4",
                     "charge5",
                     "accessions",
-                    "intensities",
-                    "mz_values",
-                    "ions",
                 ] + meta_value_keys
 
             accessions = ";".join(
@@ -79,9 +277,11 @@ def readAndProcessIdXML_cached_v(input_file_str: str, file_mtime: float, top: in
             )
 
             peak_annotation = h.getPeakAnnotations()
-            intensities = ",".join(str(peak.intensity) for peak in peak_annotation)
-            mz_values = ",".join(str(peak.mz) for peak in peak_annotation)
-            ions = ",".join(str(peak.annotation) for peak in peak_annotation)
+            peaks.append((
+                [peak.mz for peak in peak_annotation],
+                [peak.intensity for peak in peak_annotation],
+                [str(peak.annotation) for peak in peak_annotation],
+            ))
 
             row = [
                 spectrum_id,
@@ -97,9 +297,6 @@ def readAndProcessIdXML_cached_v(input_file_str: str, file_mtime: float, top: in
                 z4,
                 z5,
                 accessions,
-                intensities,
-                mz_values,
-                ions,
             ]
 
             for k in meta_value_keys:
@@ -124,10 +321,10 @@ def readAndProcessIdXML_cached_v(input_file_str: str, file_mtime: float, top: in
         "peplen": int,
     }
 
-    return df.astype(convert_dict)
+    return attach_peak_store(df.astype(convert_dict), PeakStore.from_peaks(peaks))
 
 
-def readAndProcessIdXML_v(input_file, top: int = 1):
+def readAndProcessIdXML_v(input_file, top: int = 1, backend: str = "stream"):
     """
     Cache-safe public wrapper for idXML parsing.
     """
@@ -136,84 +333,44 @@ def readAndProcessIdXML_v(input_file, top: int = 1):
         str(input_file.resolve()),
         input_file.stat().st_mtime,
         top,
+        backend,
     )
 
 
-@st.cache_data(show_spinner="Reading protein table...")
-def read_protein_table_cached_v(input_file_str: str, file_mtime: float):
+@st.cache_data(show_spinner="Formatting CSM table...")
+def csm_display_table_cached_v(input_file_str: str, file_mtime: float, top: int = 1,
+                               backend: str = "stream"):
     """
-    Parse a NuXL protein TSV report into section dataframes and cache it.
+    Build the CSM table with the comma-joined peak columns (string view of
+    the PeakStore) for table display and download, and cache it.
     """
-    input_file = Path(input_file_str)
+    return with_peak_strings(readAndProcessIdXML_cached_v(input_file_str, file_mtime, top, backend))
 
-    section_dfs = []
-    current_section = []
-    skip_next_line = False
-    use_next_line_as_header = False
-
-    with open(input_file, "r") as f:
-        for line in f:
-            line = line.strip()
-
-            if line.startswith("==") and line.endswith("=="):
-                if current_section:
-                    if use_next_line_as_header:
-                        try:
-                            section_df = pd.read_csv(
-                                StringIO("\n".join(current_section[1:])),
-                                delimiter="\t",
-                                header=None,
-                            )
-                            section_df.columns = current_section[0].split("\t")
-                        except pd.errors.EmptyDataError:
-                            section_df = pd.DataFrame(
-                                columns=current_section[0].split("\t")
-                            )
-                        section_dfs.append(section_df)
-                        use_next_line_as_header = False
-                    else:
-                        try:
-                            section_df = pd.read_csv(
-                                StringIO("\n".join(current_section)),
-                                delimiter="\t",
-                            )
-                        except pd.errors.EmptyDataError:
-                            section_df = pd.DataFrame()
-                        section_dfs.append(section_df)
-
-                    current_section = []
-                    skip_next_line = True
-            else:
-                if not skip_next_line:
-                    current_section.append(line)
-
-                skip_next_line = False
-
-                if (
-                    line.startswith("Protein summary")
-                    or line.startswith("Crosslink efficiency")
-                    or line.startswith("Precursor adduct summary")
-                ):
-                    use_next_line_as_header = True
-
-                if line.startswith("Crosslink efficiency"):
-                    use_next_line_as_header = False
-                    header_line = next(f).strip()
-                    header = ["AA", "Crosslink efficiency"]
-                    current_section.append(header_line)
-                    current_section[0] = "\t".join(header)
-
-    if current_section:
-        try:
-            section_df = pd.read_csv(
-                StringIO("\n".join(current_section)),
-                delimiter="\t",
-            )
-        except pd.errors.EmptyDataError:
-            section_df = pd.DataFrame()
-        section_dfs.append(section_df)
 
-    return section_dfs
+def csm_display_table_v(input_file, top: int = 1, backend: str = "stream"):
+    """
+    Cache-safe public wrapper for the display/export view of a CSM table.
+    """
+    input_file = Path(input_file)
+    return csm_display_table_cached_v(
+        str(input_file.resolve()),
+        input_file.stat().st_mtime,
+        top,
+        backend,
+    )
+
+
+@st.cache_resource(show_spinner="Indexing protein table...")
+def read_protein_table_cached_v(input_file_str: str, file_mtime: float):
+    """
+    Index a NuXL protein TSV report and cache it.
+
+    Returns a lazy list of section dataframes (src.nuxl_protein_report):
+    a section is parsed from its byte range of the file the first time it
+    is accessed, and kept for later reruns. It is a shared resource (not
+    copied per rerun), so callers must not modify the section dataframes.
+    """
+    return ProteinReport(input_file_str)
 
 
 def read_protein_table_v(input_file):
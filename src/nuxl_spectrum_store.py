@@ -0,0 +1,415 @@
+"""
+Random-access spectrum store for mzML files.
+
+The peaks of all spectra of an mzML file are written once, in file order, to
+a flat binary file of float32 (m/z, intensity) pairs, plus an index with
+the peak offsets, native IDs, scan numbers and spectrum metadata (MS level,
+RT, precursor, base peak). Both live in a hidden folder next to the mzML:
+<mzML name>.<fingerprint>.peaks.f32 and <mzML name>.<fingerprint>.index.npz.
+
+The store is built by streaming the mzML through MzMLFile().transform, so
+the run is never held in memory. Readers memory-map the peak file: looking
+up a spectrum by native ID or scan number is a dict lookup, and its peaks
+are views of the mapped file, so single spectra are read without loading
+the run. Stores of changed or deleted mzML files are evicted by
+clean-up-workspaces.py.
+"""
+
+import hashlib
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, TextIO, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyopenms as poms
+    HAS_PYOPENMS = True
+except ImportError:
+    HAS_PYOPENMS = False
+
+SPECTRUM_STORE_DIR = ".spectrum-store"
+SPECTRUM_STORE_PEAKS_SUFFIX = ".peaks.f32"
+SPECTRUM_STORE_INDEX_SUFFIX = ".index.npz"
+
+# Peaks are buffered and appended to the peak file in blocks of this many pairs
+SPECTRUM_STORE_WRITE_BLOCK = 1 << 20
+
+# Per-spectrum index arrays (besides native_ids and offsets) and their dtypes
+SPECTRUM_STORE_INDEX_DTYPES = {
+    "scan": np.int64,
+    "ms_level": np.int16,
+    "rt": np.float64,
+    "precursor_mz": np.float64,
+    "precursor_charge": np.int16,
+    "base_peak_mz": np.float32,
+    "base_peak_intensity": np.float32,
+}
+
+# Opened stores of this process, by mzML fingerprint
+_STORE_CACHE: Dict[str, "SpectrumStore"] = {}
+_STORE_LOCK = threading.Lock()
+
+# Background builds running in this process, by mzML path
+_BUILD_THREADS: Dict[str, threading.Thread] = {}
+
+
+def mzml_fingerprint(mzml_file: Union[str, Path]) -> str:
+    """
+    Fingerprint an mzML file by resolved path, size and modification time.
+
+    Returns:
+        16 hex digit fingerprint; it changes when the file is rewritten.
+    """
+    path = Path(mzml_file).resolve()
+    stat = path.stat()
+    key = f"{path}|{stat.st_size}|{stat.st_mtime_ns}"
+    return hashlib.sha256(key.encode()).hexdigest()[:16]
+
+
+def spectrum_store_paths(mzml_file: Union[str, Path]) -> Tuple[Path, Path]:
+    """Return the peak and index file paths of the spectrum store of an mzML file."""
+    mzml_file = Path(mzml_file).resolve()
+    stem = mzml_file.parent / SPECTRUM_STORE_DIR / f"{mzml_file.name}.{mzml_fingerprint(mzml_file)}"
+    return stem.with_name(stem.name + SPECTRUM_STORE_PEAKS_SUFFIX), stem.with_name(stem.name + SPECTRUM_STORE_INDEX_SUFFIX)
+
+
+def scan_number(native_id: str) -> int:
+    """Return the number after the last '=' of a native ID (scan=, index=, ...), or -1."""
+    value = native_id[native_id.rfind("=") + 1:]
+    return int(value) if value.isdigit() else -1
+
+
+class SpectrumStoreWriter:
+    """Append spectra to a spectrum store peak file and collect the index."""
+
+    def __init__(self, peaks_handle):
+        self._handle = peaks_handle
+        self._block: List[np.ndarray] = []
+        self._block_size = 0
+        self.n_peaks = 0
+        self.native_ids: List[str] = []
+        self.offsets: List[int] = [0]
+        self.columns: Dict[str, list] = {name: [] for name in SPECTRUM_STORE_INDEX_DTYPES}
+
+    def add(self, native_id: str, ms_level: int, rt: float, precursor_mz: float,
+            precursor_charge: int, mz: np.ndarray, intensity: np.ndarray) -> None:
+        """Append one spectrum (precursor_mz is NaN for spectra without precursor)."""
+        peaks = np.empty((len(mz), 2), dtype=np.float32)
+        peaks[:, 0] = mz
+        peaks[:, 1] = intensity
+
+        if len(peaks):
+            base_peak = int(peaks[:, 1].argmax())
+            base_peak_mz, base_peak_intensity = peaks[base_peak]
+        else:
+            base_peak_mz = base_peak_intensity = np.nan
+
+        self.native_ids.append(native_id)
+        for name, value in zip(SPECTRUM_STORE_INDEX_DTYPES, (
+                scan_number(native_id), ms_level, rt, precursor_mz, precursor_charge,
+                base_peak_mz, base_peak_intensity)):
+            self.columns[name].append(value)
+
+        self.n_peaks += len(peaks)
+        self.offsets.append(self.n_peaks)
+        self._block.append(peaks)
+        self._block_size += len(peaks)
+        if self._block_size >= SPECTRUM_STORE_WRITE_BLOCK:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write the buffered peaks to the peak file."""
+        if self._block:
+            self._handle.write(np.concatenate(self._block).tobytes())
+        self._block = []
+        self._block_size = 0
+
+    def index_arrays(self) -> Dict[str, np.ndarray]:
+        """Return the index arrays, as saved in the index file."""
+        arrays = {
+            "native_ids": np.array(self.native_ids, dtype=str),
+            "offsets": np.array(self.offsets, dtype=np.int64),
+        }
+        for name, dtype in SPECTRUM_STORE_INDEX_DTYPES.items():
+            arrays[name] = np.array(self.columns[name], dtype=dtype)
+        return arrays
+
+
+class _SpectrumStoreConsumer:
+    """MzMLFile().transform consumer that feeds each spectrum to a SpectrumStoreWriter."""
+
+    def __init__(self, writer: SpectrumStoreWriter):
+        self.writer = writer
+
+    def setExpectedSize(self, n_spectra, n_chromatograms):
+        pass
+
+    def setExperimentalSettings(self, settings):
+        pass
+
+    def consumeChromatogram(self, chromatogram):
+        pass
+
+    def consumeSpectrum(self, spectrum):
+        precursors = spectrum.getPrecursors()
+        mz, intensity = spectrum.get_peaks()
+        self.writer.add(
+            spectrum.getNativeID(),
+            spectrum.getMSLevel(),
+            spectrum.getRT(),
+            precursors[0].getMZ() if precursors else np.nan,
+            precursors[0].getCharge() if precursors else 0,
+            mz,
+            intensity,
+        )
+
+
+def _write_store(peaks_file: Path, index_file: Path, fill) -> None:
+    """
+    Write a spectrum store through temporary files; fill(writer) adds the
+    spectra. The index is moved into place last, so a store is complete
+    once its index exists.
+    """
+    peaks_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_peaks = peaks_file.with_name(f".{peaks_file.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp_index = index_file.with_name(f".{index_file.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(tmp_peaks, "wb") as handle:
+            writer = SpectrumStoreWriter(handle)
+            fill(writer)
+            writer.flush()
+        with open(tmp_index, "wb") as handle:
+            np.savez(handle, **writer.index_arrays())
+        os.replace(tmp_peaks, peaks_file)
+        os.replace(tmp_index, index_file)
+    finally:
+        for tmp in (tmp_peaks, tmp_index):
+            if tmp.exists():
+                tmp.unlink()
+
+
+def build_spectrum_store(mzml_file: Union[str, Path]) -> Path:
+    """
+    Build the spectrum store of an mzML file, unless it is up to date.
+
+    Args:
+        mzml_file: mzML file path
+
+    Returns:
+        The index file of the store.
+    """
+    mzml_file = Path(mzml_file).resolve()
+    peaks_file, index_file = spectrum_store_paths(mzml_file)
+    if index_file.exists() and peaks_file.exists():
+        return index_file
+
+    if not HAS_PYOPENMS:
+        raise ImportError("pyopenms is required to build a spectrum store")
+
+    _write_store(
+        peaks_file,
+        index_file,
+        lambda writer: poms.MzMLFile().transform(str(mzml_file), _SpectrumStoreConsumer(writer)),
+    )
+    return index_file
+
+
+def start_spectrum_store_build(mzml_file: Union[str, Path]) -> bool:
+    """
+    Build the spectrum store of an mzML file in a background thread.
+
+    Returns:
+        True if a build was started, False if one is already running.
+    """
+    key = str(Path(mzml_file).resolve())
+    with _STORE_LOCK:
+        thread = _BUILD_THREADS.get(key)
+        if thread is not None and thread.is_alive():
+            return False
+        thread = threading.Thread(target=_build_quietly, args=(Path(key),),
+                                  name="spectrum-store-build", daemon=True)
+        _BUILD_THREADS[key] = thread
+        thread.start()
+    return True
+
+
+def _build_quietly(mzml_file: Path) -> None:
+    """Build a store in the background; failures are left to the first reader to report."""
+    try:
+        build_spectrum_store(mzml_file)
+    except Exception:
+        pass
+
+
+def open_spectrum_store(mzml_file: Union[str, Path], build: bool = True) -> Optional["SpectrumStore"]:
+    """
+    Open the spectrum store of an mzML file (cached per file fingerprint).
+
+    Args:
+        mzml_file: mzML file path
+        build: build the store if it does not exist yet (default True)
+
+    Returns:
+        The store, or None if the mzML file does not exist or the store is
+        not built and build is False.
+    """
+    mzml_file = Path(mzml_file)
+    if not mzml_file.is_file():
+        return None
+
+    fingerprint = mzml_fingerprint(mzml_file)
+    store = _STORE_CACHE.get(fingerprint)
+    if store is not None:
+        return store
+
+    thread = _BUILD_THREADS.get(str(mzml_file.resolve()))
+    if build and thread is not None and thread.is_alive():
+        thread.join()
+
+    peaks_file, index_file = spectrum_store_paths(mzml_file)
+    if not index_file.exists():
+        if not build:
+            return None
+        build_spectrum_store(mzml_file)
+
+    store = SpectrumStore(peaks_file, index_file, mzml_file.name)
+    _STORE_CACHE[fingerprint] = store
+    return store
+
+
+class SpectrumStore:
+    """Memory-mapped peaks and index of the spectra of one mzML file."""
+
+    def __init__(self, peaks_file: Union[str, Path], index_file: Union[str, Path], source_name: str = ""):
+        """
+        Args:
+            peaks_file: float32 (m/z, intensity) pair file
+            index_file: index (.npz) of the peak file
+            source_name: mzML file name (used in MGF titles)
+        """
+        with np.load(index_file) as index:
+            self.native_ids = index["native_ids"]
+            self.offsets = index["offsets"]
+            for name in SPECTRUM_STORE_INDEX_DTYPES:
+                setattr(self, name, index[name])
+
+        if self.offsets[-1] > 0:
+            self.peak_pairs = np.memmap(peaks_file, dtype=np.float32, mode="r", shape=(int(self.offsets[-1]), 2))
+        else:
+            self.peak_pairs = np.zeros((0, 2), dtype=np.float32)
+        self.source_name = source_name
+
+        self._by_native_id: Dict[str, int] = {}
+        self._by_scan: Dict[int, int] = {}
+        for row, (native_id, scan) in enumerate(zip(self.native_ids.tolist(), self.scan.tolist())):
+            self._by_native_id.setdefault(native_id, row)
+            if scan >= 0:
+                self._by_scan.setdefault(scan, row)
+
+    def __len__(self) -> int:
+        return len(self.native_ids)
+
+    @property
+    def n_peaks(self) -> int:
+        """Total number of peaks of all spectra."""
+        return len(self.peak_pairs)
+
+    def find(self, spectrum_reference: str) -> Optional[int]:
+        """
+        Return the row of a spectrum by native ID, or by the scan number of a
+        spectrum reference like "scan=123" if no native ID matches.
+        """
+        row = self._by_native_id.get(spectrum_reference)
+        if row is None:
+            row = self._by_scan.get(scan_number(spectrum_reference))
+        return row
+
+    def peaks(self, row: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the m/z and intensity arrays of a spectrum (views of the mapped file)."""
+        pairs = self.peak_pairs[int(self.offsets[row]):int(self.offsets[row + 1])]
+        return pairs[:, 0], pairs[:, 1]
+
+    def spectrum(self, spectrum_reference: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Return the peaks of a spectrum by native ID or scan number, or None if it is not in the store."""
+        row = self.find(spectrum_reference)
+        return None if row is None else self.peaks(row)
+
+    def metadata(self) -> pd.DataFrame:
+        """Return one row of metadata per spectrum (index: store row)."""
+        return pd.DataFrame({
+            "native ID": self.native_ids,
+            "scan": self.scan,
+            "MS level": self.ms_level,
+            "RT": self.rt,
+            "precursor m/z": self.precursor_mz,
+            "precursor charge": self.precursor_charge,
+            "max intensity m/z": self.base_peak_mz,
+            "max intensity": self.base_peak_intensity,
+            "peaks": np.diff(self.offsets),
+        })
+
+    def peaks_long(self, rows: Iterable[int]) -> pd.DataFrame:
+        """
+        Return the peaks of several spectra in long format.
+
+        Returns:
+            Dataframe with one row per peak: RT, mz and inty.
+        """
+        rows = np.asarray(list(rows), dtype=np.int64)
+        starts = self.offsets[rows]
+        lengths = self.offsets[rows + 1] - starts
+        # positions of the peaks of all selected spectra in the peak file
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        pairs = self.peak_pairs[positions]
+        return pd.DataFrame({
+            "RT": np.repeat(self.rt[rows], lengths),
+            "mz": pairs[:, 0],
+            "inty": pairs[:, 1],
+        })
+
+    def write_mgf(self, handle: TextIO, rows: Optional[Iterable[int]] = None) -> int:
+        """
+        Write spectra in MGF format, like OpenMS FileConverter -out_type mgf.
+
+        Spectra without precursor m/z are skipped. Titles have the OpenMS
+        form <precursor m/z>_<RT>_<native ID>_<mzML name>.
+
+        Args:
+            handle: text file to write to
+            rows: store rows to write (default: all spectra with a precursor)
+
+        Returns:
+            Number of written spectra.
+        """
+        rows = range(len(self)) if rows is None else rows
+        written = 0
+        for row in rows:
+            precursor_mz = float(self.precursor_mz[row])
+            if not precursor_mz > 0:
+                continue
+
+            native_id = str(self.native_ids[row])
+            rt = float(self.rt[row])
+            charge = int(self.precursor_charge[row])
+            mz, intensity = self.peaks(row)
+
+            lines = [
+                "",
+                "BEGIN IONS",
+                f"TITLE={precursor_mz}_{rt}_{native_id}_{self.source_name}",
+                f"PEPMASS={precursor_mz}",
+                f"RTINSECONDS={rt}",
+                f"SCANS={self.scan[row] if self.scan[row] >= 0 else row}",
+            ]
+            if charge != 0:
+                lines.append(f"CHARGE={abs(charge)}{'+' if charge > 0 else '-'}")
+            # 9 significant digits restore the float32 values exactly
+            lines.extend("%.9g %.9g" % pair for pair in zip(mz.tolist(), intensity.tolist()))
+            lines.append("END IONS\n")
+
+            handle.write("\n".join(lines))
+            written += 1
+        return written
@@ -5,7 +5,10 @@ import plotly.express as px
 import plotly.graph_objects as go
 import streamlit as st
 import matplotlib.pyplot as plt
-import pyopenms as poms
+from src.nuxl_pseudo_roc import (
+    pseudo_roc_curve, csms_at_fdr, load_hit_scores,
+    PSEUDO_ROC_STEPS, PSEUDO_ROC_STEPS_EXTRA,
+)
 
 @st.cache_resource
 def plot_ms2_spectrum(spec, title, color):
@@ -174,49 +177,18 @@ def plot_FDR_plot(idXML_id, idXML_extra, exp_name= "FileName", FDR_level=10):
     FDR_level: 10 for 0.01, 20 for 0.02, 100 for 1.0
     """
 
+    # ---------- Hit scores of both files (extracted in parallel, cached) ----------
+    Psm_score_list, Psm_score_list_extra = load_hit_scores([idXML_id, idXML_extra])
+
     # ---------- Without extra features ----------
-    protein_ids = []
-    peptide_ids = []
-    poms.IdXMLFile().load(idXML_id, protein_ids, peptide_ids)
-
-    Psm_score_list = []
-    for pep_id in peptide_ids:
-        for hit in pep_id.getHits():
-            Psm_score_list.append(float(hit.getScore()))
-
-    list_results = []
-    q_values = []
-    x = -0.0002
-    for _ in range(10001):
-        list_results.append(sum(j < x for j in Psm_score_list))
-        q_values.append(x)
-        x += 0.0001
+    q_values, list_results = pseudo_roc_curve(Psm_score_list, PSEUDO_ROC_STEPS)
 
     # ---------- With extra features ----------
-    protein_ids_extra = []
-    peptide_ids_extra = []
-    poms.IdXMLFile().load(idXML_extra, protein_ids_extra, peptide_ids_extra)
-
-    Psm_score_list_extra = []
-    for pep_id in peptide_ids_extra:
-        for hit in pep_id.getHits():
-            Psm_score_list_extra.append(float(hit.getScore()))
-
-    list_results_extra = []
-    q_values_extra = []
-    x = -0.0002
-    len_3000 = 0
-
-    for i in range(100001):
-        values = sum(j < x for j in Psm_score_list_extra)
-        list_results_extra.append(values)
-        q_values_extra.append(x)
-        x += 0.0001
-        if i == 3000:
-            len_3000 = values
-
-    psms_count_1_per_solely = np.sum(np.array(Psm_score_list) < 0.01)
-    psms_count_1_per_extra = np.sum(np.array(Psm_score_list_extra) < 0.01)
+    q_values_extra, list_results_extra = pseudo_roc_curve(Psm_score_list_extra, PSEUDO_ROC_STEPS_EXTRA)
+    len_3000 = list_results_extra[3000]
+
+    psms_count_1_per_solely = csms_at_fdr(Psm_score_list, 0.01)
+    psms_count_1_per_extra = csms_at_fdr(Psm_score_list_extra, 0.01)
 
      # ---------- Plot ----------
     fig, ax = plt.subplots(figsize=(8, 7))
@@ -250,6 +222,49 @@ def plot_FDR_plot(idXML_id, idXML_extra, exp_name= "FileName", FDR_level=10):
     #st.pyplot(fig)
     return fig, output_pdf
 
+def plot_FDR_comparison_plot(idXML_files, labels=None, exp_name="Pseudo-ROC comparison",
+                             FDR_level=10, cache_dir=None):
+    """
+    FDR plot (pseudo-ROC) of any number of idXML identification files in one figure,
+    e.g. one protocol or feature set per file.
+
+    Args:
+        idXML_files: idXML files (e.g. *_perc_1.0000_XLs.idXML), one curve per file.
+        labels: Curve labels (default: file names without extension).
+        exp_name: Plot title.
+        FDR_level: 10 for 0.1, 20 for 0.2, 100 for 1.0 (x-axis range).
+        cache_dir: Directory for hit score arrays cached per file fingerprint.
+
+    Returns:
+        A matplotlib Figure and a DataFrame with the number of CSMs at 1% CSM-level FDR per file.
+    """
+    labels = list(labels) if labels is not None else [Path(f).stem for f in idXML_files]
+    all_scores = load_hit_scores(idXML_files, cache_dir=cache_dir)
+
+    x_max = {10: 0.1, 20: 0.2, 100: 1.0}.get(FDR_level, 0.1)
+    colors = plt.get_cmap("tab20" if len(all_scores) > 10 else "tab10")
+
+    fig, ax = plt.subplots(figsize=(10, 7))
+    summary = []
+    y_max = 0
+    for i, (label, scores) in enumerate(zip(labels, all_scores)):
+        q_values, counts = pseudo_roc_curve(scores, PSEUDO_ROC_STEPS_EXTRA)
+        csms_1_per = csms_at_fdr(scores, 0.01)
+        y_max = max(y_max, csms_at_fdr(scores, x_max))
+        summary.append({"file": label, "CSMs": len(scores), "CSMs at 1% CSM-level FDR": csms_1_per})
+        ax.plot(q_values, counts, color=colors(i % colors.N), label=f"{label} ({csms_1_per})", linewidth=1.0)
+
+    ax.axvline(x=0.01, color="green", linewidth=1.0)
+    ax.set_title(f"{exp_name}\n(CSMs at 1% CSM-level FDR in brackets)", fontsize=12)
+    ax.set_xlabel("CSM-level q-value", fontsize=12)
+    ax.set_ylabel("no. of CSMs", fontsize=12)
+    ax.set_xlim(-0.01, x_max)
+    if FDR_level != 100 and y_max > 0:
+        ax.set_ylim(0, y_max)
+    ax.legend(fontsize=8, loc="lower right")
+
+    return fig, pd.DataFrame(summary)
+
 def download_table(df: pd.DataFrame, download_name: str = "") -> None:
     """
     provides a download button for the dataframe.
@@ -1,4 +1,5 @@
 import json
+import logging
 import os
 import shutil
 import sys
@@ -10,6 +11,7 @@ from typing import Any
 import pandas as pd
 import streamlit as st
 
+from src.nuxl2dia import ConverterConfig, NuXLLibraryConverter
 from src.workflow.WorkflowManager import WorkflowManager
 
 
@@ -27,6 +29,18 @@ EXCLUDED_IDXML_MARKERS = [
 ]
 
 
+class _WorkflowLogHandler(logging.Handler):
+    """Forward log records of the in-process library converter to the workflow log."""
+
+    def __init__(self, workflow_logger: Any) -> None:
+        super().__init__(logging.INFO)
+        self.workflow_logger = workflow_logger
+        self.setFormatter(logging.Formatter("%(levelname)s: %(message)s"))
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.workflow_logger.log(self.format(record))
+
+
 class Workflow(WorkflowManager):
     """
     NuXL DIA spectral-library generation workflow.
@@ -319,6 +333,84 @@ class Workflow(WorkflowManager):
                 ),
             )
 
+        cols = st.columns(2)
+
+        with cols[0]:
+            self.ui.input_widget(
+                key="merge_msfragger_library",
+                default=False,
+                name="Merge with MSFragger library",
+                widget_type="checkbox",
+                help=(
+                    "Add the precursors of the selected MSFragger library to the generated "
+                    "library. Used only when an MSFragger library TSV is selected."
+                ),
+            )
+
+        with cols[1]:
+            self.ui.input_widget(
+                key="merge_priority",
+                default="NuXL library",
+                name="Duplicate precursors from",
+                widget_type="selectbox",
+                options=["NuXL library", "MSFragger library"],
+                help=(
+                    "Library whose fragments are kept for precursors (modified sequence "
+                    "and charge) found in both libraries."
+                ),
+            )
+
+        cols = st.columns(3)
+
+        with cols[0]:
+            self.ui.input_widget(
+                key="top_fragments",
+                default=0,
+                name="Top N fragments per precursor",
+                widget_type="number",
+                min_value=0,
+                max_value=100,
+                step_size=1,
+                help=(
+                    "Keep only the N most intense fragments per precursor and rescale "
+                    "intensities to a per-precursor maximum of 1. Use 0 to keep all fragments."
+                ),
+            )
+
+        with cols[1]:
+            self.ui.input_widget(
+                key="fragment_min_mz",
+                default=0.0,
+                name="Minimum fragment m/z",
+                widget_type="number",
+                min_value=0.0,
+                step_size=10.0,
+                help="Fragments below this m/z are removed. Use 0 for no limit.",
+            )
+
+        with cols[2]:
+            self.ui.input_widget(
+                key="fragment_max_mz",
+                default=0.0,
+                name="Maximum fragment m/z",
+                widget_type="number",
+                min_value=0.0,
+                step_size=10.0,
+                help="Fragments above this m/z are removed. Use 0 for no limit.",
+            )
+
+        self.ui.input_widget(
+            key="library_format",
+            default="tsv",
+            name="Library output format",
+            widget_type="selectbox",
+            options=["tsv", "parquet"],
+            help=(
+                "File format of the generated library. Parquet is smaller and faster "
+                "to load for large libraries; DIA-NN reads the TSV format."
+            ),
+        )
+
         self.ui.input_widget(
             key="run_fileinfo",
             default=True,
@@ -327,6 +419,42 @@ class Workflow(WorkflowManager):
             help="Run OpenMS FileInfo on each selected mzML/raw file and include output in the workflow log.",
         )
 
+        self.ui.input_widget(
+            key="read_idxml_directly",
+            default=False,
+            name="Read idXML directly",
+            widget_type="checkbox",
+            help=(
+                "Build the library straight from the NuXL idXML files in the workflow "
+                "process, without exporting them to text files with TextExporter first. "
+                "Faster for large runs; no .unknown files are written."
+            ),
+        )
+
+        self.ui.input_widget(
+            key="incremental_update",
+            default=False,
+            name="Incremental library update",
+            widget_type="checkbox",
+            help=(
+                "Keep the existing library with the same name and merge only runs that "
+                "were not added before. Only precursors with a better new hit are rewritten. "
+                "Requires a fixed library output file name tag."
+            ),
+        )
+
+        self.ui.input_widget(
+            key="trace_stage_memory",
+            default=False,
+            name="Trace memory per stage",
+            widget_type="checkbox",
+            help=(
+                "Record the memory allocated by each library generation stage in the "
+                "stage profile of the log. Stage times and process memory are always "
+                "recorded; allocation tracing makes library generation several times slower."
+            ),
+        )
+
         self.ui.input_widget(
             key="use_rddf_identifications",
             default=False,
@@ -382,7 +510,11 @@ class Workflow(WorkflowManager):
 
         msfragger_library = self._resolve_optional_msfragger_library()
 
+        incremental_update = bool(self.params.get("incremental_update", False))
+
         library_name = str(self.params.get("library_name", "")).strip()
+        if not library_name and incremental_update:
+            library_name = "library"
         if not library_name:
             library_name = f"library_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
 
@@ -394,7 +526,7 @@ class Workflow(WorkflowManager):
             return False
 
         result_dir = Path(self.workflow_dir, "results", "spectral-library")
-        if result_dir.exists():
+        if result_dir.exists() and not incremental_update:
             shutil.rmtree(result_dir)
         result_dir.mkdir(parents=True, exist_ok=True)
 
@@ -438,8 +570,23 @@ class Workflow(WorkflowManager):
             + "\n".join(f"- {Path(f).name}" for f in matched_idxmls)
         )
 
-        if not self._run_text_exporter(matched_idxmls, output_folder):
-            return False
+        read_idxml_directly = bool(self.params.get("read_idxml_directly", False))
+
+        if not read_idxml_directly:
+            export_idxmls = matched_idxmls
+            if incremental_update:
+                # Runs exported by an earlier update are already in the library
+                export_idxmls = [
+                    f for f in matched_idxmls
+                    if not (output_folder / f"{Path(f).stem}.unknown").exists()
+                ]
+                self.logger.log(
+                    f"Incremental update: {len(export_idxmls)} of {len(matched_idxmls)} "
+                    "idXML file(s) are new."
+                )
+
+            if not self._run_text_exporter(export_idxmls, output_folder):
+                return False
 
         if self.params.get("run_fileinfo", True):
             if not self._run_fileinfo(mzml_files):
@@ -453,7 +600,15 @@ class Workflow(WorkflowManager):
                 f"Copied MSFragger library to output folder: {copied_msfragger_library}"
             )
 
-        if not self._run_nuxl2dia(
+        if read_idxml_directly:
+            if not self._run_nuxl2dia_in_process(
+                output_folder=output_folder,
+                library_name=library_name,
+                msfragger_library=copied_msfragger_library,
+                idxml_files=matched_idxmls,
+            ):
+                return False
+        elif not self._run_nuxl2dia(
             output_folder=output_folder,
             library_name=library_name,
             msfragger_library=copied_msfragger_library,
@@ -469,7 +624,11 @@ class Workflow(WorkflowManager):
             use_rddf_identifications=use_rddf_identifications,
         )
 
-        exclude_files = set()
+        exclude_files = {
+            p.resolve() for p in output_folder.glob("*.state.tsv")
+        } | {
+            p.resolve() for p in output_folder.glob("*.runs.json")
+        }
         if copied_msfragger_library is not None:
             exclude_files.add(copied_msfragger_library.resolve())
 
@@ -688,7 +847,8 @@ class Workflow(WorkflowManager):
             )
             return False
 
-        output_tsv = output_folder / f"{library_name}.tsv"
+        library_format = str(self.params.get("library_format", "tsv"))
+        output_library = output_folder / f"{library_name}.{library_format}"
 
         if msfragger_library:
             unknown_files = sorted(output_folder.glob("*.unknown"))
@@ -702,14 +862,28 @@ class Workflow(WorkflowManager):
                 "-i",
                 *[str(p) for p in unknown_files],
                 "-o",
-                str(output_tsv),
+                str(output_library),
+                "--format",
+                library_format,
                 "--irt",
                 str(self.params.get("irt_calibration_model", "linear")),
                 "--irt-ref",
                 str(msfragger_library),
+                "--irt-cache",
+                str(Path(self.workflow_dir, "cache", "irt-models")),
                 "-v",
             ]
 
+            if self.params.get("merge_msfragger_library", False):
+                command.extend(
+                    [
+                        "--merge",
+                        str(msfragger_library),
+                        "--merge-priority",
+                        self._merge_priority(),
+                    ]
+                )
+
         else:
             unknown_xls = sorted(output_folder.glob("*_XLs.unknown"))
             unknown_peptides = sorted(output_folder.glob("*_peptides.unknown"))
@@ -727,12 +901,116 @@ class Workflow(WorkflowManager):
                 *[str(p) for p in unknown_xls],
                 *[str(p) for p in unknown_peptides],
                 "-o",
-                str(output_tsv),
+                str(output_library),
+                "--format",
+                library_format,
                 "-v",
             ]
 
+        command.extend(self._fragment_selection_args())
+        command.extend(
+            ["--profile", "memory" if self.params.get("trace_stage_memory", False) else "time"]
+        )
+
+        if self.params.get("incremental_update", False):
+            command.append("--update")
+
         return self.executor.run_command(command)
 
+    def _run_nuxl2dia_in_process(
+        self,
+        output_folder: Path,
+        library_name: str,
+        msfragger_library: Path | None,
+        idxml_files: list[str],
+    ) -> bool:
+        """
+        Generate the library directly from the idXML files in this process.
+
+        Skips the TextExporter export and the separate nuxl2dia.py process.
+        """
+        self.logger.log("Generating spectral library from idXML files (in-process nuxl2dia)...")
+
+        library_format = str(self.params.get("library_format", "tsv"))
+        output_library = output_folder / f"{library_name}.{library_format}"
+
+        config = ConverterConfig(
+            input_files=[Path(f) for f in idxml_files],
+            output_file=output_library,
+            irt_mode=(
+                str(self.params.get("irt_calibration_model", "linear"))
+                if msfragger_library else "none"
+            ),
+            irt_reference_file=msfragger_library,
+            irt_cache_dir=(
+                Path(self.workflow_dir, "cache", "irt-models") if msfragger_library else None
+            ),
+            merge_libraries=(
+                [msfragger_library]
+                if msfragger_library and self.params.get("merge_msfragger_library", False)
+                else []
+            ),
+            merge_priority=self._merge_priority(),
+            profile=True,
+            trace_memory=bool(self.params.get("trace_stage_memory", False)),
+            **self._fragment_selection_params(),
+        )
+
+        converter = NuXLLibraryConverter(config)
+        handler = _WorkflowLogHandler(self.logger)
+        previous_level = converter.logger.level
+        converter.logger.addHandler(handler)
+        converter.logger.setLevel(logging.INFO)
+
+        try:
+            if self.params.get("incremental_update", False):
+                converter.update(output_format=library_format)
+            else:
+                converter.run_pipeline().save(output_format=library_format)
+            converter.merge(output_format=library_format)
+            converter.save_irt_model_info()
+            converter.save_profile()
+        except Exception as exc:
+            self.logger.log(f"ERROR: Spectral library generation from idXML failed: {exc}")
+            return False
+        finally:
+            converter.logger.removeHandler(handler)
+            converter.logger.setLevel(previous_level)
+
+        return True
+
+    def _merge_priority(self) -> str:
+        if self.params.get("merge_priority", "NuXL library") == "MSFragger library":
+            return "merged"
+        return "library"
+
+    def _fragment_selection_params(self) -> dict[str, Any]:
+        top_fragments = int(self.params.get("top_fragments", 0) or 0)
+        fragment_min_mz = float(self.params.get("fragment_min_mz", 0.0) or 0.0)
+        fragment_max_mz = float(self.params.get("fragment_max_mz", 0.0) or 0.0)
+
+        # 0 switches a setting off
+        return {
+            "top_fragments": top_fragments or None,
+            "fragment_min_mz": fragment_min_mz or None,
+            "fragment_max_mz": fragment_max_mz or None,
+        }
+
+    def _fragment_selection_args(self) -> list[str]:
+        args: list[str] = []
+        params = self._fragment_selection_params()
+
+        if params["top_fragments"] is not None:
+            args.extend(["--top-fragments", str(params["top_fragments"])])
+
+        if params["fragment_min_mz"] is not None:
+            args.extend(["--fragment-min-mz", str(params["fragment_min_mz"])])
+
+        if params["fragment_max_mz"] is not None:
+            args.extend(["--fragment-max-mz", str(params["fragment_max_mz"])])
+
+        return args
+
     def _write_library_log(
         self,
         output_folder: Path,
@@ -773,12 +1051,89 @@ class Workflow(WorkflowManager):
 
             handle.write("\n===== parameters =====\n")
             handle.write(f"Library name: {library_name}\n")
+            handle.write(
+                "Top N fragments per precursor: "
+                f"{self.params.get('top_fragments', 0) or 'all'}\n"
+            )
+            handle.write(
+                "Fragment m/z range: "
+                f"{self.params.get('fragment_min_mz', 0.0) or 'no limit'} - "
+                f"{self.params.get('fragment_max_mz', 0.0) or 'no limit'}\n"
+            )
+            handle.write(
+                "Library output format: "
+                f"{self.params.get('library_format', 'tsv')}\n"
+            )
             handle.write(f"MSFragger iRT reference: {msfragger_library or 'None'}\n")
+            handle.write(
+                "Merge with MSFragger library: "
+                f"{bool(msfragger_library) and self.params.get('merge_msfragger_library', False)}\n"
+            )
+            if msfragger_library and self.params.get("merge_msfragger_library", False):
+                handle.write(
+                    "Duplicate precursors from: "
+                    f"{self.params.get('merge_priority', 'NuXL library')}\n"
+                )
             handle.write(f"Use RDDF identifications: {use_rddf_identifications}\n")
+            handle.write(
+                "Read idXML directly: "
+                f"{self.params.get('read_idxml_directly', False)}\n"
+            )
+            handle.write(
+                "Incremental library update: "
+                f"{self.params.get('incremental_update', False)}\n"
+            )
             handle.write(
                 "iRT calibration model: "
                 f"{self.params.get('irt_calibration_model', 'linear')}\n"
             )
+            handle.write(
+                "Trace memory per stage: "
+                f"{self.params.get('trace_stage_memory', False)}\n"
+            )
+
+            irt_model_file = output_folder / (
+                f"{library_name}.{self.params.get('library_format', 'tsv')}.irt_model.json"
+            )
+            if irt_model_file.exists():
+                irt_model = json.loads(irt_model_file.read_text(encoding="utf-8"))
+                handle.write("\n===== iRT calibration model =====\n")
+                handle.write(f"Model: {irt_model.get('mode')}\n")
+                handle.write(
+                    "Source: "
+                    + ("cached fit" if irt_model.get("source") == "cache" else "fitted in this run")
+                    + "\n"
+                )
+                if irt_model.get("cache_file"):
+                    handle.write(f"Cache file: {irt_model['cache_file']}\n")
+                handle.write(
+                    f"Reference columns: {irt_model.get('rt_column')} -> "
+                    f"{irt_model.get('irt_column')} ({irt_model.get('n_points')} points)\n"
+                )
+                if irt_model.get("mode") == "linear":
+                    handle.write(
+                        f"Intercept: {irt_model['intercept']}\nSlope: {irt_model['slope']}\n"
+                    )
+                elif irt_model.get("mode") == "piecewise":
+                    handle.write(f"Breakpoints: {irt_model['breakpoints']}\n")
+                    handle.write(f"Coefficients: {irt_model['beta']}\n")
+
+            profile_file = output_folder / (
+                f"{library_name}.{self.params.get('library_format', 'tsv')}.profile.json"
+            )
+            if profile_file.exists():
+                profile = json.loads(profile_file.read_text(encoding="utf-8"))
+                handle.write("\n===== stage profile =====\n")
+                for stage in profile.get("stages", []):
+                    line = (
+                        f"{stage['stage']}: {stage['seconds']:.2f} s, "
+                        f"rows {stage['rows_in']} -> {stage['rows_out']}, "
+                        f"peak RSS {stage['peak_rss_mb']} MB"
+                    )
+                    if "traced_peak_mb" in stage:
+                        line += f", allocated peak {stage['traced_peak_mb']} MB"
+                    handle.write(f"{line}\n")
+                handle.write(f"Total: {profile.get('total_seconds', 0.0):.2f} s\n")
 
             handle.write("\n===== Full workflow log =====\n")
             handle.write(all_log_content)
@@ -1043,6 +1398,14 @@ class Workflow(WorkflowManager):
         run_fileinfo = params.get("run_fileinfo", True)
         use_rddf_identifications = params.get("use_rddf_identifications", False)
         irt_model = params.get("irt_calibration_model", "linear")
+        library_format = params.get("library_format", "tsv")
+        top_fragments = params.get("top_fragments", 0)
+        fragment_min_mz = params.get("fragment_min_mz", 0.0)
+        fragment_max_mz = params.get("fragment_max_mz", 0.0)
+        incremental_update = params.get("incremental_update", False)
+        read_idxml_directly = params.get("read_idxml_directly", False)
+        merge_msfragger_library = params.get("merge_msfragger_library", False)
+        merge_priority = params.get("merge_priority", "NuXL library")
 
         try:
             openms_version = st.session_state.get("settings", {}).get("openms-version", "unknown")
@@ -1091,10 +1454,18 @@ class Workflow(WorkflowManager):
             f"> idXML files: **{', '.join(idxml_file_names)}**",
             f"> Optional MSFragger iRT library: **{Path(str(msfragger_library)).name if msfragger_library != 'None' else 'None'}**",
             f"> Use RDDF identifications: **{use_rddf_identifications}**",
+            f"> Top N fragments per precursor: **{top_fragments or 'all'}**",
+            f"> Fragment m/z range: **{fragment_min_mz or 'no limit'} - {fragment_max_mz or 'no limit'}**",
+            f"> Library output format: **{library_format}**",
+            f"> Read idXML directly: **{read_idxml_directly}**",
+            f"> Incremental library update: **{incremental_update}**",
         ]
 
         if msfragger_library != "None":
             lines.append(f"> iRT calibration model: **{irt_model}**")
+            lines.append(f"> Merge with MSFragger library: **{merge_msfragger_library}**")
+            if merge_msfragger_library:
+                lines.append(f"> Duplicate precursors from: **{merge_priority}**")
 
         lines.extend(
             [
@@ -4,69 +4,50 @@ from pathlib import Path
 import plotly.express as px
 import plotly.graph_objects as go
 import streamlit as st
-import pyopenms as poms
+from src.nuxl_pseudo_roc import (
+    pseudo_roc_curve, csms_at_fdr, load_hit_scores,
+    PSEUDO_ROC_STEPS, PSEUDO_ROC_STEPS_EXTRA,
+)
 from src.common.common import show_fig, display_large_dataframe
+from src.nuxl_spectrum_store import open_spectrum_store
 from typing import Union
 import matplotlib.pyplot as plt
 
 def get_df(file: Union[str, Path]) -> pd.DataFrame:
     """
-    Load a Mass Spectrometry (MS) experiment from a given mzML file and return
-    a pandas dataframe representation of the experiment.
+    Load the spectrum tables of a Mass Spectrometry (MS) experiment from the
+    spectrum store of a given mzML file (src.nuxl_spectrum_store; built on
+    first access) into the viewer session state.
 
     Args:
         file (Union[str, Path]): The path to the mzML file to load.
 
     Returns:
-        pd.DataFrame: A pandas DataFrame with the following columns: "mslevel",
-        "precursormz", "mzarray", and "intarray". The "mzarray" and "intarray"
-        columns contain NumPy arrays with the m/z and intensity values for each
-        spectrum in the mzML file, respectively.
+        None. Sets "view_spectra" (one row per spectrum with peaks: "RT",
+        "MS level", "precursor m/z" and "max intensity m/z"; the index is
+        the store row, the peaks are read from "view_spectrum_store" on
+        selection), and the long-format MS1 and MS2 peak tables
+        "view_ms1" and "view_ms2" (columns "RT", "mz" and "inty").
     """
-    exp = poms.MSExperiment()
-    poms.MzMLFile().load(str(file), exp)
-    df_spectra = exp.get_df()
-    df_spectra.rename(columns={
-        'rt': 'RT',
-        'ms_level': 'MS level',
-        'mz_array': 'mzarray',
-        'intensity_array': 'intarray',
-    }, inplace=True)
-    precs = []
-    for spec in exp:
-        p = spec.getPrecursors()
-        if p:
-            precs.append(p[0].getMZ())
-        else:
-            precs.append(np.nan)
-    df_spectra["precursor m/z"] = precs
+    store = open_spectrum_store(file)
+    st.session_state["view_spectrum_store"] = store
+
+    df_spectra = store.metadata()
 
     # Drop spectra without peaks
-    df_spectra = df_spectra[df_spectra["mzarray"].apply(lambda x: len(x) > 0)]
+    df_spectra = df_spectra[df_spectra["peaks"] > 0]
 
-    df_spectra["max intensity m/z"] = df_spectra.apply(
-        lambda x: x["mzarray"][x["intarray"].argmax()], axis=1
-    )
     if not df_spectra.empty:
         st.session_state["view_spectra"] = df_spectra
     else:
         st.session_state["view_spectra"] = pd.DataFrame()
-    exp_ms2 = poms.MSExperiment()
-    exp_ms1 = poms.MSExperiment()
-    for spec in exp:
-        if spec.getMSLevel() == 1:
-            exp_ms1.addSpectrum(spec)
-        elif spec.getMSLevel() == 2:
-            exp_ms2.addSpectrum(spec)
-    _long_rename = {'rt': 'RT', 'intensity': 'inty'}
-    if not exp_ms1.empty():
-        st.session_state["view_ms1"] = exp_ms1.get_df(long=True).rename(columns=_long_rename)
-    else:
-        st.session_state["view_ms1"] = pd.DataFrame(columns=['RT', 'mz', 'inty'])
-    if not exp_ms2.empty():
-        st.session_state["view_ms2"] = exp_ms2.get_df(long=True).rename(columns=_long_rename)
-    else:
-        st.session_state["view_ms2"] = pd.DataFrame(columns=['RT', 'mz', 'inty'])
+
+    for ms_level, key in ((1, "view_ms1"), (2, "view_ms2")):
+        rows = np.flatnonzero(store.ms_level == ms_level)
+        if len(rows) > 0:
+            st.session_state[key] = store.peaks_long(rows)
+        else:
+            st.session_state[key] = pd.DataFrame(columns=['RT', 'mz', 'inty'])
 
 
 def plot_bpc_tic() -> go.Figure:
@@ -254,23 +235,24 @@ def view_spectrum():
     with cols[1]:
         if (index is not None) and (len(df) != 0):
             df = st.session_state.view_spectra.iloc[index]
+            mzarray, intarray = st.session_state.view_spectrum_store.peaks(df.name)
             if "view_spectrum_selection" in st.session_state:
                 box = st.session_state.view_spectrum_selection.selection.box
                 if box:
                     mz_min, mz_max = sorted(box[0]["x"])
-                    mask = (df["mzarray"] > mz_min) & (df["mzarray"] < mz_max)
-                    df["intarray"] = df["intarray"][mask]
-                    df["mzarray"] = df["mzarray"][mask]
+                    mask = (mzarray > mz_min) & (mzarray < mz_max)
+                    intarray = intarray[mask]
+                    mzarray = mzarray[mask]
 
-            if df["mzarray"].size > 0:
+            if mzarray.size > 0:
                 title = f"{st.session_state.view_selected_file}  spec={index+1}  mslevel={df['MS level']}"
                 if df["precursor m/z"] > 0:
                     title += f" precursor m/z: {round(df['precursor m/z'], 4)}"
 
                 df_selected = pd.DataFrame(
                     {
-                        "mz": df["mzarray"],
-                        "intensity": df["intarray"],
+                        "mz": mzarray,
+                        "intensity": intarray,
                     }
                 )
                 df_selected["RT"] = df["RT"]
@@ -334,49 +316,18 @@ def plot_FDR_plot(idXML_id, idXML_extra, exp_name= "FileName", FDR_level=10):
     FDR_level: 10 for 0.01, 20 for 0.02, 100 for 1.0
     """
 
+    # ---------- Hit scores of both files (extracted in parallel, cached) ----------
+    Psm_score_list, Psm_score_list_extra = load_hit_scores([idXML_id, idXML_extra])
+
     # ---------- Without extra features ----------
-    protein_ids = []
-    peptide_ids = []
-    poms.IdXMLFile().load(idXML_id, protein_ids, peptide_ids)
-
-    Psm_score_list = []
-    for pep_id in peptide_ids:
-        for hit in pep_id.getHits():
-            Psm_score_list.append(float(hit.getScore()))
-
-    list_results = []
-    q_values = []
-    x = -0.0002
-    for _ in range(10001):
-        list_results.append(sum(j < x for j in Psm_score_list))
-        q_values.append(x)
-        x += 0.0001
+    q_values, list_results = pseudo_roc_curve(Psm_score_list, PSEUDO_ROC_STEPS)
 
     # ---------- With extra features ----------
-    protein_ids_extra = []
-    peptide_ids_extra = []
-    poms.IdXMLFile().load(idXML_extra, protein_ids_extra, peptide_ids_extra)
-
-    Psm_score_list_extra = []
-    for pep_id in peptide_ids_extra:
-        for hit in pep_id.getHits():
-            Psm_score_list_extra.append(float(hit.getScore()))
-
-    list_results_extra = []
-    q_values_extra = []
-    x = -0.0002
-    len_3000 = 0
-
-    for i in range(100001):
-        values = sum(j < x for j in Psm_score_list_extra)
-        list_results_extra.append(values)
-        q_values_extra.append(x)
-        x += 0.0001
-        if i == 3000:
-            len_3000 = values
-
-    psms_count_1_per_solely = np.sum(np.array(Psm_score_list) < 0.01)
-    psms_count_1_per_extra = np.sum(np.array(Psm_score_list_extra) < 0.01)
+    q_values_extra, list_results_extra = pseudo_roc_curve(Psm_score_list_extra, PSEUDO_ROC_STEPS_EXTRA)
+    len_3000 = list_results_extra[3000]
+
+    psms_count_1_per_solely = csms_at_fdr(Psm_score_list, 0.01)
+    psms_count_1_per_extra = csms_at_fdr(Psm_score_list_extra, 0.01)
 
      # ---------- Plot ----------
     fig, ax = plt.subplots(figsize=(8, 7))
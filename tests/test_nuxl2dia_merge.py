@@ -0,0 +1,60 @@
+import pandas as pd
+import pytest
+
+from src.nuxl2dia import HAS_PYARROW, NuXLLibraryConverter
+
+pytestmark = pytest.mark.skipif(not HAS_PYARROW, reason="Parquet merge requires pyarrow")
+
+# NuXL library: no Genes column, integer fragment charges, no ion mobility
+NUXL_LIBRARY = pd.DataFrame({
+    "ModifiedPeptideSequence": ["AGLKVR", "AGLKVR", "LLDPR"],
+    "PrecursorCharge": [3, 3, 2],
+    "PrecursorMz": [613.3, 613.3, 512.8],
+    "PrecursorIonMobility": [None, None, None],
+    "ProductMz": [300.1, 401.2, 288.2],
+    "LibraryIntensity": [1.0, 0.5, 1.0],
+    "FragmentCharge": [1, 1, 1],
+    "FragmentType": ["y", "b", "y"],
+    "FragmenLossType": ["", "", ""],
+})
+
+# MSFragger library: Genes and FragmentLossType columns, float charges
+MSFRAGGER_LIBRARY = pd.DataFrame({
+    "ModifiedPeptideSequence": ["LLDPR", "VVGK", "VVGK"],
+    "PrecursorCharge": [2, 2, 2],
+    "PrecursorMz": [512.8, 201.6, 201.6],
+    "PrecursorIonMobility": [0.81, 0.74, 0.74],
+    "ProductMz": [288.2, 146.1, 245.2],
+    "LibraryIntensity": [0.9, 1.0, 0.2],
+    "FragmentCharge": [1.0, 1.0, 2.0],
+    "FragmentType": ["y", "y", "y"],
+    "FragmentLossType": ["noloss", "noloss", "H2O"],
+    "Genes": ["rplB", "rpsC", "rpsC"],
+})
+
+
+def _write(library, path):
+    if path.suffix == ".parquet":
+        library.to_parquet(path, index=False)
+    else:
+        library.to_csv(path, sep="\t", index=False)
+    return path
+
+
+@pytest.mark.parametrize("suffixes", [(".tsv", ".tsv"), (".parquet", ".tsv"), (".tsv", ".parquet")])
+def test_parquet_merge_with_mismatched_columns(tmp_path, suffixes):
+    nuxl = _write(NUXL_LIBRARY, tmp_path / f"nuxl{suffixes[0]}")
+    msfragger = _write(MSFRAGGER_LIBRARY, tmp_path / f"msfragger{suffixes[1]}")
+
+    # one-row chunks: the first chunk has no Genes and no ion mobility values
+    merged_file = NuXLLibraryConverter().merge_libraries(
+        [nuxl, msfragger], tmp_path / "merged.parquet", chunk_rows=1)
+    merged = pd.read_parquet(merged_file)
+
+    assert list(merged.columns) == list(NUXL_LIBRARY.columns) + ["Genes"]
+    # LLDPR is taken from the first library only
+    assert merged["ModifiedPeptideSequence"].astype(str).tolist() == ["AGLKVR", "AGLKVR", "LLDPR", "VVGK", "VVGK"]
+    assert merged["Genes"].tolist()[2:] == [None, "rpsC", "rpsC"]
+    assert merged["FragmenLossType"].tolist()[3:] == ["noloss", "H2O"]
+    assert merged["FragmentCharge"].tolist() == [1, 1, 1, 1, 2]
+    assert merged["PrecursorIonMobility"].tolist()[3:] == [0.74, 0.74]
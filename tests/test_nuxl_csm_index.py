@@ -0,0 +1,82 @@
+from src.nuxl_csm_index import (
+    csm_index_run_summary,
+    search_csm_index,
+    search_csm_index_crosslinks,
+    update_csm_index,
+)
+
+# Two top hits as written by OpenNuXL after Percolator (score_type "q-value")
+NUXL_IDXML = """<?xml version="1.0" encoding="UTF-8"?>
+<IdXML version="1.5" xsi:noNamespaceSchemaLocation="https://www.openms.de/xml-schema/IdXML_1_5.xsd" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">
+  <SearchParameters id="SP_0" db="ecoli.fasta" db_version="" taxonomy="" mass_type="monoisotopic" charges="2,3,4,5" enzyme="trypsin" missed_cleavages="2" precursor_peak_tolerance="6.0" precursor_peak_tolerance_ppm="true" peak_mass_tolerance="20.0" peak_mass_tolerance_ppm="true" >
+  </SearchParameters>
+  <IdentificationRun date="2024-01-01T00:00:00" search_engine="OpenNuXL" search_engine_version="3.1.0" search_parameters_ref="SP_0" >
+    <ProteinIdentification score_type="" higher_score_better="true" significance_threshold="0.0" >
+      <ProteinHit id="PH_0" accession="sp|P0A7V0|RS2_ECOLI" score="0.0" sequence="" >
+        <UserParam type="string" name="target_decoy" value="target"/>
+      </ProteinHit>
+      <ProteinHit id="PH_1" accession="DECOY_sp|P0A7V3|RS3_ECOLI" score="0.0" sequence="" >
+        <UserParam type="string" name="target_decoy" value="decoy"/>
+      </ProteinHit>
+    </ProteinIdentification>
+    <PeptideIdentification score_type="q-value" higher_score_better="false" significance_threshold="0.0" MZ="613.3" RT="1203.5" spectrum_reference="controllerType=0 controllerNumber=1 scan=1201" >
+      <PeptideHit score="0.001" sequence="AGLK(Oxidation)VR" charge="3" aa_before="K" aa_after="A" protein_refs="PH_0" >
+        <UserParam type="string" name="target_decoy" value="target"/>
+        <UserParam type="string" name="NuXL:NA" value="U-H2O"/>
+        <UserParam type="string" name="NuXL:best_localization" value="aglKvr"/>
+        <UserParam type="int" name="NuXL:best_localization_position" value="3"/>
+        <UserParam type="float" name="NuXL:best_localization_score" value="0.87"/>
+        <UserParam type="float" name="NuXL:score" value="5.2"/>
+      </PeptideHit>
+    </PeptideIdentification>
+    <PeptideIdentification score_type="q-value" higher_score_better="false" significance_threshold="0.0" MZ="512.8" RT="1410.0" spectrum_reference="controllerType=0 controllerNumber=1 scan=1404" >
+      <PeptideHit score="0.2" sequence="LLDPR" charge="2" aa_before="K" aa_after="-" protein_refs="PH_1" >
+        <UserParam type="string" name="target_decoy" value="decoy"/>
+        <UserParam type="string" name="NuXL:NA" value="none"/>
+        <UserParam type="float" name="NuXL:score" value="1.1"/>
+      </PeptideHit>
+    </PeptideIdentification>
+  </IdentificationRun>
+</IdXML>
+"""
+
+
+def _workspace(tmp_path):
+    result_dir = tmp_path / "result-files"
+    result_dir.mkdir()
+    (result_dir / "run_perc_0.0100_XLs.idXML").write_text(NUXL_IDXML)
+    assert update_csm_index(tmp_path)["indexed"] == 1
+    return tmp_path
+
+
+def test_search_uses_nuxl_q_values(tmp_path):
+    workspace = _workspace(tmp_path)
+
+    csms = search_csm_index(workspace, sequence="AGL", max_q_value=0.01)
+    assert csms["Peptide"].tolist() == ["AGLK(Oxidation)VR"]
+    assert csms["q-value"].tolist() == [0.001]
+    assert csms["NuXL:NA"].tolist() == ["U-H2O"]
+
+    crosslinks = search_csm_index_crosslinks(workspace, na="U-", max_q_value=0.01)
+    assert crosslinks[["Peptide", "NuXL:NA", "CSMs"]].values.tolist() == [["AGLKVR", "U-H2O", 1]]
+
+    # decoys and CSMs above the q-value level are filtered
+    assert search_csm_index(workspace, sequence="LLD", max_q_value=1.0).empty
+    assert len(search_csm_index(workspace, sequence="LLD", max_q_value=1.0, targets_only=False)) == 1
+    assert search_csm_index(workspace, sequence="LLD", max_q_value=0.1, targets_only=False).empty
+
+
+def test_run_summary_counts_targets_at_fdr_levels(tmp_path):
+    summary = csm_index_run_summary(_workspace(tmp_path)).iloc[0]
+
+    assert summary["CSMs"] == 2
+    for level in ("1%", "5%", "10%"):
+        assert summary[f"CSMs at {level} FDR"] == 1
+        assert summary[f"XL CSMs at {level} FDR"] == 1
+
+
+def test_blank_filters_are_ignored(tmp_path):
+    workspace = _workspace(tmp_path)
+
+    assert len(search_csm_index(workspace, sequence="   ", targets_only=False)) == 2
+    assert len(search_csm_index_crosslinks(workspace, accession=" ", na="\t", targets_only=False)) == 2
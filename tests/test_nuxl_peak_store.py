@@ -0,0 +1,26 @@
+from src.nuxl_peak_store import PeakStore
+
+
+def test_string_columns_keep_idxml_precision():
+    store = PeakStore.from_peaks([
+        ([1234.5678, 301.14], [123456.789, 5.0], ["y3", "b2"]),
+        ([99.05], [17.5], ["MI:U"]),
+    ])
+
+    columns = store.string_columns([0])
+
+    assert columns == {
+        "intensities": ["123456.789,5.0"],
+        "mz_values": ["1234.5678,301.14"],
+        "ions": ["y3,b2"],
+    }
+
+
+def test_from_strings_round_trips_string_columns():
+    store = PeakStore.from_strings(["123456.789,5.0"], ["1234.5678,301.14"], ["y3,b2"])
+
+    assert store.string_columns() == {
+        "intensities": ["123456.789,5.0"],
+        "mz_values": ["1234.5678,301.14"],
+        "ions": ["y3,b2"],
+    }